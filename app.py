@@ -1,13 +1,58 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+from cachetools import LRUCache
+import io
+import json
+import logging
 import os
-from pathlib import Path
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+# Cálculos sin Streamlit, compartidos con la línea de comandos (python -m control_presupuestal)
+from control_presupuestal.calculos import (
+    COLUMNAS_VALORES, CONCEPTOS_RECURSOS_PROPIOS, RANGO_TOTAL, SECCIONES_RECURSOS_PROPIOS, agrupar_cubo_conceptos,
+    aplicar_deltas, bolsillos_cambiados, calcular_resumen_sgp, diferencias_libros, filas_cambiadas, indexar_detalle,
+    indexar_libro, lineas_detalle, mismas_filas, normalizar_libro, resumir_recursos_propios, tablas_corte
+)
+from control_presupuestal.diagnostico import contadores_cache, contar_cache, medir, mediciones, reiniciar
+from control_presupuestal.exportar import FORMATOS_EXPORTACION, exportar_tablas, indicadores_sgp
+from control_presupuestal.fuentes import (
+    cargar_snapshot, leer_primera_fila_snapshot, leer_snapshot, revisar_origen
+)
+from control_presupuestal.historico import (
+    buscar_exports, corte_registrado, detectar_fecha_corte, ingerir_export, leer_tabla_corte, leer_totales_historico,
+    listar_cortes, registrar_libro
+)
+from control_presupuestal.tablas import (
+    ESTILOS_FILA_RECURSOS_PROPIOS, ESTILOS_FILA_SGP, TIPOS_FILA_RECURSOS_PROPIOS, TIPOS_FILA_SGP,
+    construir_tabla_html, renderizar_tabla_recursos_propios, renderizar_tabla_sgp
+)
+from control_presupuestal.proyeccion import (
+    CARPETAS_PROYECCION, COLUMNAS_PROYECCION, buscar_meses_proyeccion, firma_mes_proyeccion,
+    leer_libro_proyeccion, preparar_libros_proyeccion, proyectar_recursos_propios, reducir_mes_nomina, rutas_proyeccion
+)
 
 # =============================================================================
 # CONFIGURACIÓN
 # =============================================================================
 st.set_page_config(page_title="PRESUPUESTOS", page_icon="⭐", layout="wide")
 
+# Copy-on-write: los DataFrames derivados del libro compartido nunca lo modifican
+pd.set_option("mode.copy_on_write", True)
+
+# Líneas de log estructuradas (JSON) de tiempos por etapa y fallos de caché, en la salida de error
+registro = logging.getLogger("control_presupuestal")
+if not registro.handlers:
+    registro.addHandler(logging.StreamHandler())
+    registro.setLevel(os.environ.get("CONTROL_PRESUPUESTAL_LOG", "INFO"))
+    registro.propagate = False
+
+# Clave del panel de diagnóstico: se abre con ?admin=<clave> en la URL
+CLAVE_ADMIN = os.environ.get("CONTROL_PRESUPUESTAL_ADMIN")
+
 # =============================================================================
 # ESTILOS PERSONALIZADOS
 # =============================================================================
@@ -183,909 +228,409 @@ def cargar_estilos():
 
 url = "https://docs.google.com/spreadsheets/d/1QyaYcqSY_j1qn4sBPgEauSFN90eMTcxoMKF7vqRMy-0/edit?usp=sharing"
 
-@st.cache_data(ttl=600)
+# Origen de los datos: la hoja de Google Sheets o un export local (.xlsx / .XLS / .csv)
+ORIGEN_DATOS = os.environ.get("APOTEOSYS_ORIGEN", url)
 
-def cargar_datos_originales():
-    """Carga el archivo original con cache para mejor rendimiento"""
-    try:
-       df = pd.read_csv(url)
-    except FileNotFoundError:
-        st.error("❌ No se pudo encontrar el archivo 'APOTEOSYS 29 OCTUBRE.XLS'. Por favor verifica que el archivo esté en la ubicación correcta.")
-        return None
-    except Exception as e:
-        st.error(f"❌ Error al cargar el archivo: {str(e)}")
-        return None
+# Cada cuánto revisa el hilo de fondo si el origen cambió (segundos)
+INTERVALO_ACTUALIZACION = 300
 
-@st.cache_data(ttl=3600)
-def procesar_datos_sgp():
-    """Función específica para procesar datos SGP - SOLO PARA PANTALLA 2"""
-    df = cargar_datos_originales()
-    if df is None:
-        return None, None
-        
-    try:
-        df.insert(0, "Codigo_O", df.iloc[:, 0].where(df.iloc[:, 0].astype(str).str.startswith("  O")).ffill())
-        df["Concepto de gasto"] = df["Concepto de gasto"].fillna(method="ffill")
-
-        # Extraer los últimos dos caracteres de Codigo_O y convertirlos a número
-        ultimos_dos = pd.to_numeric(df["Codigo_O"].astype(str).str[-2:], errors="coerce")
-
-        # --- 🔹 1. SGP CSF (Salarios + Parafiscales) ---
-        conceptos_csf = [
-            'O231010100101 Sueldo básico',
-            'O231010100102 Horas extras, dominicales, festivos y recargos',
-            'O231010100104 Subsidio de alimentación',
-            'O231010100105 Auxilio de Transporte',
-            'O231010100106 Prima de servicio',
-            'O23101010010801 Prima de navidad',
-            'O23101010010802 Prima de vacaciones',
-            'O231010200401 Compensar',
-            'O2310102006 Aportes al ICBF',
-            'O2310102007 Aportes al SENA',
-            'O2310102008 Aportes a la ESAP',
-            'O2310102009 Aportes a escuelas industriales e institutos técnicos'
-        ]
-
-        filtro_csf = (
-            (df["Nombre"] == "SGP Prest. Serv. Nómina Educació") &
-            (df["Concepto de gasto"].isin(conceptos_csf)) &
-            (ultimos_dos < 65)
-        )
+# Tras una primera carga fallida, las sesiones reciben ese mismo error durante este tiempo en vez de repetirla (segundos)
+ESPERA_REINTENTO = 30
 
-        csf = {
-            "DISPONIBLE": df.loc[filtro_csf, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_csf, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_csf, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_csf, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_csf, "RECURSOS SIN EJECUTAR"].sum()
-        }
+@st.cache_resource
+def estado_origenes():
+    """Validadores (ETag, Last-Modified, mtime) y huella del último contenido visto de cada origen, por proceso"""
+    return {}
 
-        # --- 🔹 2. SGP CSF FOMAG ---
-        conceptos_fomag = [
-            'O231010200201 Aportes a la seguridad social en salud pública',
-            'O231010200101 Aportes a la seguridad social en pensiones públicas'
-        ]
+@st.cache_resource
+def agregados_incrementales():
+    """Libro, resumen SGP y cubo del último export procesado: base para agrupar solo las filas que cambien en el siguiente"""
+    return {"huella": None, "libro": None, "resumen": None, "cubo": None, "candado": threading.Lock()}
 
-        filtro_fomag = (
-            (df["Nombre"] == "SGP Prest. Serv. Nómina Educació") &
-            (df["Concepto de gasto"].isin(conceptos_fomag)) &
-            (ultimos_dos < 65)
-        )
-
-        fomag = {
-            "DISPONIBLE": df.loc[filtro_fomag, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_fomag, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_fomag, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_fomag, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_fomag, "RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        # --- 🔹 3. SGP SSF FOMAG (Empleado) ---
-        filtro_ssf_empleado = (
-            (df["Nombre"] == "SGP PRESTACION DEL.SERVICIO SSF") &
-            (df["Concepto de gasto"] == "O231010100101 Sueldo básico") &
-            (ultimos_dos < 65)
-        )
-
-        ssf_empleado = {
-            "DISPONIBLE": df.loc[filtro_ssf_empleado, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_ssf_empleado, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_ssf_empleado, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_ssf_empleado, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_ssf_empleado, "RECURSOS SIN EJECUTAR"].sum()
-        }
+def actualizar_agregados(huella):
+    """Lleva los agregados a la huella nueva; si solo cambiaron valores agrupa únicamente esas filas. Devuelve el reporte de cambios"""
+    base = agregados_incrementales()
+    with base["candado"]:
+        if base["huella"] == huella:
+            return None
 
-        # --- 🔹 4. SGP SSF FOMAG (Patrón) ---
-        conceptos_ssf_patron = [
-            'O231010200201 Aportes a la seguridad social en salud pública',
-            'O231010200301 Aportes de cesantías a fondos públicos'
-        ]
+        libro = cargar_libro(huella)
+        if libro is None:
+            return None
+        anterior = base["libro"]
+
+        cambiadas = None
+        if anterior is not None and mismas_filas(anterior, libro):
+            # Mismas filas en el mismo orden: se comparan los arreglos de pesos y se agrupan solo las que cambiaron
+            with medir("diferencias entre exports"):
+                posiciones = filas_cambiadas(anterior, libro)
+                resumen, cubo = aplicar_deltas(base["resumen"], base["cubo"], diferencias_libros(anterior, libro, posiciones))
+            cambiadas = len(posiciones)
+        else:
+            # Primer export del proceso, o filas insertadas o eliminadas: se agrega completo con el índice
+            resumen, cubo = calcular_resumen_sgp(libro, cargar_indice(huella)), agrupar_cubo_conceptos(libro)
+
+        cambios = None
+        if anterior is not None:
+            cambios = {
+                "filas": (len(anterior), len(libro)),
+                "cambiadas": cambiadas,
+                "bolsillos": bolsillos_cambiados(base["resumen"], resumen)
+            }
+        # El libro anterior es el mismo objeto de cargar_libro: no se guarda una segunda copia de la hoja
+        base.update(huella=huella, libro=libro, resumen=resumen, cubo=cubo)
+        return cambios
+
+def agregados_de(huella, clave):
+    """Agregado ya calculado por actualizar_agregados para esta huella, o None si la base es de otra"""
+    base = agregados_incrementales()
+    with base["candado"]:
+        if base["huella"] == huella:
+            return base[clave]
+    return None
+
+def refrescar_datos(vigente):
+    """Revisa el origen, deja calientes las cachés de la nueva huella y luego la publica"""
+    # Un refresco a la vez: la carga en primer plano tras una falla y el hilo de fondo comparten el estado del origen
+    # (ETag, Last-Modified, huella) y publicarían dos veces; el candado es reentrante porque huella_datos ya lo tiene
+    with vigente["candado"]:
+        huella = revisar_origen(ORIGEN_DATOS, estado_origenes().setdefault(str(ORIGEN_DATOS), {}))
+
+        # Si el contenido cambió, los agregados se actualizan con las diferencias frente al export anterior
+        cambios = None
+        if vigente["actual"] is None or vigente["actual"][0] != huella:
+            cambios = actualizar_agregados(huella)
+
+        # Calcular antes de publicar: ningún usuario espera el procesamiento
+        procesar_datos_sgp(huella)
+        calcular_cubo_conceptos(huella)
+        procesar_recursos_propios(huella)
+
+        # Una sola asignación: las sesiones ven la versión anterior o la nueva, nunca una mezcla
+        vigente["actual"] = (huella, datetime.now())
+        vigente["error"] = None
+        if cambios is not None:
+            vigente["cambios"] = cambios
+
+        # Guardar el corte en el histórico en otro hilo: la primera carga no lo espera y una falla no afecta los datos publicados
+        threading.Thread(target=registrar_corte_vigente, args=(huella,), name="historico-presupuesto", daemon=True).start()
+
+@st.cache_resource
+def candado_historico():
+    """Un solo registro del corte vigente a la vez en el proceso"""
+    return threading.Lock()
+
+def registrar_corte_vigente(huella):
+    """Guarda en el histórico el corte publicado a partir del libro y los agregados en caché, sin volver a procesar el export"""
+    try:
+        with candado_historico():
+            if corte_registrado(huella):
+                return
+            # La fecha sale del encabezado 'Período: ...' de la primera fila; no hace falta el export completo
+            primera_fila = leer_primera_fila_snapshot(huella)
+            if primera_fila is None:
+                primera_fila = cargar_datos_originales(huella).iloc[:1]
+            tablas = tablas_corte(procesar_datos_sgp(huella), calcular_cubo_conceptos(huella))
+            registrar_libro(huella, cargar_libro(huella), tablas, ORIGEN_DATOS, detectar_fecha_corte(primera_fila, ORIGEN_DATOS))
+    except Exception as e:
+        # Los datos publicados siguen sirviéndose; la falla queda en el log y en el aviso de la fecha de los datos
+        registro.exception(json.dumps({"evento": "historico_fallo", "huella": huella}, ensure_ascii=False))
+        datos_vigentes()["error"] = f"no se pudo guardar el corte en el histórico ({type(e).__name__}: {e})"
+
+def actualizar_en_segundo_plano(vigente):
+    """Bucle del hilo de fondo: refresca los datos cada INTERVALO_ACTUALIZACION segundos"""
+    while True:
+        time.sleep(INTERVALO_ACTUALIZACION)
+        try:
+            refrescar_datos(vigente)
+        except Exception as e:
+            # Se siguen sirviendo los últimos datos publicados
+            vigente["error"] = str(e)
+
+@st.cache_resource
+def datos_vigentes():
+    """Huella publicada y fecha de los datos, compartidas por el proceso; arranca el hilo que las mantiene al día"""
+    vigente = {"actual": None, "error": None, "cambios": None, "fallo": None, "candado": threading.RLock()}
+    hilo = threading.Thread(
+        target=actualizar_en_segundo_plano,
+        args=(vigente,),
+        name="actualizador-presupuesto",
+        daemon=True
+    )
+    hilo.start()
+    return vigente
+
+def huella_datos():
+    """Huella de los datos publicados; solo la primera carga del proceso se hace en primer plano"""
+    vigente = datos_vigentes()
+
+    if vigente["actual"] is None:
+        # Una sola carga a la vez: las sesiones que llegan mientras tanto esperan el candado y usan su resultado
+        with vigente["candado"]:
+            if vigente["actual"] is None:
+                fallo = vigente["fallo"]
+                if fallo is None or time.monotonic() - fallo[0] >= ESPERA_REINTENTO:
+                    try:
+                        refrescar_datos(vigente)
+                        fallo = None
+                    except Exception as e:
+                        fallo = (time.monotonic(), e)
+                    vigente["fallo"] = fallo
+
+                if fallo is not None:
+                    if isinstance(fallo[1], FileNotFoundError):
+                        st.error(f"❌ No se pudo encontrar el archivo '{ORIGEN_DATOS}'. Por favor verifica que el archivo esté en la ubicación correcta.")
+                    else:
+                        st.error(f"❌ Error al cargar el archivo: {str(fallo[1])}")
+                    return None
+
+    return vigente["actual"][0]
+
+def mostrar_fecha_datos():
+    """Muestra la fecha de la última revisión de los datos publicados"""
+    vigente = datos_vigentes()
+    if vigente["actual"] is None:
+        return
 
-        filtro_ssf_patron = (
-            (df["Nombre"] == "SGP PRESTACION DEL.SERVICIO SSF") &
-            (df["Concepto de gasto"].isin(conceptos_ssf_patron)) &
-            (ultimos_dos < 65)
-        )
+    texto = f"📅 Datos al {vigente['actual'][1]:%d/%m/%Y %H:%M}"
+    cambios = vigente["cambios"]
+    if cambios is not None:
+        if cambios["cambiadas"] is not None:
+            texto += f" · Frente al export anterior: {cambios['cambiadas']} filas modificadas"
+        else:
+            texto += " · Frente al export anterior: {:,} → {:,} filas (se recalculó completo)".format(*cambios["filas"]).replace(",", ".")
+        if cambios["bolsillos"]:
+            texto += f" · Bolsillos con cambios: {', '.join(cambios['bolsillos'])}"
+    if vigente["error"]:
+        texto += f" · ⚠ La última actualización falló: {vigente['error']}"
+    st.caption(texto)
+
+@contar_cache(st.cache_data(max_entries=4))
+def cargar_datos_originales(huella):
+    """Carga el archivo original con cache para mejor rendimiento; solo cambia cuando cambia la huella"""
+    if huella is None:
+        return None
 
-        ssf_patron = {
-            "DISPONIBLE": df.loc[filtro_ssf_patron, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_ssf_patron, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_ssf_patron, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_ssf_patron, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_ssf_patron, "RECURSOS SIN EJECUTAR"].sum()
-        }
+    try:
+        with medir("leer snapshot"):
+            df = leer_snapshot(huella)
+        if df is None:
+            # Snapshot no disponible (carpeta sin permisos o borrada): volver a leer el origen
+            with medir("volver a leer el origen"):
+                df = cargar_snapshot(ORIGEN_DATOS)
+    except Exception as e:
+        st.error(f"❌ Error al cargar el archivo: {str(e)}")
+        return None
 
-        # --- 🔹 5. ADMINISTRATIVOS SGP ---
-        conceptos_administrativos = [
-            'O231010100101 Sueldo básico',
-            'O231010100204 Prima semestral',
-            'O23101010010802 Prima de vacaciones',
-            'O23101010010801 Prima de navidad',
-            'O231010100107 Bonificación por servicios prestados',
-            'O231010100109 Prima técnica salarial',
-            'O23101010021201 Beneficios a los empleados a corto plazo',
-            'O231010300103 Bonificación especial de recreación',
-            'O2310103068 Prima secretarial',
-            'O231010200401 Compensar',
-            'O2310102006 Aportes al ICBF',
-            'O2310102009 Aportes a escuelas industriales e institutos técnicos',
-            'O2310102007 Aportes al SENA',
-            'O2310102008 Aportes a la ESAP',
-            'O231010200202 Aportes a la seguridad social en salud privada',
-            'O231010200102 Aportes a la seguridad social en pensiones privadas',
-            'O231010200101 Aportes a la seguridad social en pensiones públicas',
-            'O231010200502 Aportes generales al sistema de riesgos laborales privados',
-            'O231010200302 Aportes de cesantías a fondos privados',
-            'O231010200301 Aportes de cesantías a fondos públicos'
-        ]
-
-        filtro_administrativos = (
-            (df["Nombre"] == "SGP Prest. Serv. Nómina Educació") &
-            (df["Concepto de gasto"].isin(conceptos_administrativos)) &
-            (ultimos_dos >= 65) & (ultimos_dos <= 86)
-        )
+    return df
 
-        administrativos = {
-            "DISPONIBLE": df.loc[filtro_administrativos, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_administrativos, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_administrativos, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_administrativos, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_administrativos, "RECURSOS SIN EJECUTAR"].sum()
-        }
+@st.cache_resource(max_entries=2)
+def cargar_libro(huella):
+    """Libro presupuestal normalizado, compartido sin copias por todas las pantallas (solo lectura)"""
+    df = cargar_datos_originales(huella)
+    if df is None:
+        return None
 
-        # --- 🔹 6. DOC REC PROPIOS ---
-        conceptos_doc_rec_propios = [
-            'O231010100101 Sueldo básico',
-            'O231010100102 Horas extras, dominicales, festivos y recargos',
-            'O231010100104 Subsidio de alimentación',
-            'O231010100105 Auxilio de Transporte',
-            'O231010100106 Prima de servicio',
-            'O23101010010801 Prima de navidad',
-            'O23101010010802 Prima de vacaciones',
-            'O231010200101 Aportes a la seguridad social en pensiones públicas',
-            'O231010200201 Aportes a la seguridad social en salud pública',
-            'O231010200301 Aportes de cesantías a fondos públicos',
-            'O231010200401 Compensar',
-            'O2310102006 Aportes al ICBF',
-            'O2310102007 Aportes al SENA',
-            'O2310102008 Aportes a la ESAP',
-            'O2310102009 Aportes a escuelas industriales e institutos técnicos'
-        ]
-
-        filtro_doc_rec_propios = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"].isin(conceptos_doc_rec_propios)) &
-            (ultimos_dos <= 57)
-        )
+    try:
+        with medir("normalizar libro (Codigo_O)"):
+            return normalizar_libro(df)
+    except Exception as e:
+        st.error(f"❌ Error al normalizar el archivo: {str(e)}")
+        return None
 
-        doc_rec_propios = {
-            "DISPONIBLE": df.loc[filtro_doc_rec_propios, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_doc_rec_propios, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_doc_rec_propios, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_doc_rec_propios, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_doc_rec_propios, "RECURSOS SIN EJECUTAR"].sum()
-        }
+@st.cache_resource(max_entries=2)
+def cargar_indice(huella):
+    """Posiciones de las filas de cada fuente y concepto del libro; se arman una vez por carga"""
+    libro = cargar_libro(huella)
+    if libro is None:
+        return None
 
-        # --- 🔹 7. ADTIVOS REC PROP ---
-        conceptos_adtivos_rec_prop = [
-            'O231010100101 Sueldo básico',
-            'O231010100104 Subsidio de alimentación',
-            'O231010100105 Auxilio de Transporte',
-            'O231010100107 Bonificación por servicios prestados',
-            'O23101010010801 Prima de navidad',
-            'O23101010010802 Prima de vacaciones',
-            'O231010100109 Prima técnica salarial',
-            'O231010100204 Prima semestral',
-            'O23101010021201 Beneficios a los empleados a corto plazo',
-            'O231010200101 Aportes a la seguridad social en pensiones públicas',
-            'O231010200102 Aportes a la seguridad social en pensiones privadas',
-            'O231010200202 Aportes a la seguridad social en salud privada',
-            'O231010200302 Aportes de cesantías a fondos privados',
-            'O231010200301 Aportes de cesantías a fondos públicos',
-            'O231010200401 Compensar',
-            'O231010200502 Aportes generales al sistema de riesgos laborales privados',
-            'O2310102006 Aportes al ICBF',
-            'O2310102007 Aportes al SENA',
-            'O2310102008 Aportes a la ESAP',
-            'O2310102009 Aportes a escuelas industriales e institutos técnicos',
-            'O231010300103 Bonificación especial de recreación'
-        ]
-
-        filtro_adtivos_rec_prop = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"].isin(conceptos_adtivos_rec_prop)) &
-            (ultimos_dos >= 65) & (ultimos_dos <= 86)
-        )
+    with medir("indexar fuentes y conceptos"):
+        return indexar_libro(libro)
 
-        adtivos_rec_prop = {
-            "DISPONIBLE": df.loc[filtro_adtivos_rec_prop, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_adtivos_rec_prop, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_adtivos_rec_prop, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_adtivos_rec_prop, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_adtivos_rec_prop, "RECURSOS SIN EJECUTAR"].sum()
-        }
+@st.cache_resource(max_entries=2)
+def cargar_detalle(huella):
+    """Índice invertido de cada fila de las tablas a las líneas del libro que la suman; se arma una vez por carga"""
+    indice = cargar_indice(huella)
+    if indice is None:
+        return None
 
-        # --- 🔹 8. SENTENCIAS (NUEVA FILA) ---
-        conceptos_sentencias = [
-            'O2380501002 Multas judiciales'
-        ]
+    with medir("indexar detalle de líneas"):
+        return indexar_detalle(cargar_libro(huella), indice)
 
-        filtro_sentencias = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"].isin(conceptos_sentencias))
+def mostrar_detalle_lineas(huella, tabla, filas, clave):
+    """Despliega las líneas Codigo_O que componen la fila elegida, sin volver a filtrar el libro"""
+    with st.expander("🔎 Ver las líneas Codigo_O de una fila"):
+        fila = st.selectbox(
+            "Bolsillo o concepto", filas, index=None, placeholder="Elige una fila de la tabla", key=f"detalle_{clave}"
         )
-
-        sentencias = {
-            "DISPONIBLE": df.loc[filtro_sentencias, "DISPONIBLE"].sum(),
-            "RP EMITIDOS": df.loc[filtro_sentencias, "RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": df.loc[filtro_sentencias, "GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": df.loc[filtro_sentencias, "SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": df.loc[filtro_sentencias, "RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        # --- 🔹 Crear tabla resumen con nuevo orden ---
-        # Primero las 4 filas principales con nuevos nombres
-        resumen_principal = pd.DataFrame(
-            [
-                csf,                    # 1. SGP CSF (Salarios + Parafiscales)
-                ssf_empleado,           # 2. SGP SSF FOMAG (Empleado)
-                ssf_patron,             # 3. SGP SSF FOMAG (Patrón)
-                fomag                   # 4. SGP CSF FOMAG
-            ],
-            index=[
-                "SGP CSF (Salarios + Parafiscales)",
-                "SGP SSF FOMAG (Empleado)",
-                "SGP SSF FOMAG (Patrón)",
-                "SGP CSF FOMAG"
-            ]
+        if fila is None:
+            return
+
+        detalle = cargar_detalle(huella)
+        if detalle is None:
+            return
+        posiciones = detalle.get((tabla, fila), np.empty(0, dtype=np.intp))
+        lineas = lineas_detalle(cargar_libro(huella), posiciones)
+
+        st.caption(f"{len(lineas)} líneas del libro suman en '{fila}'")
+        st.dataframe(
+            lineas,
+            use_container_width=True,
+            hide_index=True,
+            column_config={col: st.column_config.NumberColumn(format="localized") for col in COLUMNAS_VALORES}
         )
 
-        # Calcular TOTAL SGP DOCENTES (suma de las primeras 4 filas)
-        total_docentes = resumen_principal.sum()
-        
-        # Crear DataFrames individuales para las filas especiales
-        total_docentes_df = pd.DataFrame([total_docentes], index=["TOTAL SGP DOCENTES"])
-        administrativos_df = pd.DataFrame([administrativos], index=["Administrativos SGP"])
-        doc_rec_propios_df = pd.DataFrame([doc_rec_propios], index=["DOC REC PROPIOS"])
-        adtivos_rec_prop_df = pd.DataFrame([adtivos_rec_prop], index=["ADTIVOS REC PROP"])
-        sentencias_df = pd.DataFrame([sentencias], index=["SENTENCIAS"])
-        
-        # Calcular TOTAL SGP P8033 (TOTAL SGP DOCENTES + Administrativos SGP)
-        total_docentes_dict = total_docentes.to_dict()
-        administrativos_dict = administrativos
-        
-        total_p8033 = {}
-        for key in total_docentes_dict.keys():
-            total_p8033[key] = total_docentes_dict[key] + administrativos_dict[key]
-        
-        total_p8033_df = pd.DataFrame([total_p8033], index=["TOTAL SGP P8033"])
-
-        # Calcular TOTAL RECURSOS PROPIOS P8033 (DOC REC PROPIOS + ADTIVOS REC PROP + SENTENCIAS)
-        total_recursos_propios = {}
-        for key in doc_rec_propios.keys():
-            total_recursos_propios[key] = doc_rec_propios[key] + adtivos_rec_prop[key] + sentencias[key]
-        
-        total_recursos_propios_df = pd.DataFrame([total_recursos_propios], index=["TOTAL RECURSOS PROPIOS P8033"])
+# Los agregados son recursos del proceso: un solo cálculo por huella (las demás sesiones esperan ese cálculo)
+# y todas reciben el mismo objeto, sin copias ni deserialización por sesión. Son de solo lectura.
+@contar_cache(st.cache_resource(max_entries=4))
+def procesar_datos_sgp(huella):
+    """Función específica para procesar datos SGP - SOLO PARA PANTALLA 2"""
+    resumen = agregados_de(huella, "resumen")
+    if resumen is not None:
+        return resumen
 
-        # Calcular TOTAL SGP+RP P8033 (TOTAL SGP P8033 + TOTAL RECURSOS PROPIOS P8033)
-        total_sgp_rp = {}
-        for key in total_p8033.keys():
-            total_sgp_rp[key] = total_p8033[key] + total_recursos_propios[key]
+    libro = cargar_libro(huella)
+    if libro is None:
+        return None
         
-        total_sgp_rp_df = pd.DataFrame([total_sgp_rp], index=["TOTAL SGP+RP P8033"])
-
-        # Concatenar todo en el orden correcto
-        resumen = pd.concat([
-            resumen_principal,          # Filas 1-4
-            total_docentes_df,          # TOTAL SGP DOCENTES
-            administrativos_df,         # Administrativos SGP (bolsillo 5)
-            total_p8033_df,             # TOTAL SGP P8033
-            doc_rec_propios_df,         # DOC REC PROPIOS (bolsillo 6)
-            adtivos_rec_prop_df,        # ADTIVOS REC PROP (bolsillo 7)
-            sentencias_df,              # SENTENCIAS (bolsillo 8)
-            total_recursos_propios_df,  # TOTAL RECURSOS PROPIOS P8033
-            total_sgp_rp_df             # TOTAL SGP+RP P8033
-        ])
-
-        return df, resumen
+    try:
+        with medir("resumen SGP (bolsillos)"):
+            return calcular_resumen_sgp(libro, cargar_indice(huella))
 
     except Exception as e:
         st.error(f"❌ Ocurrió un error al procesar los datos: {str(e)}")
         import traceback
         st.error(f"Detalle del error: {traceback.format_exc()}")
-        return None, None
-
-@st.cache_data(ttl=3600)
-def procesar_recursos_propios(df):
-    """Procesa los datos para RECURSOS PROPIOS con cache"""
-    if df is None:
         return None
-        
-    try:
-        # USAR EXACTAMENTE LA MISMA LÓGICA QUE EN EL TABLERO PRINCIPAL
-        df.insert(0, "Codigo_O", df.iloc[:, 0].where(df.iloc[:, 0].astype(str).str.startswith("  O")).ffill())
-        df["Concepto de gasto"] = df["Concepto de gasto"].fillna(method="ffill")
-
-        # Extraer los últimos dos caracteres de Codigo_O y convertirlos a número
-        ultimos_dos = pd.to_numeric(df["Codigo_O"].astype(str).str[-2:], errors="coerce")
-
-        # FILTRO PARA SUELDO BASICO
-        filtro_sueldo_basico = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010100101 Sueldo básico") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
-
-        # FILTRO PARA HORAS EXTRAS
-        filtro_horas_extras = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010100102 Horas extras, dominicales, festivos y recargos") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
-
-        # FILTRO PARA SUBSIDIO DE ALIMENTACIÓN
-        filtro_subsidio_alimentacion = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010100104 Subsidio de alimentación") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
-
-        # FILTRO PARA AUXILIO DE TRANSPORTE
-        filtro_auxilio_transporte = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010100105 Auxilio de Transporte") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
-
-        # FILTRO PARA PRIMA DE SERVICIOS
-        filtro_prima_servicios = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010100106 Prima de servicio") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
 
-        # FILTRO PARA PRIMA DE VACACIONES
-        filtro_prima_vacaciones = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O23101010010802 Prima de vacaciones") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
+@contar_cache(st.cache_resource(max_entries=4))
+def calcular_cubo_conceptos(huella):
+    """Suma las columnas de valores por (Nombre, Concepto de gasto, últimos dos dígitos) una sola vez"""
+    cubo = agregados_de(huella, "cubo")
+    if cubo is not None:
+        return cubo
 
-        # FILTRO PARA PRIMA DE NAVIDAD
-        filtro_prima_navidad = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O23101010010801 Prima de navidad") &
-            (ultimos_dos < 65)  # Últimos dos dígitos menores a 65
-        )
-
-        # FILTROS PARA PARAFISCALES
-        filtro_compensar = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010200401 Compensar") &
-            (ultimos_dos < 65)
-        )
-
-        filtro_icbf = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O2310102006 Aportes al ICBF") &
-            (ultimos_dos < 65)
-        )
-
-        filtro_sena = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O2310102007 Aportes al SENA") &
-            (ultimos_dos < 65)
-        )
-
-        filtro_esap = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O2310102008 Aportes a la ESAP") &
-            (ultimos_dos < 65)
-        )
-
-        filtro_escuelas_tecnicas = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O2310102009 Aportes a escuelas industriales e institutos técnicos") &
-            (ultimos_dos < 65)
-        )
+    libro = cargar_libro(huella)
+    if libro is None:
+        return None
 
-        # NUEVOS FILTROS PARA FOMAG
-        # 1. SALUD
-        filtro_salud = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010200201 Aportes a la seguridad social en salud pública") &
-            (ultimos_dos < 65)
-        )
+    try:
+        with medir("cubo de conceptos"):
+            return agrupar_cubo_conceptos(libro)
 
-        # 2. PENSION
-        filtro_pension = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010200101 Aportes a la seguridad social en pensiones públicas") &
-            (ultimos_dos < 65)
-        )
+    except Exception as e:
+        st.error(f"❌ Error al agrupar los conceptos de gasto: {str(e)}")
+        import traceback
+        st.error(f"Detalle del error: {traceback.format_exc()}")
+        return None
 
-        # 3. CESANTIAS
-        filtro_cesantias = (
-            (df["Nombre"] == "Otros Distrito Inversión") &
-            (df["Concepto de gasto"] == "O231010200301 Aportes de cesantías a fondos públicos") &
-            (ultimos_dos < 65)
-        )
+@contar_cache(st.cache_resource(max_entries=4))
+def procesar_recursos_propios(huella):
+    """Procesa los datos para RECURSOS PROPIOS con cache"""
+    cubo = calcular_cubo_conceptos(huella)
+    if cubo is None:
+        return None
 
-        # Verificar si hay filas que cumplen los filtros
-        filas_sueldo = df[filtro_sueldo_basico]
-        filas_horas = df[filtro_horas_extras]
-        filas_subsidio = df[filtro_subsidio_alimentacion]
-        filas_auxilio = df[filtro_auxilio_transporte]
-        filas_prima_servicios = df[filtro_prima_servicios]
-        filas_prima_vacaciones = df[filtro_prima_vacaciones]
-        filas_prima_navidad = df[filtro_prima_navidad]
-        filas_compensar = df[filtro_compensar]
-        filas_icbf = df[filtro_icbf]
-        filas_sena = df[filtro_sena]
-        filas_esap = df[filtro_esap]
-        filas_escuelas_tecnicas = df[filtro_escuelas_tecnicas]
-        filas_salud = df[filtro_salud]
-        filas_pension = df[filtro_pension]
-        filas_cesantias = df[filtro_cesantias]
-        
-        # Verificar si hay al menos alguna fila que cumpla los criterios
-        todas_las_filas_vacias = (
-            len(filas_sueldo) == 0 and len(filas_horas) == 0 and len(filas_subsidio) == 0 and 
-            len(filas_auxilio) == 0 and len(filas_prima_servicios) == 0 and len(filas_prima_vacaciones) == 0 and 
-            len(filas_prima_navidad) == 0 and len(filas_compensar) == 0 and len(filas_icbf) == 0 and 
-            len(filas_sena) == 0 and len(filas_esap) == 0 and len(filas_escuelas_tecnicas) == 0 and
-            len(filas_salud) == 0 and len(filas_pension) == 0 and len(filas_cesantias) == 0
-        )
-        
-        if todas_las_filas_vacias:
+    try:
+        with medir("secciones RP", seccion="TOTAL"):
+            datos = resumir_recursos_propios(cubo, RANGO_TOTAL, "DOC REC PROPIOS")
+        if datos is None:
             st.warning("⚠ No se encontraron filas con los criterios especificados")
-            return None
-
-        # Crear diccionarios con los datos sumados - CONCEPTOS DE NÓMINA
-        sueldo_basico = {
-            "DISPONIBLE": filas_sueldo["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_sueldo["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_sueldo["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_sueldo["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_sueldo["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        horas_extras = {
-            "DISPONIBLE": filas_horas["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_horas["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_horas["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_horas["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_horas["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        subsidio_alimentacion = {
-            "DISPONIBLE": filas_subsidio["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_subsidio["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_subsidio["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_subsidio["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_subsidio["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        auxilio_transporte = {
-            "DISPONIBLE": filas_auxilio["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_auxilio["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_auxilio["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_auxilio["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_auxilio["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        prima_servicios = {
-            "DISPONIBLE": filas_prima_servicios["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_prima_servicios["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_prima_servicios["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_prima_servicios["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_prima_servicios["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        prima_vacaciones = {
-            "DISPONIBLE": filas_prima_vacaciones["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_prima_vacaciones["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_prima_vacaciones["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_prima_vacaciones["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_prima_vacaciones["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        prima_navidad = {
-            "DISPONIBLE": filas_prima_navidad["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_prima_navidad["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_prima_navidad["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_prima_navidad["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_prima_navidad["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        # Diccionarios para PARAFISCALES
-        compensar = {
-            "DISPONIBLE": filas_compensar["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_compensar["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_compensar["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_compensar["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_compensar["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        icbf = {
-            "DISPONIBLE": filas_icbf["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_icbf["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_icbf["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_icbf["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_icbf["RECURSOS SIN EJECUTAR"].sum()
-        }
+        return datos
 
-        sena = {
-            "DISPONIBLE": filas_sena["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_sena["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_sena["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_sena["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_sena["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        esap = {
-            "DISPONIBLE": filas_esap["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_esap["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_esap["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_esap["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_esap["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        escuelas_tecnicas = {
-            "DISPONIBLE": filas_escuelas_tecnicas["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_escuelas_tecnicas["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_escuelas_tecnicas["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_escuelas_tecnicas["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_escuelas_tecnicas["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        # NUEVOS: Diccionarios para FOMAG
-        salud = {
-            "DISPONIBLE": filas_salud["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_salud["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_salud["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_salud["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_salud["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        pension = {
-            "DISPONIBLE": filas_pension["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_pension["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_pension["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_pension["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_pension["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        cesantias = {
-            "DISPONIBLE": filas_cesantias["DISPONIBLE"].sum(),
-            "RP EMITIDOS": filas_cesantias["RP EMITIDOS"].sum(),
-            "GIROS ACUMULADOS": filas_cesantias["GIROS ACUMULADOS"].sum(),
-            "SALDO DE APROPIACION": filas_cesantias["SALDO DE APROPIACION"].sum(),
-            "RECURSOS SIN EJECUTAR": filas_cesantias["RECURSOS SIN EJECUTAR"].sum()
-        }
-
-        # Calcular SUELDOS (suma de todos los conceptos de nómina)
-        conceptos_nomina = [sueldo_basico, horas_extras, subsidio_alimentacion, auxilio_transporte, 
-                           prima_servicios, prima_vacaciones, prima_navidad]
-        
-        sueldos_total = {
-            "DISPONIBLE": sum(concepto["DISPONIBLE"] for concepto in conceptos_nomina),
-            "RP EMITIDOS": sum(concepto["RP EMITIDOS"] for concepto in conceptos_nomina),
-            "GIROS ACUMULADOS": sum(concepto["GIROS ACUMULADOS"] for concepto in conceptos_nomina),
-            "SALDO DE APROPIACION": sum(concepto["SALDO DE APROPIACION"] for concepto in conceptos_nomina),
-            "RECURSOS SIN EJECUTAR": sum(concepto["RECURSOS SIN EJECUTAR"] for concepto in conceptos_nomina)
-        }
-
-        # Calcular TOTAL PARAFISCALES (suma de los 5 parafiscales)
-        parafiscales = [compensar, icbf, sena, esap, escuelas_tecnicas]
-        
-        total_parafiscales = {
-            "DISPONIBLE": sum(concepto["DISPONIBLE"] for concepto in parafiscales),
-            "RP EMITIDOS": sum(concepto["RP EMITIDOS"] for concepto in parafiscales),
-            "GIROS ACUMULADOS": sum(concepto["GIROS ACUMULADOS"] for concepto in parafiscales),
-            "SALDO DE APROPIACION": sum(concepto["SALDO DE APROPIACION"] for concepto in parafiscales),
-            "RECURSOS SIN EJECUTAR": sum(concepto["RECURSOS SIN EJECUTAR"] for concepto in parafiscales)
-        }
-
-        # Calcular TOTAL FOMAG (suma de los 3 conceptos FOMAG)
-        fomag_conceptos = [salud, pension, cesantias]
-        
-        total_fomag = {
-            "DISPONIBLE": sum(concepto["DISPONIBLE"] for concepto in fomag_conceptos),
-            "RP EMITIDOS": sum(concepto["RP EMITIDOS"] for concepto in fomag_conceptos),
-            "GIROS ACUMULADOS": sum(concepto["GIROS ACUMULADOS"] for concepto in fomag_conceptos),
-            "SALDO DE APROPIACION": sum(concepto["SALDO DE APROPIACION"] for concepto in fomag_conceptos),
-            "RECURSOS SIN EJECUTAR": sum(concepto["RECURSOS SIN EJECUTAR"] for concepto in fomag_conceptos)
-        }
-
-        # NUEVO: Calcular DOC REC PROPIOS (suma de SUELDOS + TOTAL PARAFISCALES + TOTAL FOMAG)
-        doc_rec_propios = {
-            "DISPONIBLE": sueldos_total["DISPONIBLE"] + total_parafiscales["DISPONIBLE"] + total_fomag["DISPONIBLE"],
-            "RP EMITIDOS": sueldos_total["RP EMITIDOS"] + total_parafiscales["RP EMITIDOS"] + total_fomag["RP EMITIDOS"],
-            "GIROS ACUMULADOS": sueldos_total["GIROS ACUMULADOS"] + total_parafiscales["GIROS ACUMULADOS"] + total_fomag["GIROS ACUMULADOS"],
-            "SALDO DE APROPIACION": sueldos_total["SALDO DE APROPIACION"] + total_parafiscales["SALDO DE APROPIACION"] + total_fomag["SALDO DE APROPIACION"],
-            "RECURSOS SIN EJECUTAR": sueldos_total["RECURSOS SIN EJECUTAR"] + total_parafiscales["RECURSOS SIN EJECUTAR"] + total_fomag["RECURSOS SIN EJECUTAR"]
-        }
-        
-        return {
-            # Conceptos de nómina
-            "SUELDO BASICO": sueldo_basico,
-            "HORAS EXTRAS": horas_extras,
-            "SUBSIDIO DE ALIMENTACIÓN": subsidio_alimentacion,
-            "AUXILIO DE TRANSPORTE": auxilio_transporte,
-            "PRIMA DE SERVICIOS": prima_servicios,
-            "PRIMA DE VACACIONES": prima_vacaciones,
-            "PRIMA DE NAVIDAD": prima_navidad,
-            "SUELDOS": sueldos_total,  # Total nómina
-            
-            # Parafiscales
-            "COMPENSAR": compensar,
-            "ICBF": icbf,
-            "SENA": sena,
-            "ESAP": esap,
-            "ESCUELAS TÉCNICAS": escuelas_tecnicas,
-            "TOTAL PARAFISCALES": total_parafiscales,  # Total parafiscales
-            
-            # FOMAG
-            "SALUD": salud,
-            "PENSIÓN": pension,
-            "CESANTÍAS": cesantias,
-            "TOTAL FOMAG": total_fomag,  # Total FOMAG
-            
-            # NUEVO: TOTAL GENERAL
-            "DOC REC PROPIOS": doc_rec_propios  # Total general
-        }
-        
     except Exception as e:
         st.error(f"❌ Error al procesar recursos propios: {str(e)}")
         import traceback
         st.error(f"Detalle del error: {traceback.format_exc()}")
         return None
 
-# =============================================================================
-# PANTALLA 1: INICIO
-# =============================================================================
-def mostrar_pantalla_inicial():
-    st.markdown("<div class='pantalla-inicial'>", unsafe_allow_html=True)
-    
-    # Logos en la parte superior
-    st.markdown("<div class='contenedor-logos'>", unsafe_allow_html=True)
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col1:
-        st.image("logo_bogota.png", width=250, use_container_width=True)
-    with col2:
-        st.markdown("<div class='header'><h1>SECRETARÍA DE EDUCACIÓN DE BOGOTÁ</h1><h2>CONTROL PRESUPUESTAL NÓMINA</h2></div>", unsafe_allow_html=True)
-    with col3:
-        st.image("logo_alcaldía_mayor.png", width=250, use_container_width=True)
-    st.markdown("</div>", unsafe_allow_html=True)
-    
-    # Tres botones de navegación
-    st.markdown("<div class='contenedor-botones'>", unsafe_allow_html=True)
-    
-    # Botón principal protagonista - TABLERO PRINCIPAL
-    col_principal = st.columns([1])
-    with col_principal[0]:
-        if st.button("🏠 TABLERO PRINCIPAL", key="principal", use_container_width=True):
-            st.session_state.pagina_actual = "POR_FUENTE"
-            st.rerun()
-    
-    # Espacio para separar el botón principal
-    st.markdown("<div style='margin: 20px 0;'></div>", unsafe_allow_html=True)
-    
-    # Dos botones secundarios
-    col_secundarios = st.columns(2)
-    
-    with col_secundarios[0]:
-        if st.button("💰 RECURSOS PROPIOS", key="recursos_propios", use_container_width=True):
-            st.session_state.pagina_actual = "RECURSOS_PROPIOS"
-            st.rerun()
-    
-    with col_secundarios[1]:
-        if st.button("📊 SISTEMA GENERAL DE PARTICIPACIONES", key="sgp", use_container_width=True):
-            st.session_state.pagina_actual = "SGP"
-            st.rerun()
-    
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# =============================================================================
-# PANTALLA 2: TABLERO PRINCIPAL (POR FUENTE)
-# =============================================================================
-def mostrar_tabla_sgp(resumen):
-    """Función específica para mostrar tabla SGP - SOLO PARA PANTALLA 2"""
-    if resumen is None:
-        return
+@contar_cache(st.cache_resource(max_entries=16))
+def procesar_seccion_recursos_propios(huella, seccion):
+    """Tabla de una sección de RECURSOS PROPIOS; cada sección se calcula la primera vez que se abre"""
+    if seccion == "TOTAL":
+        return procesar_recursos_propios(huella)
 
-    # Formatear números con separadores de miles
-    resumen_formateado = resumen.copy()
-    for col in resumen_formateado.columns:
-        resumen_formateado[col] = resumen_formateado[col].apply(
-            lambda x: f"${x:,.0f}".replace(",", ".") if pd.notnull(x) else "$0"
-        )
+    cubo = calcular_cubo_conceptos(huella)
+    if cubo is None:
+        return None
 
-    # --- 🔹 MOSTRAR TABLA CON DISEÑO PERSONALIZADO ---
-    st.markdown("<div class='titulo-tabla'>📊 TABLA RESUMEN EJECUCIÓN PRESUPUESTAL - SGP</div>", unsafe_allow_html=True)
-    
-    # Crear HTML personalizado para la tabla
-    html_tabla = """
-    <div class="tabla-container">
-        <table class="tabla-personalizada">
-            <thead>
-                <tr>
-                    <th>BOLSILLOS</th>
-                    <th>CONCEPTO</th>
-                    <th>DISPONIBLE</th>
-                    <th>RP EMITIDOS</th>
-                    <th>GIROS ACUMULADOS</th>
-                    <th>SALDO DE APROPIACION</th>
-                    <th>RECURSOS SIN EJECUTAR</th>
-                </tr>
-            </thead>
-            <tbody>
-    """
-
-    # Agregar filas de datos con numeración
-    bolsillos = 1
-    for idx, row in resumen_formateado.iterrows():
-        if idx == "TOTAL SGP DOCENTES":
-            html_tabla += '<tr class="fila-total">'
-            html_tabla += f'<td class="encabezado-fila"></td>'  # Celda vacía para bolsillos
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-        elif idx == "Administrativos SGP":
-            html_tabla += '<tr>'
-            html_tabla += f'<td class="encabezado-fila">{bolsillos}</td>'
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-            bolsillos += 1
-        elif idx == "TOTAL SGP P8033":
-            html_tabla += '<tr class="fila-total-final">'
-            html_tabla += f'<td class="encabezado-fila"></td>'  # Celda vacía para bolsillos
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-        elif idx == "DOC REC PROPIOS":
-            html_tabla += '<tr>'
-            html_tabla += f'<td class="encabezado-fila">{bolsillos}</td>'
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-            bolsillos += 1
-        elif idx == "ADTIVOS REC PROP":
-            html_tabla += '<tr>'
-            html_tabla += f'<td class="encabezado-fila">{bolsillos}</td>'
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-            bolsillos += 1
-        elif idx == "SENTENCIAS":
-            html_tabla += '<tr>'
-            html_tabla += f'<td class="encabezado-fila">{bolsillos}</td>'
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-            bolsillos += 1
-        elif idx == "TOTAL RECURSOS PROPIOS P8033":
-            html_tabla += '<tr class="fila-total">'
-            html_tabla += f'<td class="encabezado-fila"></td>'  # Celda vacía para bolsillos
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-        elif idx == "TOTAL SGP+RP P8033":
-            html_tabla += '<tr class="fila-total-general">'
-            html_tabla += f'<td class="encabezado-fila"></td>'  # Celda vacía para bolsillos
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-        else:
-            html_tabla += '<tr>'
-            html_tabla += f'<td class="encabezado-fila">{bolsillos}</td>'
-            html_tabla += f'<td class="encabezado-fila">{idx}</td>'
-            bolsillos += 1
-        
-        html_tabla += f'<td class="numero">{row["DISPONIBLE"]}</td>'
-        html_tabla += f'<td class="numero">{row["RP EMITIDOS"]}</td>'
-        html_tabla += f'<td class="numero">{row["GIROS ACUMULADOS"]}</td>'
-        html_tabla += f'<td class="numero">{row["SALDO DE APROPIACION"]}</td>'
-        html_tabla += f'<td class="numero">{row["RECURSOS SIN EJECUTAR"]}</td>'
-        html_tabla += '</tr>'
-
-    html_tabla += """
-            </tbody>
-        </table>
-    </div>
-    """
+    rango, total_final = next((rango, total) for nombre, rango, total in SECCIONES_RECURSOS_PROPIOS if nombre == seccion)
+    with medir("secciones RP", seccion=seccion):
+        return resumir_recursos_propios(cubo, rango, total_final)
 
-    st.markdown(html_tabla, unsafe_allow_html=True)
+@contar_cache(st.cache_resource(max_entries=4))
+def generar_exportacion(huella, formato, con_historico, con_detalle, cortes_historico=None):
+    """Archivo con todas las tablas e indicadores, armado desde los agregados en caché; se genera una vez por huella y opciones"""
+    # cortes_historico (cuántos cortes hay registrados) solo forma parte de la llave del caché: los cortes no se borran,
+    # así que un corte nuevo cambia la cuenta y el archivo con histórico se vuelve a armar
+    resumen = procesar_datos_sgp(huella)
+    if resumen is None:
+        return None
 
-    # --- 🔹 MOSTRAR ESTADÍSTICAS ADICIONALES ---
-    st.markdown("<div class='subtitulo'>Resumen Ejecutivo:</div>", unsafe_allow_html=True)
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        disponible_total = resumen.loc["TOTAL SGP+RP P8033", "DISPONIBLE"]
-        if disponible_total > 0:
-            porcentaje_ejecutado = (resumen.loc["TOTAL SGP+RP P8033", "GIROS ACUMULADOS"] / disponible_total) * 100
-        else:
-            porcentaje_ejecutado = 0
-            
-        st.metric(
-            label="💰 % Ejecutado", 
-            value=f"{porcentaje_ejecutado:.1f}%",
-            delta=f"GIROS: ${resumen.loc['TOTAL SGP+RP P8033', 'GIROS ACUMULADOS']:,.0f}".replace(",", ".")
-        )
-    
-    with col2:
-        if disponible_total > 0:
-            porcentaje_rp = (resumen.loc["TOTAL SGP+RP P8033", "RP EMITIDOS"] / disponible_total) * 100
-            delta_text = f"{porcentaje_rp:.1f}% del disponible"
-        else:
-            delta_text = "0% del disponible"
-            
-        st.metric(
-            label="📋 RP Emitidos", 
-            value=f"${resumen.loc['TOTAL SGP+RP P8033', 'RP EMITIDOS']:,.0f}".replace(",", "."),
-            delta=delta_text
-        )
-    
-    with col3:
-        st.metric(
-            label="💸 Disponible Total", 
-            value=f"${disponible_total:,.0f}".replace(",", ".")
-        )
-    
-    with col4:
-        st.metric(
-            label="⏳ Por Ejecutar", 
-            value=f"${resumen.loc['TOTAL SGP+RP P8033', 'RECURSOS SIN EJECUTAR']:,.0f}".replace(",", "."),
-            delta_color="inverse"
+    tablas = {"SGP": resumen}
+    for seccion in PESTANAS_RECURSOS_PROPIOS:
+        datos = procesar_seccion_recursos_propios(huella, seccion)
+        if datos is not None:
+            tablas[seccion] = pd.DataFrame.from_dict(datos, orient="index")
+
+    salida = io.BytesIO()
+    with medir("exportar tablas", formato=formato, historico=con_historico, detalle=con_detalle):
+        exportar_tablas(
+            salida,
+            formato,
+            tablas,
+            indicadores_sgp(resumen),
+            historico=leer_totales_historico() if con_historico else None,
+            libro=cargar_libro(huella) if con_detalle else None,
+            detalle=cargar_detalle(huella) if con_detalle else None
         )
-
-def mostrar_pantalla_por_fuente():
-    # Botón para volver al inicio
-    if st.button("← Volver al Inicio", key="volver_fuente"):
-        st.session_state.pagina_actual = "INICIO"
-        st.rerun()
-    
-    # Encabezado con ambos logos
-    st.markdown("<div class='contenedor-logos'>", unsafe_allow_html=True)
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col1:
-        st.image("logo_bogota.png", width=150, use_container_width=True)
-    with col2:
-        st.markdown("<div class='header'><h2>Sistema General de Participaciones y Recursos Propios</h2></div>", unsafe_allow_html=True)
-    with col3:
-        st.image("logo_alcaldía_mayor.png", width=150, use_container_width=True)
-    st.markdown("</div>", unsafe_allow_html=True)
-    
-    # Procesar y mostrar datos con spinner
-    with st.spinner("Cargando datos presupuestales..."):
-        df, resumen = procesar_datos_sgp()
-    
-    if resumen is not None:
-        mostrar_tabla_sgp(resumen)
+    return salida.getvalue()
+
+@contar_cache(st.cache_data(ttl=600, show_spinner=False))
+def sincronizar_exports_locales():
+    """Incorpora al histórico los exports de CARPETA_EXPORTS que todavía no estén; devuelve cuántos se agregaron"""
+    nuevos = 0
+    for ruta in buscar_exports():
+        try:
+            nuevos += ingerir_export(ruta)
+        except Exception as e:
+            st.warning(f"⚠ No se pudo incorporar '{ruta.name}' al histórico: {str(e)}")
+    return nuevos
+
+@contar_cache(st.cache_data(max_entries=2, show_spinner=False))
+def cargar_libro_proyeccion(ruta, firma):
+    """Libro de proyección para mostrar en pantalla; solo se guardan los dos libros del mes visible"""
+    return leer_libro_proyeccion(ruta, firma)
+
+def cargar_proyeccion(carpeta_mes):
+    """Libros de sueldos y aportes de un mes; {'SUELDOS': df, 'APORTES': df}"""
+    archivos = {tipo: (str(ruta), ruta.stat().st_mtime_ns, ruta.stat().st_size) for tipo, ruta in rutas_proyeccion(carpeta_mes).items()}
+    # Los libros sin snapshot se parsean en procesos aparte; luego cada uno se lee de su snapshot
+    preparar_libros_proyeccion(list(archivos.values()))
+    return {tipo: cargar_libro_proyeccion(ruta, (mtime, tamano)) for tipo, (ruta, mtime, tamano) in archivos.items()}
+
+@contar_cache(st.cache_data(max_entries=24, show_spinner=False))
+def totales_mes_nomina(carpeta_mes, firma):
+    """Gasto de un mes por concepto (sueldos + aportes); la firma de sus archivos invalida solo este mes"""
+    with medir("reducir mes de nómina", carpeta=carpeta_mes):
+        return reducir_mes_nomina(firma)
+
+def recorrer_meses_nomina(meses):
+    """Recorre las carpetas de mes en orden y entrega (mes, vector de totales) uno a uno"""
+    for mes, carpeta in meses.items():
+        yield mes, totales_mes_nomina(str(carpeta), firma_mes_proyeccion(carpeta))
+
+def matriz_nomina(meses):
+    """Matriz (conceptos x meses) con el gasto de nómina de cada mes; solo los meses nuevos o cambiados se procesan"""
+    with medir("matriz de nómina", meses=len(meses)):
+        return np.column_stack([totales for _, totales in recorrer_meses_nomina(meses)])
 
 # =============================================================================
-# PANTALLA 3: RECURSOS PROPIOS
+# RENDERIZADO DE TABLAS HTML
 # =============================================================================
-def mostrar_tabla_recursos_propios(datos, seccion_titulo):
-    """Muestra la tabla de RECURSOS PROPIOS con opción de desplegar detalles"""
-    if datos is None:
-        return
-    
-    # Crear DataFrame con todas las filas
-    filas = []
-    for concepto, valores in datos.items():
-        fila = valores.copy()
-        fila['CONCEPTO'] = concepto
-        filas.append(fila)
-    
-    df_recursos = pd.DataFrame(filas)
-    df_recursos.set_index('CONCEPTO', inplace=True)
-    
-    # Formatear números con separadores de miles
-    df_formateado = df_recursos.copy()
-    for col in df_formateado.columns:
-        if col != 'CONCEPTO':
-            df_formateado[col] = df_formateado[col].apply(
-                lambda x: f"${x:,.0f}".replace(",", ".") if pd.notnull(x) and x != 0 else "$0"
-            )
-    
-    # Mostrar tabla con estilo similar al tablero principal
-    st.markdown(f"<div class='titulo-tabla'>{seccion_titulo}</div>", unsafe_allow_html=True)
-    
-    # Checkbox para mostrar/ocultar detalles (más confiable que botones)
-    mostrar_detalles = st.checkbox("📊 Mostrar detalles desglosados", value=False, key=f"detalles_{seccion_titulo}")
-    
-    # Aplicar estilos CSS específicos para esta tabla
-    st.markdown("""
+# Estilos CSS de las tablas de RECURSOS PROPIOS (se envían una sola vez por pantalla)
+ESTILOS_TABLA_RECURSOS_PROPIOS = """
     <style>
     .tabla-recursos-container {
         border: 2px solid #b30000;
@@ -1198,102 +743,358 @@ def mostrar_tabla_recursos_propios(datos, seccion_titulo):
         font-weight: bold;
     }
     </style>
-    """, unsafe_allow_html=True)
+"""
+
+# Máximo de fragmentos HTML ya renderizados que se guardan en memoria
+MAX_FRAGMENTOS = 64
+
+@st.cache_resource
+def fragmentos_html():
+    """Caché LRU acotada del HTML de las tablas ya renderizadas, compartida por el proceso"""
+    return {"cache": LRUCache(maxsize=MAX_FRAGMENTOS), "candado": threading.Lock()}
+
+def fragmento_html(clave, renderizar):
+    """Devuelve el HTML guardado para la clave (huella, sección, detalles) o lo renderiza la primera vez"""
+    if clave[0] is None:
+        # Sin huella no hay forma de saber si los datos cambiaron: no se guarda
+        return renderizar()
+
+    fragmentos = fragmentos_html()
+    with fragmentos["candado"]:
+        html = fragmentos["cache"].get(clave)
+    if html is None:
+        with medir("render tabla HTML", seccion=clave[1], detalles=clave[2]):
+            html = renderizar()
+        with fragmentos["candado"]:
+            fragmentos["cache"][clave] = html
+    return html
+
+# =============================================================================
+# PANTALLA 1: INICIO
+# =============================================================================
+def mostrar_pantalla_inicial():
+    st.markdown("<div class='pantalla-inicial'>", unsafe_allow_html=True)
+    
+    # Logos en la parte superior
+    st.markdown("<div class='contenedor-logos'>", unsafe_allow_html=True)
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.image("logo_bogota.png", width=250, use_container_width=True)
+    with col2:
+        st.markdown("<div class='header'><h1>SECRETARÍA DE EDUCACIÓN DE BOGOTÁ</h1><h2>CONTROL PRESUPUESTAL NÓMINA</h2></div>", unsafe_allow_html=True)
+    with col3:
+        st.image("logo_alcaldía_mayor.png", width=250, use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Tres botones de navegación
+    st.markdown("<div class='contenedor-botones'>", unsafe_allow_html=True)
+    
+    # Botón principal protagonista - TABLERO PRINCIPAL
+    col_principal = st.columns([1])
+    with col_principal[0]:
+        if st.button("🏠 TABLERO PRINCIPAL", key="principal", use_container_width=True):
+            st.session_state.pagina_actual = "POR_FUENTE"
+            st.rerun()
     
-    html_tabla = """
-    <div class="tabla-recursos-container">
-        <table class="tabla-recursos">
-            <thead>
-                <tr>
-                    <th class="concepto-header">CONCEPTO</th>
-                    <th>DISPONIBLE</th>
-                    <th>RP EMITIDOS</th>
-                    <th>GIROS ACUMULADOS</th>
-                    <th>SALDO DE APROPIACION</th>
-                    <th>RECURSOS SIN EJECUTAR</th>
-                </tr>
-            </thead>
-            <tbody>
-    """
+    # Espacio para separar el botón principal
+    st.markdown("<div style='margin: 20px 0;'></div>", unsafe_allow_html=True)
     
-    # Definir el orden de las filas
-    conceptos_nomina = [
-        "SUELDO BASICO", "HORAS EXTRAS", "SUBSIDIO DE ALIMENTACIÓN", 
-        "AUXILIO DE TRANSPORTE", "PRIMA DE SERVICIOS", "PRIMA DE VACACIONES", 
-        "PRIMA DE NAVIDAD", "SUELDOS"
-    ]
+    # Dos botones secundarios
+    col_secundarios = st.columns(2)
     
-    conceptos_parafiscales = [
-        "COMPENSAR", "ICBF", "SENA", "ESAP", "ESCUELAS TÉCNICAS", "TOTAL PARAFISCALES"
-    ]
+    with col_secundarios[0]:
+        if st.button("💰 RECURSOS PROPIOS", key="recursos_propios", use_container_width=True):
+            st.session_state.pagina_actual = "RECURSOS_PROPIOS"
+            st.rerun()
     
-    conceptos_fomag = [
-        "SALUD", "PENSIÓN", "CESANTÍAS", "TOTAL FOMAG"
-    ]
+    with col_secundarios[1]:
+        if st.button("📊 SISTEMA GENERAL DE PARTICIPACIONES", key="sgp", use_container_width=True):
+            st.session_state.pagina_actual = "SGP"
+            st.rerun()
     
-    # Determinar el nombre del total final basado en la sección
-    if "TOTAL" in seccion_titulo:
-        total_final = "DOC REC PROPIOS"
-    elif "PRIMERA INFANCIA" in seccion_titulo:
-        total_final = "PRIMERA INFANCIA REC PROPIOS"
-    elif "ORIENTADORES" in seccion_titulo:
-        total_final = "ORIENTADORES REC PROPIOS"
-    elif "GLOBAL" in seccion_titulo:
-        total_final = "GLOBAL REC PROPIOS"
-    else:
-        total_final = "DOC REC PROPIOS"
+    st.markdown("</div>", unsafe_allow_html=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+# =============================================================================
+# PANTALLA 2: TABLERO PRINCIPAL (POR FUENTE)
+# =============================================================================
+def mostrar_tabla_sgp(resumen, huella=None):
+    """Función específica para mostrar tabla SGP - SOLO PARA PANTALLA 2"""
+    if resumen is None:
+        return
+
+    # --- 🔹 MOSTRAR TABLA CON DISEÑO PERSONALIZADO ---
+    st.markdown("<div class='titulo-tabla'>📊 TABLA RESUMEN EJECUCIÓN PRESUPUESTAL - SGP</div>", unsafe_allow_html=True)
+
+    # El HTML solo se vuelve a generar cuando cambian los datos
+    html_tabla = fragmento_html((huella, "SGP", False), lambda: renderizar_tabla_sgp(resumen))
+    st.markdown(html_tabla, unsafe_allow_html=True)
+    if huella is not None:
+        mostrar_detalle_lineas(huella, "SGP", list(resumen.index), "SGP")
+
+    # --- 🔹 MOSTRAR ESTADÍSTICAS ADICIONALES ---
+    st.markdown("<div class='subtitulo'>Resumen Ejecutivo:</div>", unsafe_allow_html=True)
     
-    # Determinar qué conceptos mostrar
-    if mostrar_detalles:
-        conceptos_ordenados = conceptos_nomina + conceptos_parafiscales + conceptos_fomag + [total_final]
-    else:
-        # Solo mostrar los totales
-        conceptos_ordenados = ["SUELDOS", "TOTAL PARAFISCALES", "TOTAL FOMAG", total_final]
+    col1, col2, col3, col4 = st.columns(4)
+    # Los mismos indicadores que van en la hoja INDICADORES de la exportación
+    indicadores = indicadores_sgp(resumen)
+    disponible_total = indicadores["DISPONIBLE TOTAL"]
     
-    for concepto in conceptos_ordenados:
-        # Verificar si el concepto existe en los datos
-        if concepto not in df_formateado.index:
-            continue
-            
-        # Aplicar estilos diferentes según el tipo de fila
-        if concepto == "SUELDOS":
-            clase_fila = "fila-total-nomina"
-            clase_celda_concepto = "concepto-total-nomina concepto-header"
-            clase_celda_numero = "celda-total-nomina numero-tabla"
-        elif concepto == "TOTAL PARAFISCALES":
-            clase_fila = "fila-total-parafiscales"
-            clase_celda_concepto = "concepto-total-parafiscales concepto-header"
-            clase_celda_numero = "celda-total-parafiscales numero-tabla"
-        elif concepto == "TOTAL FOMAG":
-            clase_fila = "fila-total-fomag"
-            clase_celda_concepto = "concepto-total-fomag concepto-header"
-            clase_celda_numero = "celda-total-fomag numero-tabla"
-        elif concepto == total_final:
-            clase_fila = "fila-total-general"
-            clase_celda_concepto = "concepto-total-general concepto-header"
-            clase_celda_numero = "celda-total-general numero-tabla"
+    with col1:
+        st.metric(
+            label="💰 % Ejecutado", 
+            value=f"{indicadores['% EJECUTADO']:.1f}%",
+            delta=f"GIROS: ${indicadores['GIROS ACUMULADOS']:,.0f}".replace(",", ".")
+        )
+    
+    with col2:
+        if disponible_total > 0:
+            delta_text = f"{indicadores['% RP DEL DISPONIBLE']:.1f}% del disponible"
         else:
-            clase_fila = ""
-            clase_celda_concepto = "concepto-header"
-            clase_celda_numero = "numero-tabla"
-        
-        html_tabla += f'<tr class="{clase_fila}">'
-        html_tabla += f'<td class="{clase_celda_concepto}">{concepto}</td>'
-        html_tabla += f'<td class="{clase_celda_numero}">{df_formateado.loc[concepto, "DISPONIBLE"]}</td>'
-        html_tabla += f'<td class="{clase_celda_numero}">{df_formateado.loc[concepto, "RP EMITIDOS"]}</td>'
-        html_tabla += f'<td class="{clase_celda_numero}">{df_formateado.loc[concepto, "GIROS ACUMULADOS"]}</td>'
-        html_tabla += f'<td class="{clase_celda_numero}">{df_formateado.loc[concepto, "SALDO DE APROPIACION"]}</td>'
-        html_tabla += f'<td class="{clase_celda_numero}">{df_formateado.loc[concepto, "RECURSOS SIN EJECUTAR"]}</td>'
-        html_tabla += '</tr>'
+            delta_text = "0% del disponible"
+            
+        st.metric(
+            label="📋 RP Emitidos", 
+            value=f"${indicadores['RP EMITIDOS']:,.0f}".replace(",", "."),
+            delta=delta_text
+        )
     
-    html_tabla += """
-            </tbody>
-        </table>
-    </div>
-    """
+    with col3:
+        st.metric(
+            label="💸 Disponible Total", 
+            value=f"${disponible_total:,.0f}".replace(",", ".")
+        )
     
+    with col4:
+        st.metric(
+            label="⏳ Por Ejecutar", 
+            value=f"${indicadores['POR EJECUTAR']:,.0f}".replace(",", "."),
+            delta_color="inverse"
+        )
+
+def mostrar_pantalla_por_fuente():
+    # Botones de navegación
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("← Volver al Inicio", key="volver_fuente", use_container_width=True):
+            st.session_state.pagina_actual = "INICIO"
+            st.rerun()
+    with col3:
+        if st.button("📅 COMPARAR CORTES", key="ir_historico", use_container_width=True):
+            st.session_state.pagina_actual = "HISTORICO"
+            st.rerun()
+    
+    # Encabezado con ambos logos
+    st.markdown("<div class='contenedor-logos'>", unsafe_allow_html=True)
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.image("logo_bogota.png", width=150, use_container_width=True)
+    with col2:
+        st.markdown("<div class='header'><h2>Sistema General de Participaciones y Recursos Propios</h2></div>", unsafe_allow_html=True)
+    with col3:
+        st.image("logo_alcaldía_mayor.png", width=150, use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+    
+    # Procesar y mostrar datos con spinner
+    with st.spinner("Cargando datos presupuestales..."):
+        huella = huella_datos()
+        resumen = procesar_datos_sgp(huella)
+    
+    if resumen is not None:
+        mostrar_fecha_datos()
+        mostrar_tabla_sgp(resumen, huella)
+        mostrar_exportacion(huella)
+
+@st.fragment
+def mostrar_exportacion(huella):
+    """Prepara bajo pedido el archivo con todas las tablas; cambiar las opciones solo vuelve a ejecutar este fragmento"""
+    with st.expander("⬇ Exportar tablas e indicadores"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            formato = st.radio(
+                "Formato", list(FORMATOS_EXPORTACION), horizontal=True, key="exportar_formato",
+                format_func=lambda formato: "Excel (.xlsx)" if formato == "xlsx" else "CSV (.zip)"
+            )
+        with col2:
+            con_historico = st.checkbox("Incluir histórico de cortes", value=False, key="exportar_historico")
+        with col3:
+            con_detalle = st.checkbox("Incluir las líneas Codigo_O de cada fila", value=False, key="exportar_detalle")
+
+        if not st.button("Preparar archivo", key="exportar_preparar", use_container_width=True):
+            return
+        with st.spinner("Preparando archivo..."):
+            cortes_historico = len(listar_cortes()) if con_historico else None
+            contenido = generar_exportacion(huella, formato, con_historico, con_detalle, cortes_historico)
+        if contenido is None:
+            st.error("❌ No se pudieron exportar las tablas")
+            return
+
+        extension, tipo = FORMATOS_EXPORTACION[formato]
+        # on_click="ignore": descargar no vuelve a ejecutar la app
+        st.download_button(
+            "💾 Descargar", contenido, file_name=f"control_presupuestal_{huella[:8]}.{extension}", mime=tipo,
+            on_click="ignore", key="exportar_descargar", use_container_width=True
+        )
+
+# =============================================================================
+# PANTALLA 2.1: COMPARACIÓN ENTRE CORTES
+# =============================================================================
+# Columnas que se comparan entre dos cortes
+COLUMNAS_COMPARACION = ["GIROS ACUMULADOS", "RP EMITIDOS"]
+
+def comparar_cortes(tabla_inicial, tabla_final, fecha_inicial, fecha_final):
+    """Tabla con las columnas de comparación en cada corte y su variación, en el orden del corte final"""
+    filas = tabla_final.index.append(tabla_inicial.index.difference(tabla_final.index, sort=False))
+    inicial = tabla_inicial.reindex(filas, fill_value=0)
+    final = tabla_final.reindex(filas, fill_value=0)
+
+    columnas = {}
+    for col in COLUMNAS_COMPARACION:
+        columnas[f"{col} {fecha_inicial}"] = inicial[col]
+        columnas[f"{col} {fecha_final}"] = final[col]
+        columnas[f"VARIACIÓN {col}"] = final[col] - inicial[col]
+    return pd.DataFrame(columnas, index=filas)
+
+def renderizar_comparacion(comparacion, tabla):
+    """Arma el HTML de la comparación con los estilos de la tabla original (SGP o RECURSOS PROPIOS)"""
+    if tabla == "SGP":
+        tipos = comparacion.index.map(lambda fila: TIPOS_FILA_SGP.get(fila, "bolsillo"))
+        estilos, clase_contenedor, clase_tabla, clase_encabezado = (
+            ESTILOS_FILA_SGP, "tabla-container", "tabla-personalizada", ""
+        )
+    else:
+        # Solo subtotales y total de la sección, como la vista sin detalles
+        total_final = next(total for seccion, _, total in SECCIONES_RECURSOS_PROPIOS if seccion == tabla)
+        tipos_fila = {**TIPOS_FILA_RECURSOS_PROPIOS, total_final: "total_general"}
+        comparacion = comparacion.loc[comparacion.index.isin(list(tipos_fila))]
+        tipos = comparacion.index.map(tipos_fila)
+        estilos, clase_contenedor, clase_tabla, clase_encabezado = (
+            ESTILOS_FILA_RECURSOS_PROPIOS, "tabla-recursos-container", "tabla-recursos", "concepto-header"
+        )
+
+    columnas_valores = list(comparacion.columns)
+    return construir_tabla_html(
+        comparacion.assign(CONCEPTO=comparacion.index, TIPO_FILA=tipos),
+        ["CONCEPTO"],
+        estilos,
+        [("CONCEPTO", clase_encabezado)] + [(col, "") for col in columnas_valores],
+        clase_contenedor,
+        clase_tabla,
+        columnas_valores=columnas_valores
+    )
+
+def mostrar_pantalla_historico():
+    if st.button("← Volver al Tablero Principal", key="volver_historico"):
+        st.session_state.pagina_actual = "POR_FUENTE"
+        st.rerun()
+
+    # Encabezado con ambos logos
+    st.markdown("<div class='contenedor-logos'>", unsafe_allow_html=True)
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.image("logo_bogota.png", width=150, use_container_width=True)
+    with col2:
+        st.markdown("<div class='header'><h2>COMPARACIÓN ENTRE CORTES</h2></div>", unsafe_allow_html=True)
+    with col3:
+        st.image("logo_alcaldía_mayor.png", width=150, use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    with st.spinner("Actualizando histórico de cortes..."):
+        # El corte vigente se registra al publicarse (en otro hilo: aquí se espera a que termine);
+        # también se agregan los exports fechados de la carpeta
+        huella = huella_datos()
+        if huella is not None:
+            registrar_corte_vigente(huella)
+        sincronizar_exports_locales()
+        cortes = listar_cortes()
+
+    if len(cortes) < 2:
+        st.info(f"ℹ Se necesitan al menos dos cortes para comparar. Cortes registrados: {len(cortes)}")
+        return
+
+    # Un corte por fecha (el último ingresado de cada día)
+    cortes = cortes.drop_duplicates("fecha_corte", keep="last").reset_index(drop=True)
+    fechas = cortes["fecha_corte"].tolist()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        tabla = st.selectbox("Tabla", ["SGP"] + [seccion for seccion, _, _ in SECCIONES_RECURSOS_PROPIOS], key="historico_tabla")
+    with col2:
+        fecha_inicial = st.selectbox("Corte inicial", fechas, index=max(len(fechas) - 2, 0), key="historico_inicial")
+    with col3:
+        fecha_final = st.selectbox("Corte final", fechas, index=len(fechas) - 1, key="historico_final")
+
+    huella_inicial = cortes.loc[cortes["fecha_corte"] == fecha_inicial, "huella"].iloc[0]
+    huella_final = cortes.loc[cortes["fecha_corte"] == fecha_final, "huella"].iloc[0]
+    tabla_inicial = leer_tabla_corte(huella_inicial, tabla)
+    tabla_final = leer_tabla_corte(huella_final, tabla)
+
+    if tabla_inicial is None or tabla_final is None:
+        st.warning(f"⚠ La tabla {tabla} no tiene datos en alguno de los cortes seleccionados")
+        return
+
+    if tabla != "SGP":
+        st.markdown(ESTILOS_TABLA_RECURSOS_PROPIOS, unsafe_allow_html=True)
+
+    st.markdown(f"<div class='titulo-tabla'>📅 {tabla}: {fecha_inicial} → {fecha_final}</div>", unsafe_allow_html=True)
+    comparacion = comparar_cortes(tabla_inicial, tabla_final, fecha_inicial, fecha_final)
+    html_tabla = fragmento_html(
+        (huella_inicial + huella_final, f"HISTORICO {tabla}", False),
+        lambda: renderizar_comparacion(comparacion, tabla)
+    )
     st.markdown(html_tabla, unsafe_allow_html=True)
 
+# =============================================================================
+# PANTALLA 3: RECURSOS PROPIOS
+# =============================================================================
+# Secciones de la pantalla, en el orden de las pestañas (los rangos de códigos están en SECCIONES_RECURSOS_PROPIOS)
+PESTANAS_RECURSOS_PROPIOS = {
+    "TOTAL": {
+        "encabezado": "🌐 TOTAL",
+        "titulo": "💰 TOTAL - RECURSOS PROPIOS",
+        "total": "DOC REC PROPIOS",
+        "sin_datos": None
+    },
+    "PRIMERA INFANCIA": {
+        "encabezado": "👶 PRIMERA INFANCIA",
+        "titulo": "👶 PRIMERA INFANCIA - RECURSOS PROPIOS",
+        "total": "PRIMERA INFANCIA REC PROPIOS",
+        "sin_datos": "⚠ No se encontraron datos para Primera Infancia"
+    },
+    "ORIENTADORES": {
+        "encabezado": "🧑‍🏫 ORIENTADORES",
+        "titulo": "🧑‍🏫 ORIENTADORES - RECURSOS PROPIOS",
+        "total": "ORIENTADORES REC PROPIOS",
+        "sin_datos": "⚠ No se encontraron datos para Orientadores"
+    },
+    "GLOBAL": {
+        "encabezado": "👩‍🏫📚👨‍🏫 GLOBAL",
+        "titulo": "🌍 GLOBAL - RECURSOS PROPIOS",
+        "total": "GLOBAL REC PROPIOS",
+        "sin_datos": "⚠ No se encontraron datos para Global"
+    }
+}
+
+def mostrar_tabla_recursos_propios(datos, seccion_titulo, huella=None, seccion=None):
+    """Muestra la tabla de RECURSOS PROPIOS con opción de desplegar detalles"""
+    if datos is None:
+        return
+    
+    # Mostrar tabla con estilo similar al tablero principal
+    st.markdown(f"<div class='titulo-tabla'>{seccion_titulo}</div>", unsafe_allow_html=True)
+    
+    # Checkbox para mostrar/ocultar detalles (más confiable que botones)
+    mostrar_detalles = st.checkbox("📊 Mostrar detalles desglosados", value=False, key=f"detalles_{seccion_titulo}")
+    
+    # Cada combinación de datos, sección y detalles se renderiza una sola vez
+    html_tabla = fragmento_html(
+        (huella, seccion_titulo, mostrar_detalles),
+        lambda: renderizar_tabla_recursos_propios(datos, seccion_titulo, mostrar_detalles)
+    )
+    st.markdown(html_tabla, unsafe_allow_html=True)
+    if huella is not None and seccion is not None:
+        mostrar_detalle_lineas(huella, seccion, list(datos), seccion)
+
 def mostrar_pantalla_recursos_propios():
     # BOTONES DE NAVEGACIÓN MEJORADOS
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -1321,263 +1122,54 @@ def mostrar_pantalla_recursos_propios():
         st.image("logo_alcaldía_mayor.png", width=150)
     st.markdown("</div>", unsafe_allow_html=True)
     
+    # Fecha de los datos publicados
+    huella = huella_datos()
+    mostrar_fecha_datos()
+
+    # Estilos de las tablas de esta pantalla, una sola vez para las cuatro secciones
+    st.markdown(ESTILOS_TABLA_RECURSOS_PROPIOS, unsafe_allow_html=True)
+
     # Información sobre el nuevo módulo
     st.info("💡 **Nuevo**: Ahora puedes acceder a las proyecciones de recursos propios usando el botón superior derecho 'RECURSOS PROPIOS PROYECCIONES'")
     
-    # =========================================================================
-    # SECCIÓN 1: TOTAL - SOLO LA TABLA SIN RESUMEN
-    # =========================================================================
     st.markdown("---")
-    st.subheader("🌐 TOTAL")
-    
-    # Cargar datos del archivo principal
-    df_principal = cargar_datos_originales()
-    
-    if df_principal is not None:
-        # Procesar RECURSOS PROPIOS
-        with st.spinner("Procesando datos de recursos propios..."):
-            datos_recursos = procesar_recursos_propios(df_principal)
-        
-        if datos_recursos is not None:
-            mostrar_tabla_recursos_propios(datos_recursos, "💰 TOTAL - RECURSOS PROPIOS")
+    if huella is None:
+        st.error("❌ No se pudo cargar el archivo de datos")
+        return
+
+    mostrar_secciones_recursos_propios(huella)
+
+@st.fragment
+def mostrar_secciones_recursos_propios(huella):
+    """Muestra solo la sección elegida; cambiar de sección vuelve a ejecutar este fragmento, no la pantalla"""
+    seccion = st.radio(
+        "Sección",
+        list(PESTANAS_RECURSOS_PROPIOS),
+        format_func=lambda seccion: PESTANAS_RECURSOS_PROPIOS[seccion]["encabezado"],
+        horizontal=True,
+        key="seccion_recursos_propios",
+        label_visibility="collapsed"
+    )
+    pestana = PESTANAS_RECURSOS_PROPIOS[seccion]
+    st.subheader(pestana["encabezado"])
+
+    with st.spinner(f"Procesando datos de {pestana['encabezado']}..."):
+        try:
+            datos = procesar_seccion_recursos_propios(huella, seccion)
+        except Exception as e:
+            st.error(f"❌ Error al procesar {seccion.lower()}: {str(e)}")
+            return
+
+    if seccion == "TOTAL":
+        if datos is not None:
+            mostrar_tabla_recursos_propios(datos, pestana["titulo"], huella, seccion)
         else:
             st.error("❌ No se pudieron procesar los datos de recursos propios")
+    # Las demás secciones se muestran solo si tienen disponible, RP o giros
+    elif datos is not None and any(datos[pestana["total"]][col] > 0 for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS"]):
+        mostrar_tabla_recursos_propios(datos, pestana["titulo"], huella, seccion)
     else:
-        st.error("❌ No se pudo cargar el archivo de datos")
-    
-    # =========================================================================
-    # 🆕 NUEVA SECCIÓN: PRIMERA INFANCIA
-    # =========================================================================
-    st.markdown("---")
-    st.subheader("👶 PRIMERA INFANCIA")
-    
-    if df_principal is not None:
-        with st.spinner("Procesando datos de primera infancia..."):
-            try:
-                # Procesar PRIMERA INFANCIA (códigos 01-19)
-                df_primera = df_principal.copy()
-                df_primera.insert(0, "Codigo_O", df_primera.iloc[:, 0].where(df_primera.iloc[:, 0].astype(str).str.startswith("  O")).ffill())
-                df_primera["Concepto de gasto"] = df_primera["Concepto de gasto"].ffill()
-                
-                # Extraer últimos dos dígitos y filtrar 01-19
-                ultimos_dos = pd.to_numeric(df_primera["Codigo_O"].astype(str).str[-2:], errors="coerce")
-                filtro_primera = (
-                    (df_primera["Nombre"] == "Otros Distrito Inversión") &
-                    (ultimos_dos >= 1) & (ultimos_dos <= 19)
-                )
-                
-                # Aplicar mismos conceptos que Recursos Propios pero con filtro de Primera Infancia
-                conceptos = {
-                    "SUELDO BASICO": "O231010100101 Sueldo básico",
-                    "HORAS EXTRAS": "O231010100102 Horas extras, dominicales, festivos y recargos",
-                    "SUBSIDIO DE ALIMENTACIÓN": "O231010100104 Subsidio de alimentación",
-                    "AUXILIO DE TRANSPORTE": "O231010100105 Auxilio de Transporte",
-                    "PRIMA DE SERVICIOS": "O231010100106 Prima de servicio",
-                    "PRIMA DE VACACIONES": "O23101010010802 Prima de vacaciones",
-                    "PRIMA DE NAVIDAD": "O23101010010801 Prima de navidad",
-                    "COMPENSAR": "O231010200401 Compensar",
-                    "ICBF": "O2310102006 Aportes al ICBF",
-                    "SENA": "O2310102007 Aportes al SENA",
-                    "ESAP": "O2310102008 Aportes a la ESAP",
-                    "ESCUELAS TÉCNICAS": "O2310102009 Aportes a escuelas industriales e institutos técnicos",
-                    "SALUD": "O231010200201 Aportes a la seguridad social en salud pública",
-                    "PENSIÓN": "O231010200101 Aportes a la seguridad social en pensiones públicas",
-                    "CESANTÍAS": "O231010200301 Aportes de cesantías a fondos públicos"
-                }
-                
-                datos_primera = {}
-                for nombre, concepto in conceptos.items():
-                    filtro = filtro_primera & (df_primera["Concepto de gasto"] == concepto)
-                    filas = df_primera[filtro]
-                    datos_primera[nombre] = {
-                        "DISPONIBLE": filas["DISPONIBLE"].sum(),
-                        "RP EMITIDOS": filas["RP EMITIDOS"].sum(),
-                        "GIROS ACUMULADOS": filas["GIROS ACUMULADOS"].sum(),
-                        "SALDO DE APROPIACION": filas["SALDO DE APROPIACION"].sum(),
-                        "RECURSOS SIN EJECUTAR": filas["RECURSOS SIN EJECUTAR"].sum()
-                    }
-                
-                # Calcular totales
-                conceptos_nomina = ["SUELDO BASICO", "HORAS EXTRAS", "SUBSIDIO DE ALIMENTACIÓN", "AUXILIO DE TRANSPORTE", 
-                                  "PRIMA DE SERVICIOS", "PRIMA DE VACACIONES", "PRIMA DE NAVIDAD"]
-                datos_primera["SUELDOS"] = {col: sum(datos_primera[concepto][col] for concepto in conceptos_nomina) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                conceptos_parafiscales = ["COMPENSAR", "ICBF", "SENA", "ESAP", "ESCUELAS TÉCNICAS"]
-                datos_primera["TOTAL PARAFISCALES"] = {col: sum(datos_primera[concepto][col] for concepto in conceptos_parafiscales) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                conceptos_fomag = ["SALUD", "PENSIÓN", "CESANTÍAS"]
-                datos_primera["TOTAL FOMAG"] = {col: sum(datos_primera[concepto][col] for concepto in conceptos_fomag) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                # Total general
-                datos_primera["PRIMERA INFANCIA REC PROPIOS"] = {
-                    col: datos_primera["SUELDOS"][col] + datos_primera["TOTAL PARAFISCALES"][col] + datos_primera["TOTAL FOMAG"][col]
-                    for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]
-                }
-                
-                # Mostrar tabla
-                if any(datos_primera["PRIMERA INFANCIA REC PROPIOS"][col] > 0 for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS"]):
-                    mostrar_tabla_recursos_propios(datos_primera, "👶 PRIMERA INFANCIA - RECURSOS PROPIOS")
-                else:
-                    st.warning("⚠ No se encontraron datos para Primera Infancia")
-                    
-            except Exception as e:
-                st.error(f"❌ Error al procesar primera infancia: {str(e)}")
-
-    # =========================================================================
-    # 🆕 NUEVA SECCIÓN: ORIENTADORES
-    # =========================================================================
-    st.markdown("---")
-    st.subheader("🧑‍🏫 ORIENTADORES")
-    
-    if df_principal is not None:
-        with st.spinner("Procesando datos de orientadores..."):
-            try:
-                # Procesar ORIENTADORES (códigos 20-32)
-                df_orientadores = df_principal.copy()
-                df_orientadores.insert(0, "Codigo_O", df_orientadores.iloc[:, 0].where(df_orientadores.iloc[:, 0].astype(str).str.startswith("  O")).ffill())
-                df_orientadores["Concepto de gasto"] = df_orientadores["Concepto de gasto"].ffill()
-                
-                # Extraer últimos dos dígitos y filtrar 20-32
-                ultimos_dos = pd.to_numeric(df_orientadores["Codigo_O"].astype(str).str[-2:], errors="coerce")
-                filtro_orientadores = (
-                    (df_orientadores["Nombre"] == "Otros Distrito Inversión") &
-                    (ultimos_dos >= 20) & (ultimos_dos <= 32)
-                )
-                
-                # Aplicar mismos conceptos que Recursos Propios pero con filtro de Orientadores
-                conceptos = {
-                    "SUELDO BASICO": "O231010100101 Sueldo básico",
-                    "HORAS EXTRAS": "O231010100102 Horas extras, dominicales, festivos y recargos",
-                    "SUBSIDIO DE ALIMENTACIÓN": "O231010100104 Subsidio de alimentación",
-                    "AUXILIO DE TRANSPORTE": "O231010100105 Auxilio de Transporte",
-                    "PRIMA DE SERVICIOS": "O231010100106 Prima de servicio",
-                    "PRIMA DE VACACIONES": "O23101010010802 Prima de vacaciones",
-                    "PRIMA DE NAVIDAD": "O23101010010801 Prima de navidad",
-                    "COMPENSAR": "O231010200401 Compensar",
-                    "ICBF": "O2310102006 Aportes al ICBF",
-                    "SENA": "O2310102007 Aportes al SENA",
-                    "ESAP": "O2310102008 Aportes a la ESAP",
-                    "ESCUELAS TÉCNICAS": "O2310102009 Aportes a escuelas industriales e institutos técnicos",
-                    "SALUD": "O231010200201 Aportes a la seguridad social en salud pública",
-                    "PENSIÓN": "O231010200101 Aportes a la seguridad social en pensiones públicas",
-                    "CESANTÍAS": "O231010200301 Aportes de cesantías a fondos públicos"
-                }
-                
-                datos_orientadores = {}
-                for nombre, concepto in conceptos.items():
-                    filtro = filtro_orientadores & (df_orientadores["Concepto de gasto"] == concepto)
-                    filas = df_orientadores[filtro]
-                    datos_orientadores[nombre] = {
-                        "DISPONIBLE": filas["DISPONIBLE"].sum(),
-                        "RP EMITIDOS": filas["RP EMITIDOS"].sum(),
-                        "GIROS ACUMULADOS": filas["GIROS ACUMULADOS"].sum(),
-                        "SALDO DE APROPIACION": filas["SALDO DE APROPIACION"].sum(),
-                        "RECURSOS SIN EJECUTAR": filas["RECURSOS SIN EJECUTAR"].sum()
-                    }
-                
-                # Calcular totales
-                conceptos_nomina = ["SUELDO BASICO", "HORAS EXTRAS", "SUBSIDIO DE ALIMENTACIÓN", "AUXILIO DE TRANSPORTE", 
-                                  "PRIMA DE SERVICIOS", "PRIMA DE VACACIONES", "PRIMA DE NAVIDAD"]
-                datos_orientadores["SUELDOS"] = {col: sum(datos_orientadores[concepto][col] for concepto in conceptos_nomina) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                conceptos_parafiscales = ["COMPENSAR", "ICBF", "SENA", "ESAP", "ESCUELAS TÉCNICAS"]
-                datos_orientadores["TOTAL PARAFISCALES"] = {col: sum(datos_orientadores[concepto][col] for concepto in conceptos_parafiscales) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                conceptos_fomag = ["SALUD", "PENSIÓN", "CESANTÍAS"]
-                datos_orientadores["TOTAL FOMAG"] = {col: sum(datos_orientadores[concepto][col] for concepto in conceptos_fomag) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                # Total general
-                datos_orientadores["ORIENTADORES REC PROPIOS"] = {
-                    col: datos_orientadores["SUELDOS"][col] + datos_orientadores["TOTAL PARAFISCALES"][col] + datos_orientadores["TOTAL FOMAG"][col]
-                    for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]
-                }
-                
-                # Mostrar tabla
-                if any(datos_orientadores["ORIENTADORES REC PROPIOS"][col] > 0 for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS"]):
-                    mostrar_tabla_recursos_propios(datos_orientadores, "🧑‍🏫 ORIENTADORES - RECURSOS PROPIOS")
-                else:
-                    st.warning("⚠ No se encontraron datos para Orientadores")
-                    
-            except Exception as e:
-                st.error(f"❌ Error al procesar orientadores: {str(e)}")
-
-    # =========================================================================
-    # 🆕 NUEVA SECCIÓN: GLOBAL
-    # =========================================================================
-    st.markdown("---")
-    st.subheader("👩‍🏫📚👨‍🏫 GLOBAL")
-    
-    if df_principal is not None:
-        with st.spinner("Procesando datos globales..."):
-            try:
-                # Procesar GLOBAL (códigos 33-57)
-                df_global = df_principal.copy()
-                df_global.insert(0, "Codigo_O", df_global.iloc[:, 0].where(df_global.iloc[:, 0].astype(str).str.startswith("  O")).ffill())
-                df_global["Concepto de gasto"] = df_global["Concepto de gasto"].ffill()
-                
-                # Extraer últimos dos dígitos y filtrar 33-57
-                ultimos_dos = pd.to_numeric(df_global["Codigo_O"].astype(str).str[-2:], errors="coerce")
-                filtro_global = (
-                    (df_global["Nombre"] == "Otros Distrito Inversión") &
-                    (ultimos_dos >= 33) & (ultimos_dos <= 57)
-                )
-                
-                # Aplicar mismos conceptos que Recursos Propios pero con filtro Global
-                conceptos = {
-                    "SUELDO BASICO": "O231010100101 Sueldo básico",
-                    "HORAS EXTRAS": "O231010100102 Horas extras, dominicales, festivos y recargos",
-                    "SUBSIDIO DE ALIMENTACIÓN": "O231010100104 Subsidio de alimentación",
-                    "AUXILIO DE TRANSPORTE": "O231010100105 Auxilio de Transporte",
-                    "PRIMA DE SERVICIOS": "O231010100106 Prima de servicio",
-                    "PRIMA DE VACACIONES": "O23101010010802 Prima de vacaciones",
-                    "PRIMA DE NAVIDAD": "O23101010010801 Prima de navidad",
-                    "COMPENSAR": "O231010200401 Compensar",
-                    "ICBF": "O2310102006 Aportes al ICBF",
-                    "SENA": "O2310102007 Aportes al SENA",
-                    "ESAP": "O2310102008 Aportes a la ESAP",
-                    "ESCUELAS TÉCNICAS": "O2310102009 Aportes a escuelas industriales e institutos técnicos",
-                    "SALUD": "O231010200201 Aportes a la seguridad social en salud pública",
-                    "PENSIÓN": "O231010200101 Aportes a la seguridad social en pensiones públicas",
-                    "CESANTÍAS": "O231010200301 Aportes de cesantías a fondos públicos"
-                }
-                
-                datos_global = {}
-                for nombre, concepto in conceptos.items():
-                    filtro = filtro_global & (df_global["Concepto de gasto"] == concepto)
-                    filas = df_global[filtro]
-                    datos_global[nombre] = {
-                        "DISPONIBLE": filas["DISPONIBLE"].sum(),
-                        "RP EMITIDOS": filas["RP EMITIDOS"].sum(),
-                        "GIROS ACUMULADOS": filas["GIROS ACUMULADOS"].sum(),
-                        "SALDO DE APROPIACION": filas["SALDO DE APROPIACION"].sum(),
-                        "RECURSOS SIN EJECUTAR": filas["RECURSOS SIN EJECUTAR"].sum()
-                    }
-                
-                # Calcular totales
-                conceptos_nomina = ["SUELDO BASICO", "HORAS EXTRAS", "SUBSIDIO DE ALIMENTACIÓN", "AUXILIO DE TRANSPORTE", 
-                                  "PRIMA DE SERVICIOS", "PRIMA DE VACACIONES", "PRIMA DE NAVIDAD"]
-                datos_global["SUELDOS"] = {col: sum(datos_global[concepto][col] for concepto in conceptos_nomina) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                conceptos_parafiscales = ["COMPENSAR", "ICBF", "SENA", "ESAP", "ESCUELAS TÉCNICAS"]
-                datos_global["TOTAL PARAFISCALES"] = {col: sum(datos_global[concepto][col] for concepto in conceptos_parafiscales) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                conceptos_fomag = ["SALUD", "PENSIÓN", "CESANTÍAS"]
-                datos_global["TOTAL FOMAG"] = {col: sum(datos_global[concepto][col] for concepto in conceptos_fomag) for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]}
-                
-                # Total general
-                datos_global["GLOBAL REC PROPIOS"] = {
-                    col: datos_global["SUELDOS"][col] + datos_global["TOTAL PARAFISCALES"][col] + datos_global["TOTAL FOMAG"][col]
-                    for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS", "SALDO DE APROPIACION", "RECURSOS SIN EJECUTAR"]
-                }
-                
-                # Mostrar tabla
-                if any(datos_global["GLOBAL REC PROPIOS"][col] > 0 for col in ["DISPONIBLE", "RP EMITIDOS", "GIROS ACUMULADOS"]):
-                    mostrar_tabla_recursos_propios(datos_global, "🌍 GLOBAL - RECURSOS PROPIOS")
-                else:
-                    st.warning("⚠ No se encontraron datos para Global")
-                    
-            except Exception as e:
-                st.error(f"❌ Error al procesar datos globales: {str(e)}")
+        st.warning(pestana["sin_datos"])
 
 # =============================================================================
 # PANTALLA 3.1: RECURSOS PROPIOS PROYECCIONES
@@ -1585,6 +1177,75 @@ def mostrar_pantalla_recursos_propios():
 # =============================================================================
 # PANTALLA 3.1: RECURSOS PROPIOS - PROYECCIONES
 # =============================================================================
+def renderizar_tabla_proyeccion(tabla):
+    """Arma el HTML de la tabla de proyección con los estilos de RECURSOS PROPIOS"""
+    tipos_fila = {**TIPOS_FILA_RECURSOS_PROPIOS, "DOC REC PROPIOS": "total_general"}
+    return construir_tabla_html(
+        tabla.assign(CONCEPTO=tabla.index, TIPO_FILA=[tipos_fila.get(fila, "concepto") for fila in tabla.index]),
+        ["CONCEPTO"],
+        ESTILOS_FILA_RECURSOS_PROPIOS,
+        [("CONCEPTO", "concepto-header")] + [(col, "") for col in COLUMNAS_PROYECCION],
+        "tabla-recursos-container",
+        "tabla-recursos",
+        columnas_valores=COLUMNAS_PROYECCION
+    )
+
+def mostrar_proyeccion_recursos_propios(meses):
+    """Proyección a diciembre por concepto frente al saldo de apropiación, con escenario de incremento"""
+    try:
+        with st.spinner("Consolidando nómina de los meses disponibles..."):
+            matriz = matriz_nomina(meses)
+    except FileNotFoundError as e:
+        st.error(f"❌ {str(e)}")
+        return
+    except Exception as e:
+        st.error(f"❌ Error al consolidar la nómina: {str(e)}")
+        return
+
+    # Saldos de apropiación vigentes por concepto (sección TOTAL)
+    huella = huella_datos()
+    datos = procesar_recursos_propios(huella) if huella is not None else None
+    if datos is None:
+        st.warning("⚠ Sin datos de APOTEOSYS: la proyección se compara contra un saldo de cero")
+        saldos = np.zeros(len(CONCEPTOS_RECURSOS_PROPIOS))
+    else:
+        saldos = np.array([datos[concepto]["SALDO DE APROPIACION"] for concepto in CONCEPTOS_RECURSOS_PROPIOS])
+
+    # Escenario
+    numeros_mes = [int(mes.split("_")[0]) for mes in meses]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ultimo_mes = st.number_input("Último mes ejecutado", 1, 12, max(numeros_mes), key="proyeccion_ultimo_mes")
+    with col2:
+        incremento = st.number_input("Incremento salarial (%)", -50.0, 100.0, 0.0, step=0.5, key="proyeccion_incremento")
+    with col3:
+        mes_incremento = st.number_input("Incremento desde el mes", 1, 12, 1, key="proyeccion_mes_incremento")
+
+    with medir("proyectar a diciembre"):
+        tabla = proyectar_recursos_propios(matriz, int(ultimo_mes), saldos, incremento / 100, int(mes_incremento))
+
+    st.markdown(ESTILOS_TABLA_RECURSOS_PROPIOS, unsafe_allow_html=True)
+    st.markdown(
+        f"<div class='titulo-tabla'>📈 PROYECCIÓN A DICIEMBRE ({len(meses)} meses de nómina, promedio mensual)</div>",
+        unsafe_allow_html=True
+    )
+    st.markdown(renderizar_tabla_proyeccion(tabla), unsafe_allow_html=True)
+
+    total = tabla.loc["DOC REC PROPIOS"]
+    deficit = tabla.loc[list(CONCEPTOS_RECURSOS_PROPIOS), "DIFERENCIA"].lt(0).sum()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="📈 Proyección a diciembre", value=f"${total['PROYECCIÓN A DICIEMBRE']:,.0f}".replace(",", "."))
+    with col2:
+        st.metric(label="💰 Saldo de apropiación", value=f"${total['SALDO DE APROPIACION']:,.0f}".replace(",", "."))
+    with col3:
+        st.metric(
+            label="⚖ Diferencia",
+            value=f"${total['DIFERENCIA']:,.0f}".replace(",", "."),
+            delta=f"{deficit} conceptos en déficit",
+            delta_color="inverse" if deficit else "off"
+        )
+
 def mostrar_pantalla_recursos_propios_proyecciones():
     # Botón para volver atrás
     if st.button("← Volver a Recursos Propios", key="volver_proyecciones"):
@@ -1593,14 +1254,25 @@ def mostrar_pantalla_recursos_propios_proyecciones():
 
     st.markdown("<div class='header'><h2>📈 PROYECCIONES - RECURSOS PROPIOS</h2></div>", unsafe_allow_html=True)
 
-    # Rutas de los archivos
-    ruta_sueldos = r"C:\Users\jrubr\OneDrive\Desktop\Sec Educación Bog\App Streamlit\RP_PROYECCION\1_ENERO\TOTAL\Nomina_Consolidada_Presupuestal(5,15,2025011,1201,2,I,).xls"
-    ruta_aportes = r"C:\Users\jrubr\OneDrive\Desktop\Sec Educación Bog\App Streamlit\RP_PROYECCION\1_ENERO\TOTAL\Nomina_Consolidada_Presupuestal(5,15,2025011,1201,2,A,).xls"
+    # Meses disponibles en las carpetas de proyección (1_ENERO/TOTAL, 2_FEBRERO/TOTAL, ...)
+    meses = buscar_meses_proyeccion()
+    if not meses:
+        st.error("❌ No se encontró alguno de los archivos de proyección. Verifica las rutas.")
+        st.caption("Carpetas revisadas: " + "; ".join(str(carpeta) for carpeta in CARPETAS_PROYECCION))
+        return
+
+    mostrar_proyeccion_recursos_propios(meses)
+
+    st.markdown("---")
+    st.markdown("### 📄 Archivos de nómina")
+    mes = st.selectbox("Mes de proyección", list(meses), index=len(meses) - 1, key="mes_proyeccion")
 
     # Intentar cargar ambos archivos
     try:
-        df_sueldos = pd.read_excel(ruta_sueldos)
-        df_aportes = pd.read_excel(ruta_aportes)
+        with st.spinner("Cargando archivos de proyección..."):
+            libros = cargar_proyeccion(meses[mes])
+        df_sueldos = libros["SUELDOS"]
+        df_aportes = libros["APORTES"]
     except FileNotFoundError:
         st.error("❌ No se encontró alguno de los archivos de proyección. Verifica las rutas.")
         return
@@ -1639,6 +1311,55 @@ def mostrar_pantalla_sgp():
     
     st.info("🚧 Módulo en construcción - Esta sección estará disponible próximamente.")
 
+# =============================================================================
+# PANEL DE DIAGNÓSTICO (SOLO ADMINISTRADORES)
+# =============================================================================
+def es_administrador():
+    """El panel solo se muestra si CONTROL_PRESUPUESTAL_ADMIN está definida y la URL trae ?admin=<esa clave>"""
+    return bool(CLAVE_ADMIN) and st.query_params.get("admin") == CLAVE_ADMIN
+
+def mostrar_panel_diagnostico():
+    """Tiempos y memoria por etapa, contadores de caché y asignaciones de memoria, en la barra lateral"""
+    with st.sidebar.expander("🩺 Diagnóstico", expanded=False):
+        # tracemalloc tiene costo: se activa solo mientras se diagnostica
+        memoria = st.checkbox("Medir memoria (tracemalloc)", value=tracemalloc.is_tracing(), key="diagnostico_memoria")
+        if memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not memoria and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        if st.button("Reiniciar mediciones", key="diagnostico_reiniciar"):
+            reiniciar()
+
+        registros = pd.DataFrame(mediciones())
+        if registros.empty:
+            st.caption("Sin mediciones todavía")
+        else:
+            st.markdown("**Etapas** (ms)")
+            columnas_memoria = [col for col in ("pico_kb",) if col in registros]
+            resumen = registros.groupby("etapa").agg(
+                veces=("ms", "size"), promedio_ms=("ms", "mean"), max_ms=("ms", "max"),
+                **{f"max_{col}": (col, "max") for col in columnas_memoria}
+            )
+            st.dataframe(resumen.sort_values("max_ms", ascending=False).round(1), use_container_width=True)
+            st.markdown("**Últimas mediciones**")
+            st.dataframe(registros.tail(30).iloc[::-1], use_container_width=True, hide_index=True)
+
+        st.markdown("**Cachés**")
+        st.dataframe(pd.DataFrame.from_dict(contadores_cache(), orient="index"), use_container_width=True)
+
+        if tracemalloc.is_tracing():
+            st.markdown("**Memoria asignada por línea** (top 10)")
+            estadisticas = tracemalloc.take_snapshot().statistics("lineno")[:10]
+            st.dataframe(
+                pd.DataFrame(
+                    [(str(estadistica.traceback), estadistica.size / 1024, estadistica.count) for estadistica in estadisticas],
+                    columns=["línea", "kb", "bloques"]
+                ).round(1),
+                use_container_width=True,
+                hide_index=True
+            )
+
 # =============================================================================
 # ROUTER PRINCIPAL - CORREGIDO
 # =============================================================================
@@ -1651,16 +1372,22 @@ def main():
     cargar_estilos()
     
     # Navegación entre páginas - ACTUALIZADO CON LA NUEVA PANTALLA
-    if st.session_state.pagina_actual == "INICIO":
-        mostrar_pantalla_inicial()
-    elif st.session_state.pagina_actual == "POR_FUENTE":
-        mostrar_pantalla_por_fuente()
-    elif st.session_state.pagina_actual == "RECURSOS_PROPIOS":
-        mostrar_pantalla_recursos_propios()
-    elif st.session_state.pagina_actual == "RECURSOS_PROPIOS_PROYECCIONES":  # ✅ NUEVA PANTALLA
-        mostrar_pantalla_recursos_propios_proyecciones()
-    elif st.session_state.pagina_actual == "SGP":
-        mostrar_pantalla_sgp()
+    with medir("pantalla completa", pantalla=st.session_state.pagina_actual):
+        if st.session_state.pagina_actual == "INICIO":
+            mostrar_pantalla_inicial()
+        elif st.session_state.pagina_actual == "POR_FUENTE":
+            mostrar_pantalla_por_fuente()
+        elif st.session_state.pagina_actual == "HISTORICO":
+            mostrar_pantalla_historico()
+        elif st.session_state.pagina_actual == "RECURSOS_PROPIOS":
+            mostrar_pantalla_recursos_propios()
+        elif st.session_state.pagina_actual == "RECURSOS_PROPIOS_PROYECCIONES":  # ✅ NUEVA PANTALLA
+            mostrar_pantalla_recursos_propios_proyecciones()
+        elif st.session_state.pagina_actual == "SGP":
+            mostrar_pantalla_sgp()
+
+    if es_administrador():
+        mostrar_panel_diagnostico()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
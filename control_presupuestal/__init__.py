@@ -0,0 +1,6 @@
+"""Cálculos del control presupuestal de nómina, sin depender de Streamlit.
+
+La app (app.py) y la línea de comandos (python -m control_presupuestal) usan los mismos módulos:
+calculos (bolsillos SGP y conceptos de RECURSOS PROPIOS), fuentes (exports APOTEOSYS y snapshots),
+historico (cortes guardados) y proyeccion (libros de nómina y proyección a diciembre).
+"""
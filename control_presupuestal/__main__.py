@@ -0,0 +1,5 @@
+import sys
+
+from control_presupuestal.cli import main
+
+sys.exit(main())
@@ -0,0 +1,143 @@
+"""Benchmark de las etapas del tablero sobre exports APOTEOSYS sintéticos (10 mil, 100 mil, 1 millón de filas)"""
+import io
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from control_presupuestal.calculos import (
+    BOLSILLOS_SGP, CONCEPTOS_RECURSOS_PROPIOS, FUENTE_RECURSOS_PROPIOS, SECCIONES_RECURSOS_PROPIOS,
+    agrupar_cubo_conceptos, calcular_resumen_sgp, indexar_libro, normalizar_libro, resumir_recursos_propios
+)
+from control_presupuestal.fuentes import parsear_export
+from control_presupuestal.tablas import renderizar_tabla_recursos_propios, renderizar_tabla_sgp
+
+# Columnas de un export APOTEOSYS real, en su orden
+COLUMNAS_APOTEOSYS = [
+    "Código", "Nombre", "Concepto de gasto", "INICIAL", "MODIFICACIONES", "VIGENTE", "SUSPENSIONES", "DISPONIBLE",
+    "CDP EMTIDOS", "SALDO DE APROPIACION", "RP EMITIDOS EN EL MES", "RP EMITIDOS", "CDPS X COMP.", "GIROS DEL MES",
+    "GIROS ACUMULADOS", "RECURSOS SIN EJECUTAR"
+]
+
+# Fuentes y conceptos que usan los bolsillos y las tablas de RECURSOS PROPIOS
+FUENTES_SINTETICAS = sorted({definicion["fuente"] for definicion in BOLSILLOS_SGP} | {FUENTE_RECURSOS_PROPIOS})
+CONCEPTOS_SINTETICOS = sorted(
+    {concepto for definicion in BOLSILLOS_SGP for concepto in definicion["conceptos"]} |
+    set(CONCEPTOS_RECURSOS_PROPIOS.values())
+)
+
+# Tamaños por defecto del benchmark
+FILAS_BENCHMARK = [10_000, 100_000, 1_000_000]
+
+def generar_apoteosys(filas, semilla=0):
+    """Export sintético con la forma de APOTEOSYS: bloques de código '  O…' con su concepto, dos filas de fuente y una en blanco"""
+    rng = np.random.default_rng(semilla)
+    bloques = max(filas // 4, 1)
+
+    # Códigos con los últimos dos dígitos entre 01 y 64, como los rangos de las secciones
+    sufijos = pd.Series(rng.integers(1, 65, bloques)).astype(str).str.zfill(2)
+    codigos = "  O2301172201202401690307" + pd.Series(np.arange(bloques)).astype(str).str.zfill(7) + sufijos
+    conceptos = np.asarray(CONCEPTOS_SINTETICOS, dtype=object)[rng.integers(0, len(CONCEPTOS_SINTETICOS), bloques)]
+    fuentes = np.asarray(FUENTES_SINTETICAS, dtype=object)[rng.integers(0, len(FUENTES_SINTETICAS), (bloques, 2))]
+
+    # Cada bloque ocupa cuatro filas: código, fuente, fuente y separador
+    codigo = np.empty((bloques, 4), dtype=object)
+    codigo[:, 0] = codigos.to_numpy()
+    codigo[:, 1:3] = ["1-100-F001", "2-100-I002"]
+    codigo[:, 3] = ""
+
+    nombre = np.empty((bloques, 4), dtype=object)
+    nombre[:, 0] = "Pago de Personal Docente"
+    nombre[:, 1:3] = fuentes
+    nombre[:, 3] = ""
+
+    concepto = np.full((bloques, 4), None, dtype=object)
+    concepto[:, 0] = conceptos
+
+    # Valores de cada fuente; la fila de código lleva la suma de sus dos fuentes
+    montos = rng.integers(0, 5_000_000_000, (bloques, 2, len(COLUMNAS_APOTEOSYS) - 3)).astype(float)
+    valores = np.full((bloques, 4, montos.shape[2]), np.nan)
+    valores[:, 0] = montos.sum(axis=1)
+    valores[:, 1:3] = montos
+
+    df = pd.DataFrame(valores.reshape(bloques * 4, -1), columns=COLUMNAS_APOTEOSYS[3:])
+    df.insert(0, "Concepto de gasto", concepto.ravel())
+    df.insert(0, "Nombre", nombre.ravel())
+    df.insert(0, "Código", codigo.ravel())
+
+    # Primera fila del export: el período
+    encabezado = pd.DataFrame({"Código": ["Período: Octubre 2025"]})
+    return pd.concat([encabezado, df], ignore_index=True)[COLUMNAS_APOTEOSYS]
+
+def exportar_apoteosys(df, formato="csv"):
+    """Bytes del export sintético en CSV o XLSX, como llegarían del origen"""
+    if formato == "xlsx":
+        salida = io.BytesIO()
+        df.to_excel(salida, index=False)
+        return salida.getvalue()
+    return df.to_csv(index=False).encode("utf-8")
+
+def etapas_tablero(contenido, origen):
+    """Etapas del tablero en orden; cada una recibe el estado que dejan las anteriores"""
+    def render_recursos_propios(estado):
+        return [
+            renderizar_tabla_recursos_propios(datos, f"{seccion} - RECURSOS PROPIOS", detalles)
+            for seccion, datos in estado["recursos_propios"].items()
+            if datos is not None
+            for detalles in (False, True)
+        ]
+
+    return [
+        ("parsear (cargar_datos_originales)", "df", lambda estado: parsear_export(contenido, origen)),
+        ("normalizar (cargar_libro)", "libro", lambda estado: normalizar_libro(estado["df"])),
+        ("indexar fuentes y conceptos (cargar_indice)", "indice", lambda estado: indexar_libro(estado["libro"])),
+        ("resumen SGP (procesar_datos_sgp)", "resumen", lambda estado: calcular_resumen_sgp(estado["libro"], estado["indice"])),
+        ("cubo de conceptos (calcular_cubo_conceptos)", "cubo", lambda estado: agrupar_cubo_conceptos(estado["libro"])),
+        ("secciones RP (procesar_recursos_propios)", "recursos_propios", lambda estado: {
+            seccion: resumir_recursos_propios(estado["cubo"], rango, total_final)
+            for seccion, rango, total_final in SECCIONES_RECURSOS_PROPIOS
+        }),
+        ("render tabla SGP", "html_sgp", lambda estado: renderizar_tabla_sgp(estado["resumen"])),
+        ("render tablas RP", "html_rp", render_recursos_propios)
+    ]
+
+def medir_etapas(contenido, origen, repeticiones=1):
+    """Tiempo (mínimo de las repeticiones) y pico de memoria de cada etapa: [(etapa, segundos, bytes), ...]"""
+    tiempos = {}
+    for _ in range(repeticiones):
+        estado = {}
+        for etapa, clave, ejecutar in etapas_tablero(contenido, origen):
+            inicio = time.perf_counter()
+            estado[clave] = ejecutar(estado)
+            tiempos[etapa] = min(tiempos.get(etapa, float("inf")), time.perf_counter() - inicio)
+
+    # La memoria se mide en otra pasada: tracemalloc hace más lentas las etapas
+    picos = {}
+    estado = {}
+    tracemalloc.start()
+    try:
+        for etapa, clave, ejecutar in etapas_tablero(contenido, origen):
+            antes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            estado[clave] = ejecutar(estado)
+            picos[etapa] = tracemalloc.get_traced_memory()[1] - antes
+    finally:
+        tracemalloc.stop()
+
+    return [(etapa, tiempos[etapa], picos[etapa]) for etapa in tiempos]
+
+def ejecutar_benchmark(tamanos=None, formato="csv", repeticiones=1, semilla=0):
+    """Genera un export por tamaño y mide sus etapas; DataFrame con filas, etapa, segundos y MB pico"""
+    resultados = []
+    for filas in tamanos or FILAS_BENCHMARK:
+        contenido = exportar_apoteosys(generar_apoteosys(filas, semilla), formato)
+        for etapa, segundos, pico in medir_etapas(contenido, f"sintetico.{formato}", repeticiones):
+            resultados.append({
+                "filas": filas,
+                "formato": formato,
+                "etapa": etapa,
+                "segundos": segundos,
+                "mb_pico": pico / 1024 ** 2
+            })
+    return pd.DataFrame(resultados)
@@ -0,0 +1,497 @@
+"""Bolsillos SGP, conceptos de RECURSOS PROPIOS y las tablas agregadas de un libro APOTEOSYS"""
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# DEFINICIÓN DE BOLSILLOS
+# =============================================================================
+COLUMNAS_VALORES = [
+    "DISPONIBLE",
+    "RP EMITIDOS",
+    "GIROS ACUMULADOS",
+    "SALDO DE APROPIACION",
+    "RECURSOS SIN EJECUTAR"
+]
+
+# ULTIMOS_DOS de las filas sin Codigo_O (antes del primer código) o con un código que no termina en dos dígitos
+SIN_SUFIJO = -1
+
+# Cada bolsillo se define por su fuente (Nombre), la lista de conceptos de gasto
+# y el rango inclusivo (mínimo, máximo) de los últimos dos dígitos de Codigo_O.
+# None en el rango significa que no hay límite por ese lado.
+# Los bolsillos no deben solaparse: cada fila del archivo cae en uno solo.
+BOLSILLOS_SGP = [
+    # --- 🔹 1. SGP CSF (Salarios + Parafiscales) ---
+    {
+        "bolsillo": "SGP CSF (Salarios + Parafiscales)",
+        "fuente": "SGP Prest. Serv. Nómina Educació",
+        "conceptos": [
+            'O231010100101 Sueldo básico',
+            'O231010100102 Horas extras, dominicales, festivos y recargos',
+            'O231010100104 Subsidio de alimentación',
+            'O231010100105 Auxilio de Transporte',
+            'O231010100106 Prima de servicio',
+            'O23101010010801 Prima de navidad',
+            'O23101010010802 Prima de vacaciones',
+            'O231010200401 Compensar',
+            'O2310102006 Aportes al ICBF',
+            'O2310102007 Aportes al SENA',
+            'O2310102008 Aportes a la ESAP',
+            'O2310102009 Aportes a escuelas industriales e institutos técnicos'
+        ],
+        "rango": (None, 64)
+    },
+    # --- 🔹 2. SGP SSF FOMAG (Empleado) ---
+    {
+        "bolsillo": "SGP SSF FOMAG (Empleado)",
+        "fuente": "SGP PRESTACION DEL.SERVICIO SSF",
+        "conceptos": [
+            'O231010100101 Sueldo básico'
+        ],
+        "rango": (None, 64)
+    },
+    # --- 🔹 3. SGP SSF FOMAG (Patrón) ---
+    {
+        "bolsillo": "SGP SSF FOMAG (Patrón)",
+        "fuente": "SGP PRESTACION DEL.SERVICIO SSF",
+        "conceptos": [
+            'O231010200201 Aportes a la seguridad social en salud pública',
+            'O231010200301 Aportes de cesantías a fondos públicos'
+        ],
+        "rango": (None, 64)
+    },
+    # --- 🔹 4. SGP CSF FOMAG ---
+    {
+        "bolsillo": "SGP CSF FOMAG",
+        "fuente": "SGP Prest. Serv. Nómina Educació",
+        "conceptos": [
+            'O231010200201 Aportes a la seguridad social en salud pública',
+            'O231010200101 Aportes a la seguridad social en pensiones públicas'
+        ],
+        "rango": (None, 64)
+    },
+    # --- 🔹 5. ADMINISTRATIVOS SGP ---
+    {
+        "bolsillo": "Administrativos SGP",
+        "fuente": "SGP Prest. Serv. Nómina Educació",
+        "conceptos": [
+            'O231010100101 Sueldo básico',
+            'O231010100204 Prima semestral',
+            'O23101010010802 Prima de vacaciones',
+            'O23101010010801 Prima de navidad',
+            'O231010100107 Bonificación por servicios prestados',
+            'O231010100109 Prima técnica salarial',
+            'O23101010021201 Beneficios a los empleados a corto plazo',
+            'O231010300103 Bonificación especial de recreación',
+            'O2310103068 Prima secretarial',
+            'O231010200401 Compensar',
+            'O2310102006 Aportes al ICBF',
+            'O2310102009 Aportes a escuelas industriales e institutos técnicos',
+            'O2310102007 Aportes al SENA',
+            'O2310102008 Aportes a la ESAP',
+            'O231010200202 Aportes a la seguridad social en salud privada',
+            'O231010200102 Aportes a la seguridad social en pensiones privadas',
+            'O231010200101 Aportes a la seguridad social en pensiones públicas',
+            'O231010200502 Aportes generales al sistema de riesgos laborales privados',
+            'O231010200302 Aportes de cesantías a fondos privados',
+            'O231010200301 Aportes de cesantías a fondos públicos'
+        ],
+        "rango": (65, 86)
+    },
+    # --- 🔹 6. DOC REC PROPIOS ---
+    {
+        "bolsillo": "DOC REC PROPIOS",
+        "fuente": "Otros Distrito Inversión",
+        "conceptos": [
+            'O231010100101 Sueldo básico',
+            'O231010100102 Horas extras, dominicales, festivos y recargos',
+            'O231010100104 Subsidio de alimentación',
+            'O231010100105 Auxilio de Transporte',
+            'O231010100106 Prima de servicio',
+            'O23101010010801 Prima de navidad',
+            'O23101010010802 Prima de vacaciones',
+            'O231010200101 Aportes a la seguridad social en pensiones públicas',
+            'O231010200201 Aportes a la seguridad social en salud pública',
+            'O231010200301 Aportes de cesantías a fondos públicos',
+            'O231010200401 Compensar',
+            'O2310102006 Aportes al ICBF',
+            'O2310102007 Aportes al SENA',
+            'O2310102008 Aportes a la ESAP',
+            'O2310102009 Aportes a escuelas industriales e institutos técnicos'
+        ],
+        "rango": (None, 57)
+    },
+    # --- 🔹 7. ADTIVOS REC PROP ---
+    {
+        "bolsillo": "ADTIVOS REC PROP",
+        "fuente": "Otros Distrito Inversión",
+        "conceptos": [
+            'O231010100101 Sueldo básico',
+            'O231010100104 Subsidio de alimentación',
+            'O231010100105 Auxilio de Transporte',
+            'O231010100107 Bonificación por servicios prestados',
+            'O23101010010801 Prima de navidad',
+            'O23101010010802 Prima de vacaciones',
+            'O231010100109 Prima técnica salarial',
+            'O231010100204 Prima semestral',
+            'O23101010021201 Beneficios a los empleados a corto plazo',
+            'O231010200101 Aportes a la seguridad social en pensiones públicas',
+            'O231010200102 Aportes a la seguridad social en pensiones privadas',
+            'O231010200202 Aportes a la seguridad social en salud privada',
+            'O231010200302 Aportes de cesantías a fondos privados',
+            'O231010200301 Aportes de cesantías a fondos públicos',
+            'O231010200401 Compensar',
+            'O231010200502 Aportes generales al sistema de riesgos laborales privados',
+            'O2310102006 Aportes al ICBF',
+            'O2310102007 Aportes al SENA',
+            'O2310102008 Aportes a la ESAP',
+            'O2310102009 Aportes a escuelas industriales e institutos técnicos',
+            'O231010300103 Bonificación especial de recreación'
+        ],
+        "rango": (65, 86)
+    },
+    # --- 🔹 8. SENTENCIAS ---
+    {
+        "bolsillo": "SENTENCIAS",
+        "fuente": "Otros Distrito Inversión",
+        "conceptos": [
+            'O2380501002 Multas judiciales'
+        ],
+        "rango": (None, None)
+    }
+]
+
+# Totales del resumen SGP: cada total es la suma de las filas indicadas.
+# El orden importa porque un total puede usar otro calculado antes.
+TOTALES_RESUMEN_SGP = {
+    "TOTAL SGP DOCENTES": [
+        "SGP CSF (Salarios + Parafiscales)",
+        "SGP SSF FOMAG (Empleado)",
+        "SGP SSF FOMAG (Patrón)",
+        "SGP CSF FOMAG"
+    ],
+    "TOTAL SGP P8033": ["TOTAL SGP DOCENTES", "Administrativos SGP"],
+    "TOTAL RECURSOS PROPIOS P8033": ["DOC REC PROPIOS", "ADTIVOS REC PROP", "SENTENCIAS"],
+    "TOTAL SGP+RP P8033": ["TOTAL SGP P8033", "TOTAL RECURSOS PROPIOS P8033"]
+}
+
+# Orden de las filas en la tabla resumen
+ORDEN_RESUMEN_SGP = [
+    "SGP CSF (Salarios + Parafiscales)",
+    "SGP SSF FOMAG (Empleado)",
+    "SGP SSF FOMAG (Patrón)",
+    "SGP CSF FOMAG",
+    "TOTAL SGP DOCENTES",
+    "Administrativos SGP",
+    "TOTAL SGP P8033",
+    "DOC REC PROPIOS",
+    "ADTIVOS REC PROP",
+    "SENTENCIAS",
+    "TOTAL RECURSOS PROPIOS P8033",
+    "TOTAL SGP+RP P8033"
+]
+
+def en_rango(ultimos_dos, minimo, maximo):
+    """Máscara de los sufijos dentro del rango inclusivo; las filas SIN_SUFIJO solo entran si el rango no tiene límites"""
+    filtro = np.ones(len(ultimos_dos), dtype=bool)
+    if minimo is not None:
+        filtro &= (ultimos_dos != SIN_SUFIJO) & (ultimos_dos >= minimo)
+    if maximo is not None:
+        filtro &= (ultimos_dos != SIN_SUFIJO) & (ultimos_dos <= maximo)
+    return filtro
+
+def indexar_libro(libro):
+    """Posiciones (ordenadas) de las filas de cada fuente y de cada concepto, agrupadas una sola vez por categoría"""
+    indice = {}
+    for col in ("Nombre", "Concepto de gasto"):
+        categorias = pd.Categorical(libro[col])
+        # Orden estable: dentro de cada categoría las posiciones quedan de menor a mayor
+        orden = np.argsort(categorias.codes, kind="stable")
+        limites = np.searchsorted(categorias.codes[orden], np.arange(len(categorias.categories) + 1))
+        indice[col] = {
+            valor: orden[inicio:fin]
+            for valor, inicio, fin in zip(categorias.categories, limites[:-1], limites[1:])
+        }
+    return indice
+
+def posiciones_filtro(indice, fuente, conceptos):
+    """Posiciones de las filas de una fuente con alguno de los conceptos: intersección de índices precalculados"""
+    vacio = np.empty(0, dtype=np.intp)
+    por_concepto = [indice["Concepto de gasto"].get(concepto, vacio) for concepto in conceptos]
+    # Los grupos de conceptos son disjuntos: su unión no repite posiciones
+    return np.intersect1d(indice["Nombre"].get(fuente, vacio), np.concatenate(por_concepto), assume_unique=True)
+
+def posiciones_rango(indice, ultimos_dos, fuente, conceptos, rango):
+    """Posiciones de una fuente y sus conceptos dentro de un rango de códigos"""
+    posiciones = posiciones_filtro(indice, fuente, conceptos)
+    # El rango de códigos se revisa solo en las filas ya filtradas
+    return posiciones[en_rango(ultimos_dos[posiciones], *rango)]
+
+def agregar_bolsillos(libro, definiciones, indice=None):
+    """Suma las columnas de valores de cada bolsillo a partir de las posiciones de su fuente y sus conceptos"""
+    if indice is None:
+        indice = indexar_libro(libro)
+    ultimos_dos = libro["ULTIMOS_DOS"].to_numpy()
+    valores = {col: libro[col].to_numpy() for col in COLUMNAS_VALORES}
+
+    sumas = {}
+    for definicion in definiciones:
+        posiciones = posiciones_rango(
+            indice, ultimos_dos, definicion["fuente"], definicion["conceptos"], definicion["rango"]
+        )
+        sumas[definicion["bolsillo"]] = [valores[col][posiciones].sum() for col in COLUMNAS_VALORES]
+
+    return pd.DataFrame.from_dict(sumas, orient="index", columns=COLUMNAS_VALORES).rename_axis("BOLSILLO")
+
+def calcular_resumen_sgp(libro, indice=None):
+    """Tabla resumen SGP: los 8 bolsillos y sus totales en el orden de presentación"""
+    # --- 🔹 Sumar los 8 bolsillos con el índice de fuentes y conceptos ---
+    bolsillos = agregar_bolsillos(libro, BOLSILLOS_SGP, indice)
+
+    # --- 🔹 Calcular totales y crear tabla resumen con el orden de presentación ---
+    filas = {nombre: bolsillos.loc[nombre] for nombre in bolsillos.index}
+    for total, componentes in TOTALES_RESUMEN_SGP.items():
+        filas[total] = sum(filas[componente] for componente in componentes)
+
+    return pd.DataFrame([filas[fila] for fila in ORDEN_RESUMEN_SGP], index=ORDEN_RESUMEN_SGP)
+
+# =============================================================================
+# DEFINICIÓN DE CONCEPTOS DE RECURSOS PROPIOS
+# =============================================================================
+FUENTE_RECURSOS_PROPIOS = "Otros Distrito Inversión"
+
+# Concepto que se muestra en la tabla -> concepto de gasto en el archivo
+CONCEPTOS_RECURSOS_PROPIOS = {
+    "SUELDO BASICO": "O231010100101 Sueldo básico",
+    "HORAS EXTRAS": "O231010100102 Horas extras, dominicales, festivos y recargos",
+    "SUBSIDIO DE ALIMENTACIÓN": "O231010100104 Subsidio de alimentación",
+    "AUXILIO DE TRANSPORTE": "O231010100105 Auxilio de Transporte",
+    "PRIMA DE SERVICIOS": "O231010100106 Prima de servicio",
+    "PRIMA DE VACACIONES": "O23101010010802 Prima de vacaciones",
+    "PRIMA DE NAVIDAD": "O23101010010801 Prima de navidad",
+    "COMPENSAR": "O231010200401 Compensar",
+    "ICBF": "O2310102006 Aportes al ICBF",
+    "SENA": "O2310102007 Aportes al SENA",
+    "ESAP": "O2310102008 Aportes a la ESAP",
+    "ESCUELAS TÉCNICAS": "O2310102009 Aportes a escuelas industriales e institutos técnicos",
+    "SALUD": "O231010200201 Aportes a la seguridad social en salud pública",
+    "PENSIÓN": "O231010200101 Aportes a la seguridad social en pensiones públicas",
+    "CESANTÍAS": "O231010200301 Aportes de cesantías a fondos públicos"
+}
+
+# Subtotales de cada tabla: nómina, parafiscales y FOMAG
+GRUPOS_RECURSOS_PROPIOS = {
+    "SUELDOS": [
+        "SUELDO BASICO", "HORAS EXTRAS", "SUBSIDIO DE ALIMENTACIÓN", "AUXILIO DE TRANSPORTE",
+        "PRIMA DE SERVICIOS", "PRIMA DE VACACIONES", "PRIMA DE NAVIDAD"
+    ],
+    "TOTAL PARAFISCALES": ["COMPENSAR", "ICBF", "SENA", "ESAP", "ESCUELAS TÉCNICAS"],
+    "TOTAL FOMAG": ["SALUD", "PENSIÓN", "CESANTÍAS"]
+}
+
+# Rangos inclusivos de los últimos dos dígitos de Codigo_O por sección
+RANGO_TOTAL = (None, 64)
+RANGO_PRIMERA_INFANCIA = (1, 19)
+RANGO_ORIENTADORES = (20, 32)
+RANGO_GLOBAL = (33, 57)
+
+# Secciones de la pantalla RECURSOS PROPIOS: (sección, rango de códigos, nombre del total final)
+SECCIONES_RECURSOS_PROPIOS = [
+    ("TOTAL", RANGO_TOTAL, "DOC REC PROPIOS"),
+    ("PRIMERA INFANCIA", RANGO_PRIMERA_INFANCIA, "PRIMERA INFANCIA REC PROPIOS"),
+    ("ORIENTADORES", RANGO_ORIENTADORES, "ORIENTADORES REC PROPIOS"),
+    ("GLOBAL", RANGO_GLOBAL, "GLOBAL REC PROPIOS")
+]
+
+def agrupar_cubo_conceptos(libro):
+    """Suma las columnas de valores del libro por (Nombre, Concepto de gasto, últimos dos dígitos)"""
+    # Las filas sin fuente o concepto no caen en ninguna sección y se descartan
+    return (
+        libro.groupby(["Nombre", "Concepto de gasto", "ULTIMOS_DOS"], observed=True)[COLUMNAS_VALORES]
+        .sum()
+    )
+
+def resumir_recursos_propios(cubo, rango, total_final="DOC REC PROPIOS"):
+    """Arma la tabla de conceptos de RECURSOS PROPIOS para un rango de códigos a partir del cubo"""
+    nombres = cubo.index.get_level_values("Nombre")
+    filtro = (nombres == FUENTE_RECURSOS_PROPIOS) & en_rango(cubo.index.get_level_values("ULTIMOS_DOS"), *rango)
+
+    por_concepto = cubo[filtro].groupby(level="Concepto de gasto", observed=True).sum()
+
+    # Verificar si hay al menos alguna fila que cumpla los criterios
+    if not por_concepto.index.isin(list(CONCEPTOS_RECURSOS_PROPIOS.values())).any():
+        return None
+
+    por_concepto = por_concepto.reindex(list(CONCEPTOS_RECURSOS_PROPIOS.values()), fill_value=0)
+
+    datos = {}
+    for total, conceptos in GRUPOS_RECURSOS_PROPIOS.items():
+        for concepto in conceptos:
+            datos[concepto] = por_concepto.loc[CONCEPTOS_RECURSOS_PROPIOS[concepto]].to_dict()
+        datos[total] = {col: sum(datos[concepto][col] for concepto in conceptos) for col in COLUMNAS_VALORES}
+
+    # Total general: SUELDOS + TOTAL PARAFISCALES + TOTAL FOMAG
+    datos[total_final] = {col: sum(datos[total][col] for total in GRUPOS_RECURSOS_PROPIOS) for col in COLUMNAS_VALORES}
+    return datos
+
+# =============================================================================
+# DETALLE DE LÍNEAS POR CELDA
+# =============================================================================
+# Columnas que se muestran de cada línea del libro al desplegar una fila
+COLUMNAS_DETALLE = ["Codigo_O", "Nombre", "Concepto de gasto"] + COLUMNAS_VALORES
+
+def unir_posiciones(grupos):
+    """Posiciones ordenadas y sin repetir de varias filas (para los totales)"""
+    return np.unique(np.concatenate(grupos))
+
+def indexar_detalle(libro, indice):
+    """Índice invertido (tabla, fila) -> posiciones de las líneas del libro que suman en esa fila"""
+    ultimos_dos = libro["ULTIMOS_DOS"].to_numpy()
+    detalle = {}
+
+    # Resumen SGP: cada bolsillo con sus reglas; los totales, con la unión de sus componentes
+    for definicion in BOLSILLOS_SGP:
+        detalle[("SGP", definicion["bolsillo"])] = posiciones_rango(
+            indice, ultimos_dos, definicion["fuente"], definicion["conceptos"], definicion["rango"]
+        )
+    for total, componentes in TOTALES_RESUMEN_SGP.items():
+        detalle[("SGP", total)] = unir_posiciones([detalle[("SGP", componente)] for componente in componentes])
+
+    # Secciones de RECURSOS PROPIOS: cada concepto, sus subtotales y el total final
+    for seccion, rango, total_final in SECCIONES_RECURSOS_PROPIOS:
+        for concepto, concepto_gasto in CONCEPTOS_RECURSOS_PROPIOS.items():
+            detalle[(seccion, concepto)] = posiciones_rango(
+                indice, ultimos_dos, FUENTE_RECURSOS_PROPIOS, [concepto_gasto], rango
+            )
+        for total, conceptos in GRUPOS_RECURSOS_PROPIOS.items():
+            detalle[(seccion, total)] = unir_posiciones([detalle[(seccion, concepto)] for concepto in conceptos])
+        detalle[(seccion, total_final)] = unir_posiciones([detalle[(seccion, total)] for total in GRUPOS_RECURSOS_PROPIOS])
+
+    return detalle
+
+def lineas_detalle(libro, posiciones):
+    """Líneas del libro en las posiciones dadas; solo se copian esas filas"""
+    return libro[COLUMNAS_DETALLE].take(posiciones)
+
+# =============================================================================
+# DIFERENCIAS ENTRE EXPORTS
+# =============================================================================
+# Columnas que ubican cada fila: si coinciden posición por posición, los dos exports tienen las mismas filas
+LLAVE_FILA = ["Codigo_O", "Nombre", "Concepto de gasto"]
+
+def mismas_filas(anterior, nuevo):
+    """True si los dos libros tienen las mismas filas en el mismo orden y solo pueden diferir sus valores"""
+    if len(anterior) != len(nuevo):
+        return False
+    # Con los mismos textos las categorías salen iguales: basta comparar sus códigos enteros
+    for col in LLAVE_FILA:
+        categorias_anterior, categorias_nuevo = anterior[col].array, nuevo[col].array
+        if not categorias_anterior.categories.equals(categorias_nuevo.categories):
+            return False
+        if not np.array_equal(categorias_anterior.codes, categorias_nuevo.codes):
+            return False
+    return True
+
+def filas_cambiadas(anterior, nuevo):
+    """Posiciones de las filas con algún valor distinto entre dos libros con las mismas filas"""
+    cambiadas = np.zeros(len(nuevo), dtype=bool)
+    for col in COLUMNAS_VALORES:
+        cambiadas |= anterior[col].to_numpy() != nuevo[col].to_numpy()
+    return np.flatnonzero(cambiadas)
+
+def diferencias_libros(anterior, nuevo, posiciones):
+    """Filas del libro nuevo en las posiciones dadas, con la diferencia de sus valores frente al anterior"""
+    return nuevo[LLAVE_FILA + ["ULTIMOS_DOS"]].take(posiciones).assign(**{
+        col: nuevo[col].to_numpy()[posiciones] - anterior[col].to_numpy()[posiciones] for col in COLUMNAS_VALORES
+    })
+
+def aplicar_deltas(resumen, cubo, deltas):
+    """Suma las diferencias de las filas cambiadas al resumen SGP y al cubo de conceptos"""
+    # Los totales del resumen son sumas de bolsillos: la diferencia se propaga igual
+    resumen = resumen + calcular_resumen_sgp(deltas)
+    # Las filas son las mismas: cada celda de las diferencias ya está en el cubo
+    cubo = cubo.add(agrupar_cubo_conceptos(deltas), fill_value=0).astype(np.int64)
+    return resumen, cubo
+
+def bolsillos_cambiados(anterior, nuevo):
+    """Bolsillos del resumen SGP con algún valor distinto entre dos exports"""
+    bolsillos = [definicion["bolsillo"] for definicion in BOLSILLOS_SGP]
+    return [bolsillo for bolsillo in bolsillos if nuevo.loc[bolsillo].ne(anterior.loc[bolsillo]).any()]
+
+# =============================================================================
+# LIBRO NORMALIZADO
+# =============================================================================
+def continuar_bloque(serie, anterior):
+    """Serie ya rellenada hacia adelante; sus filas iniciales vacías toman el último valor del bloque anterior"""
+    if anterior is None or pd.isna(anterior) or serie.empty or pd.notna(serie.iloc[0]):
+        return serie
+    return serie.astype(object).fillna(anterior)
+
+def normalizar_libro(df, arrastre=None):
+    """Deriva una sola vez Codigo_O, fuente y concepto categóricos, el sufijo como int8 y los valores en pesos int64"""
+    # arrastre: (Codigo_O, concepto) de la última fila del bloque anterior, cuando el export se lee por bloques
+    anterior_codigo, anterior_concepto = arrastre or (None, None)
+    codigos = df.iloc[:, 0]
+    # Rellenar hacia adelante sobre categorías: se copian códigos enteros, no cadenas
+    codigo_o = codigos.where(codigos.astype(str).str.startswith("  O")).astype("category").ffill()
+    codigo_o = pd.Categorical(continuar_bloque(codigo_o, anterior_codigo)).remove_unused_categories()
+    conceptos = continuar_bloque(df["Concepto de gasto"].astype("category").ffill(), anterior_concepto)
+
+    # Últimos dos dígitos de cada código distinto; las filas los toman por su código de categoría
+    sufijos = pd.to_numeric(codigo_o.categories.str[-2:], errors="coerce")
+    sufijos = np.append(np.nan_to_num(sufijos, nan=SIN_SUFIJO), SIN_SUFIJO).astype(np.int8)
+
+    columnas = {
+        "Codigo_O": codigo_o,
+        # El código -1 (sin Codigo_O) toma el último elemento: SIN_SUFIJO
+        "ULTIMOS_DOS": sufijos[codigo_o.codes],
+        "Nombre": pd.Categorical(df["Nombre"]),
+        "Concepto de gasto": pd.Categorical(conceptos)
+    }
+    # APOTEOSYS reporta pesos enteros: las sumas en int64 son exactas; las celdas vacías suman cero
+    for col in COLUMNAS_VALORES:
+        pesos = pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy(dtype=float)
+        columnas[col] = np.rint(pesos).astype(np.int64)
+
+    # Marcar los arreglos como solo lectura: cualquier escritura en el libro compartido falla
+    for valores in columnas.values():
+        if isinstance(valores, np.ndarray) and valores.dtype != object:
+            valores.flags.writeable = False
+
+    return pd.DataFrame(columnas, copy=False)
+
+def agregar_por_bloques(bloques):
+    """Resumen SGP y cubo de conceptos de un export leído por bloques: cada bloque se suma a los totales y se descarta"""
+    resumen = cubo = arrastre = None
+    for bloque in bloques:
+        libro = normalizar_libro(bloque, arrastre)
+        if libro.empty:
+            continue
+        # Las primeras filas del bloque siguiente pueden pertenecer al último código de este
+        arrastre = (libro["Codigo_O"].iloc[-1], libro["Concepto de gasto"].iloc[-1])
+
+        resumen_bloque = calcular_resumen_sgp(libro)
+        # Niveles como texto: cada bloque trae sus propias categorías
+        cubo_bloque = agrupar_cubo_conceptos(libro)
+        cubo_bloque.index = cubo_bloque.index.set_levels(
+            [nivel.astype(object) if isinstance(nivel, pd.CategoricalIndex) else nivel for nivel in cubo_bloque.index.levels]
+        )
+        if resumen is None:
+            resumen, cubo = resumen_bloque, cubo_bloque
+        else:
+            resumen = resumen + resumen_bloque
+            cubo = cubo.add(cubo_bloque, fill_value=0).astype(np.int64)
+    return resumen, cubo
+
+def calcular_totales_corte(libro):
+    """Tablas agregadas de un corte: resumen SGP y las secciones de RECURSOS PROPIOS"""
+    return tablas_corte(calcular_resumen_sgp(libro), agrupar_cubo_conceptos(libro))
+
+def tablas_corte(resumen, cubo):
+    """Tablas de un corte a partir de su resumen SGP y su cubo de conceptos"""
+    tablas = {"SGP": resumen}
+    for seccion, rango, total_final in SECCIONES_RECURSOS_PROPIOS:
+        datos = resumir_recursos_propios(cubo, rango, total_final)
+        if datos is not None:
+            tablas[seccion] = pd.DataFrame.from_dict(datos, orient="index")
+    return tablas
@@ -0,0 +1,191 @@
+"""Línea de comandos: python -m control_presupuestal {resumir,exportar,ingerir,consultar,benchmark} ... (no importa Streamlit)"""
+import argparse
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from control_presupuestal.calculos import (
+    COLUMNAS_VALORES, agregar_por_bloques, calcular_totales_corte, indexar_detalle, indexar_libro, normalizar_libro,
+    tablas_corte
+)
+from control_presupuestal.dataset import consultar_lineas, consultar_totales
+from control_presupuestal.exportar import exportar_tablas, indicadores_sgp
+from control_presupuestal.fuentes import abrir_export, cargar_snapshot, leer_csv_por_bloques
+from control_presupuestal.historico import (
+    CARPETA_EXPORTS, buscar_exports, detectar_fecha_corte, ingerir_exports, leer_totales_historico, reconstruir_dataset
+)
+
+def resumir_por_bloques(fuente):
+    """Tablas y fecha de corte de un export CSV leído por bloques: la memoria no crece con el número de filas"""
+    with abrir_export(fuente) as flujo:
+        bloques = leer_csv_por_bloques(flujo)
+        primero = next(bloques, None)
+        if primero is None:
+            raise ValueError(f"El export '{fuente}' no tiene filas")
+        resumen, cubo = agregar_por_bloques(itertools.chain([primero], bloques))
+    # El encabezado 'Período: ...' está en la primera fila
+    return tablas_corte(resumen, cubo), detectar_fecha_corte(primero.iloc[:1], fuente)
+
+def resumir(opciones):
+    """Calcula el resumen SGP y las tablas de RECURSOS PROPIOS de un export y las escribe en CSV o JSON"""
+    if opciones.por_bloques:
+        if Path(str(opciones.fuente).split("?")[0]).suffix.lower() in (".xlsx", ".xls"):
+            print("--por-bloques solo sirve para exports CSV", file=sys.stderr)
+            return 2
+        tablas, fecha_corte = resumir_por_bloques(opciones.fuente)
+    else:
+        df = cargar_snapshot(opciones.fuente)
+        tablas = calcular_totales_corte(normalizar_libro(df))
+        fecha_corte = detectar_fecha_corte(df, opciones.fuente)
+
+    if opciones.formato == "json":
+        texto = json.dumps(
+            {
+                "fuente": str(opciones.fuente),
+                "fecha_corte": fecha_corte.isoformat(),
+                "tablas": {
+                    nombre: {fila: valores[COLUMNAS_VALORES].to_dict() for fila, valores in tabla.iterrows()}
+                    for nombre, tabla in tablas.items()
+                }
+            },
+            ensure_ascii=False,
+            indent=2
+        )
+    else:
+        # Formato largo: una fila por (tabla, fila) con las columnas de valores
+        largo = pd.concat(
+            {nombre: tabla[COLUMNAS_VALORES] for nombre, tabla in tablas.items()},
+            names=["TABLA", "FILA"]
+        )
+        texto = largo.to_csv()
+
+    if opciones.salida:
+        with open(opciones.salida, "w", encoding="utf-8", newline="") as archivo:
+            archivo.write(texto)
+    else:
+        sys.stdout.write(texto)
+    return 0
+
+def exportar(opciones):
+    """Escribe las tablas, los indicadores y, si se piden, el histórico y las líneas de cada fila en un .xlsx o un ZIP de CSV"""
+    libro = normalizar_libro(cargar_snapshot(opciones.fuente))
+    tablas = calcular_totales_corte(libro)
+    formato = opciones.formato or ("csv" if opciones.salida.lower().endswith(".zip") else "xlsx")
+
+    inicio = time.perf_counter()
+    exportar_tablas(
+        opciones.salida,
+        formato,
+        tablas,
+        indicadores_sgp(tablas["SGP"]),
+        historico=leer_totales_historico() if opciones.historico else None,
+        libro=libro,
+        detalle=indexar_detalle(libro, indexar_libro(libro)) if opciones.detalle else None
+    )
+    print(f"{opciones.salida} escrito en {time.perf_counter() - inicio:.2f} s", file=sys.stderr)
+    return 0
+
+def ingerir(opciones):
+    """Incorpora al histórico los exports APOTEOSYS de una carpeta, en paralelo"""
+    rutas = buscar_exports(opciones.carpeta)
+    inicio = time.perf_counter()
+    nuevos, errores = ingerir_exports(rutas, opciones.procesos)
+    print(f"{len(rutas)} exports encontrados, {nuevos} cortes nuevos en {time.perf_counter() - inicio:.1f} s")
+    for ruta, error in errores.items():
+        print(f"ERROR {ruta}: {error}", file=sys.stderr)
+    return 1 if errores else 0
+
+def consultar(opciones):
+    """Consulta las líneas del dataset de cortes; los filtros se aplican al leer, sin cargar las particiones descartadas"""
+    if opciones.reconstruir:
+        escritos, sin_snapshot = reconstruir_dataset()
+        print(f"{escritos} cortes escritos en el dataset", file=sys.stderr)
+        for origen in sin_snapshot:
+            print(f"SIN SNAPSHOT {origen}", file=sys.stderr)
+
+    filtros = {
+        "vigencias": opciones.vigencia,
+        "cortes": opciones.corte,
+        "fuentes": opciones.fuente,
+        "rango": opciones.rango,
+        "conceptos": opciones.concepto
+    }
+    if opciones.agrupar:
+        resultado = consultar_totales(opciones.agrupar, **filtros)
+    else:
+        resultado = consultar_lineas(**filtros)
+
+    if opciones.salida:
+        resultado.to_csv(opciones.salida, index=False)
+    else:
+        sys.stdout.write(resultado.to_csv(index=False))
+    return 0
+
+def benchmark(opciones):
+    """Mide tiempo y memoria de cada etapa sobre exports sintéticos de varios tamaños"""
+    # Importación diferida: el generador sintético solo se necesita aquí
+    from control_presupuestal.benchmark import ejecutar_benchmark
+
+    resultados = ejecutar_benchmark(opciones.filas, opciones.formato, opciones.repeticiones, opciones.semilla)
+    print(resultados.to_string(index=False, formatters={"segundos": "{:.4f}".format, "mb_pico": "{:.1f}".format}))
+    if opciones.salida:
+        resultados.to_json(opciones.salida, orient="records", force_ascii=False, indent=2)
+    return 0
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(prog="python -m control_presupuestal", description="Control presupuestal de nómina sin interfaz")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    parser_resumir = comandos.add_parser("resumir", aliases=["summarize"], help="tablas SGP y RECURSOS PROPIOS de un export")
+    parser_resumir.add_argument("--fuente", "--source", required=True, help="export APOTEOSYS (.xlsx / .xls / .csv) o URL")
+    parser_resumir.add_argument("--formato", "--format", choices=["csv", "json"], default="csv")
+    parser_resumir.add_argument("--salida", "--output", help="archivo de salida (por defecto, la salida estándar)")
+    parser_resumir.add_argument(
+        "--por-bloques", "--streaming", action="store_true",
+        help="lee un export CSV por bloques sumando a medida que llega (memoria acotada, sin snapshot)"
+    )
+    parser_resumir.set_defaults(ejecutar=resumir)
+
+    parser_exportar = comandos.add_parser("exportar", aliases=["export"], help="todas las tablas e indicadores en un .xlsx o un ZIP de CSV")
+    parser_exportar.add_argument("--fuente", "--source", required=True, help="export APOTEOSYS (.xlsx / .xls / .csv) o URL")
+    parser_exportar.add_argument("--salida", "--output", required=True, help="archivo de salida (.xlsx, o .zip con un CSV por hoja)")
+    parser_exportar.add_argument("--formato", "--format", choices=["xlsx", "csv"], default=None, help="por defecto, según la extensión de --salida")
+    parser_exportar.add_argument("--historico", action="store_true", help="agrega una hoja con las tablas de todos los cortes del histórico")
+    parser_exportar.add_argument("--detalle", action="store_true", help="agrega una hoja con las líneas Codigo_O de cada fila")
+    parser_exportar.set_defaults(ejecutar=exportar)
+
+    parser_ingerir = comandos.add_parser("ingerir", help="incorpora al histórico los exports de una carpeta")
+    parser_ingerir.add_argument("carpeta", nargs="?", default=str(CARPETA_EXPORTS), help="carpeta con los exports APOTEOSYS *.xls / *.xlsx")
+    parser_ingerir.add_argument("--procesos", type=int, default=None, help="procesos en paralelo (por defecto, uno por núcleo)")
+    parser_ingerir.set_defaults(ejecutar=ingerir)
+
+    parser_consultar = comandos.add_parser("consultar", aliases=["query"], help="líneas o totales del dataset de cortes, con filtros")
+    parser_consultar.add_argument("--vigencia", type=int, nargs="+", help="años de los cortes")
+    parser_consultar.add_argument("--corte", nargs="+", help="fechas de corte (AAAA-MM-DD)")
+    parser_consultar.add_argument("--fuente", nargs="+", help="fuentes (columna Nombre), p. ej. 'Otros Distrito Inversión'")
+    parser_consultar.add_argument("--rango", type=int, nargs=2, metavar=("MIN", "MAX"), help="últimos dos dígitos del código, p. ej. 33 57")
+    parser_consultar.add_argument("--concepto", nargs="+", help="conceptos de gasto")
+    parser_consultar.add_argument(
+        "--agrupar", nargs="+", choices=["vigencia", "corte", "fuente", "Concepto de gasto", "ULTIMOS_DOS"],
+        help="devuelve la suma de los valores por estas columnas en lugar de las líneas"
+    )
+    parser_consultar.add_argument("--salida", "--output", help="archivo CSV de salida (por defecto, la salida estándar)")
+    parser_consultar.add_argument(
+        "--reconstruir", action="store_true", help="antes de consultar, vuelve a escribir el dataset desde los cortes del histórico"
+    )
+    parser_consultar.set_defaults(ejecutar=consultar)
+
+    parser_benchmark = comandos.add_parser("benchmark", help="tiempo y memoria por etapa con exports sintéticos")
+    parser_benchmark.add_argument("--filas", type=int, nargs="+", default=None, help="tamaños a medir (por defecto 10000 100000 1000000)")
+    parser_benchmark.add_argument("--formato", choices=["csv", "xlsx"], default="csv", help="formato del export sintético")
+    parser_benchmark.add_argument("--repeticiones", type=int, default=1, help="se reporta el menor tiempo de las repeticiones")
+    parser_benchmark.add_argument("--semilla", type=int, default=0)
+    parser_benchmark.add_argument("--salida", help="archivo JSON con los resultados, para comparar entre versiones")
+    parser_benchmark.set_defaults(ejecutar=benchmark)
+
+    opciones = parser.parse_args(argumentos)
+    return opciones.ejecutar(opciones)
@@ -0,0 +1,110 @@
+"""Dataset Parquet particionado por vigencia, fecha de corte y fuente, con filtros que se aplican al leer"""
+import os
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from control_presupuestal.calculos import COLUMNAS_VALORES, SIN_SUFIJO
+from control_presupuestal.fuentes import RAIZ_PROYECTO
+
+# Líneas de todos los cortes: .dataset/vigencia=2025/corte=2025-10-29/fuente=<Nombre>/<huella>-0.parquet
+CARPETA_DATASET = RAIZ_PROYECTO / ".dataset"
+
+ESQUEMA_PARTICION = pa.schema([
+    ("vigencia", pa.int16()),
+    ("corte", pa.string()),
+    ("fuente", pa.string())
+])
+
+# Columnas de cada línea, fuera de las de partición
+COLUMNAS_LINEA = ["Codigo_O", "ULTIMOS_DOS", "Concepto de gasto"] + COLUMNAS_VALORES
+
+# Filas por grupo de Parquet: las líneas van ordenadas por sufijo, así las estadísticas min/max de cada
+# grupo permiten saltar los que quedan fuera de un rango de códigos
+FILAS_GRUPO = 16_384
+
+def particiones():
+    """Esquema de carpetas vigencia=/corte=/fuente="""
+    return ds.partitioning(ESQUEMA_PARTICION, flavor="hive")
+
+def escribir_corte(libro, fecha_corte, huella):
+    """Agrega las líneas de fuente de un corte al dataset; volver a escribir la misma huella reemplaza sus archivos"""
+    # La primera fila de cada Codigo_O es la del código (su descripción y la suma de sus fuentes): no es una fuente
+    codigos = libro["Codigo_O"]
+    fila_codigo = codigos.ne(codigos.shift()) | codigos.isna()
+    nombres = libro["Nombre"].astype(object)
+    filas = libro.loc[~fila_codigo & nombres.notna() & nombres.astype(str).str.strip().ne("")]
+    lineas = pd.DataFrame({
+        "vigencia": pd.Series(fecha_corte.year, index=filas.index, dtype="int16"),
+        "corte": fecha_corte.isoformat(),
+        "fuente": filas["Nombre"].astype(object),
+        "Codigo_O": filas["Codigo_O"].astype(object),
+        "ULTIMOS_DOS": filas["ULTIMOS_DOS"],
+        "Concepto de gasto": filas["Concepto de gasto"].astype(object),
+        **{col: filas[col] for col in COLUMNAS_VALORES}
+    }).sort_values(["fuente", "ULTIMOS_DOS"], kind="stable")
+
+    ds.write_dataset(
+        pa.Table.from_pandas(lineas, preserve_index=False),
+        CARPETA_DATASET,
+        format="parquet",
+        partitioning=particiones(),
+        # Un archivo por huella en cada carpeta: dos exports del mismo día (otra entidad) no se pisan
+        basename_template=f"{huella}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        max_rows_per_group=FILAS_GRUPO,
+        max_rows_per_file=0
+    )
+
+def filtro_dataset(vigencias=None, cortes=None, fuentes=None, rango=None, conceptos=None):
+    """Expresión de filtro de pyarrow; las condiciones sobre particiones descartan carpetas completas"""
+    condiciones = []
+    if vigencias:
+        condiciones.append(ds.field("vigencia").isin([int(vigencia) for vigencia in vigencias]))
+    if cortes:
+        condiciones.append(ds.field("corte").isin([
+            corte.isoformat() if isinstance(corte, date) else str(corte) for corte in cortes
+        ]))
+    if fuentes:
+        condiciones.append(ds.field("fuente").isin(list(fuentes)))
+    if rango:
+        minimo, maximo = rango
+        # Con un límite, las líneas SIN_SUFIJO quedan fuera (como en en_rango)
+        if minimo is not None or maximo is not None:
+            condiciones.append(ds.field("ULTIMOS_DOS") >= (SIN_SUFIJO + 1 if minimo is None else minimo))
+        if maximo is not None:
+            condiciones.append(ds.field("ULTIMOS_DOS") <= maximo)
+    if conceptos:
+        condiciones.append(ds.field("Concepto de gasto").isin(list(conceptos)))
+
+    filtro = None
+    for condicion in condiciones:
+        filtro = condicion if filtro is None else filtro & condicion
+    return filtro
+
+def leer_dataset(columnas=None, **filtros):
+    """Tabla de Arrow con las líneas que cumplen los filtros; None si el dataset todavía no existe"""
+    if not CARPETA_DATASET.is_dir() or not any(os.scandir(CARPETA_DATASET)):
+        return None
+    dataset = ds.dataset(CARPETA_DATASET, format="parquet", partitioning=particiones())
+    return dataset.to_table(columns=columnas, filter=filtro_dataset(**filtros))
+
+def consultar_lineas(**filtros):
+    """Líneas (vigencia, corte, fuente, código, concepto y valores) que cumplen los filtros"""
+    tabla = leer_dataset(**filtros)
+    if tabla is None:
+        return pd.DataFrame(columns=list(ESQUEMA_PARTICION.names) + COLUMNAS_LINEA)
+    return tabla.to_pandas()[list(ESQUEMA_PARTICION.names) + COLUMNAS_LINEA]
+
+def consultar_totales(por=("vigencia", "corte"), **filtros):
+    """Suma de las columnas de valores por las columnas de `por`, agregada en Arrow sin pasar las líneas a pandas"""
+    por = list(por)
+    tabla = leer_dataset(columnas=por + COLUMNAS_VALORES, **filtros)
+    if tabla is None:
+        return pd.DataFrame(columns=por + COLUMNAS_VALORES)
+
+    totales = tabla.group_by(por).aggregate([(col, "sum") for col in COLUMNAS_VALORES]).to_pandas()
+    totales = totales.rename(columns={f"{col}_sum": col for col in COLUMNAS_VALORES})
+    return totales[por + COLUMNAS_VALORES].sort_values(por, ignore_index=True)
@@ -0,0 +1,121 @@
+"""Diagnóstico del tablero: tiempos y memoria por etapa, contadores de caché y líneas de log estructuradas"""
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Últimas mediciones del proceso (las más viejas se descartan)
+MAX_REGISTROS = 500
+
+registro = logging.getLogger("control_presupuestal.diagnostico")
+
+# Estado del proceso: vive en el módulo, que se importa una sola vez aunque el script de la app se vuelva a ejecutar
+_candado = threading.Lock()
+_mediciones = deque(maxlen=MAX_REGISTROS)
+_contadores_cache = {}
+# Etapas en curso mientras se mide memoria, de todos los hilos: el pico de tracemalloc es uno solo para el proceso
+_abiertas = {}
+
+def _reiniciar_pico():
+    """Lleva el pico actual a todas las etapas en curso y lo reinicia (con _candado tomado)"""
+    pico = tracemalloc.get_traced_memory()[1]
+    for abierta in _abiertas.values():
+        abierta["pico"] = max(abierta["pico"], pico)
+    tracemalloc.reset_peak()
+
+@contextmanager
+def medir(etapa, **contexto):
+    """Mide el tiempo de una etapa (y su memoria si tracemalloc está activo), la guarda y la escribe en el log"""
+    memoria = tracemalloc.is_tracing()
+    if memoria:
+        # Reiniciar el pico para esta etapa sin perder el que ya llevaban las etapas que la contienen
+        with _candado:
+            _reiniciar_pico()
+            abierta = {"antes": tracemalloc.get_traced_memory()[0], "pico": 0}
+            _abiertas[id(abierta)] = abierta
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        medicion = {
+            "momento": datetime.now().isoformat(timespec="seconds"),
+            "etapa": etapa,
+            "ms": round((time.perf_counter() - inicio) * 1000, 2),
+            "hilo": threading.current_thread().name,
+            **contexto
+        }
+        if memoria:
+            with _candado:
+                del _abiertas[id(abierta)]
+                actual, pico = tracemalloc.get_traced_memory()
+            # El pico de la etapa es el mayor entre el del tramo final y los de los tramos que cortaron etapas internas
+            pico = max(pico, abierta["pico"])
+            medicion["memoria_kb"] = round((actual - abierta["antes"]) / 1024, 1)
+            medicion["pico_kb"] = round((pico - abierta["antes"]) / 1024, 1)
+        if error:
+            medicion["error"] = error
+
+        with _candado:
+            _mediciones.append(medicion)
+        registro.info(json.dumps({"evento": "etapa", **medicion}, ensure_ascii=False, default=str))
+
+def mediciones():
+    """Copia de las mediciones guardadas, de la más antigua a la más reciente"""
+    with _candado:
+        return list(_mediciones)
+
+def contar_cache(decorador):
+    """Envuelve un decorador de caché (p. ej. st.cache_data(...)) contando llamadas y ejecuciones reales de la función"""
+    def decorar(funcion):
+        nombre = funcion.__qualname__
+        with _candado:
+            contadores = _contadores_cache.setdefault(nombre, {"llamadas": 0, "fallos": 0})
+
+        @functools.wraps(funcion)
+        def ejecutar(*args, **kwargs):
+            # Solo se llega aquí cuando la caché no tenía el resultado
+            with _candado:
+                contadores["fallos"] += 1
+            registro.info(json.dumps({"evento": "cache_fallo", "funcion": nombre}, ensure_ascii=False))
+            return funcion(*args, **kwargs)
+
+        cacheada = decorador(ejecutar)
+
+        @functools.wraps(funcion)
+        def llamar(*args, **kwargs):
+            with _candado:
+                contadores["llamadas"] += 1
+            return cacheada(*args, **kwargs)
+
+        llamar.clear = cacheada.clear
+        return llamar
+    return decorar
+
+def contadores_cache():
+    """Llamadas, aciertos, fallos y tasa de aciertos de cada función cacheada"""
+    with _candado:
+        return {
+            nombre: {
+                "llamadas": valores["llamadas"],
+                "aciertos": valores["llamadas"] - valores["fallos"],
+                "fallos": valores["fallos"],
+                "tasa_aciertos": (valores["llamadas"] - valores["fallos"]) / valores["llamadas"] if valores["llamadas"] else 0.0
+            }
+            for nombre, valores in _contadores_cache.items()
+        }
+
+def reiniciar():
+    """Borra las mediciones y pone en cero los contadores de caché"""
+    with _candado:
+        _mediciones.clear()
+        for valores in _contadores_cache.values():
+            valores.update(llamadas=0, fallos=0)
@@ -0,0 +1,82 @@
+"""Exportación de las tablas e indicadores del tablero a un libro Excel (hojas de solo escritura) o a un ZIP de CSV"""
+import csv
+import io
+import zipfile
+
+from openpyxl import Workbook
+
+from control_presupuestal.calculos import COLUMNAS_DETALLE, COLUMNAS_VALORES, lineas_detalle
+
+# Fila del resumen SGP de la que salen los indicadores del resumen ejecutivo
+FILA_TOTAL_SGP = "TOTAL SGP+RP P8033"
+
+# Formatos de exportación: extensión del archivo y tipo MIME
+FORMATOS_EXPORTACION = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("zip", "application/zip")
+}
+
+def indicadores_sgp(resumen):
+    """Indicadores del resumen ejecutivo: % ejecutado, RP emitidos, disponible y por ejecutar del total SGP+RP"""
+    total = resumen.loc[FILA_TOTAL_SGP]
+    disponible = total["DISPONIBLE"]
+    return {
+        "% EJECUTADO": total["GIROS ACUMULADOS"] / disponible * 100 if disponible > 0 else 0,
+        "GIROS ACUMULADOS": total["GIROS ACUMULADOS"],
+        "RP EMITIDOS": total["RP EMITIDOS"],
+        "% RP DEL DISPONIBLE": total["RP EMITIDOS"] / disponible * 100 if disponible > 0 else 0,
+        "DISPONIBLE TOTAL": disponible,
+        "POR EJECUTAR": total["RECURSOS SIN EJECUTAR"]
+    }
+
+def filas_tabla(tabla):
+    """Filas (nombre de la fila y sus valores) de una tabla agregada"""
+    for fila, *valores in tabla[COLUMNAS_VALORES].itertuples(name=None):
+        yield [fila, *valores]
+
+def filas_detalle(libro, detalle):
+    """Líneas del libro de cada fila de las tablas, precedidas por la tabla y la fila; se toman de a una fila"""
+    for (tabla, fila), posiciones in detalle.items():
+        for linea in lineas_detalle(libro, posiciones).itertuples(index=False, name=None):
+            yield [tabla, fila, *linea]
+
+def hojas_exportacion(tablas, indicadores, historico=None, libro=None, detalle=None):
+    """Hojas del archivo exportado: (nombre, encabezado, filas); las filas se generan al escribir, sin armar DataFrames"""
+    hojas = [("INDICADORES", ["INDICADOR", "VALOR"], ([nombre, valor] for nombre, valor in indicadores.items()))]
+    for nombre, tabla in tablas.items():
+        hojas.append((nombre if nombre == "SGP" else f"RP {nombre}", ["FILA"] + COLUMNAS_VALORES, filas_tabla(tabla)))
+    if historico is not None:
+        hojas.append(("HISTORICO", list(historico.columns), historico.itertuples(index=False, name=None)))
+    if detalle is not None:
+        hojas.append(("DETALLE", ["TABLA", "FILA"] + COLUMNAS_DETALLE, filas_detalle(libro, detalle)))
+    return hojas
+
+def escribir_excel(salida, hojas):
+    """Escribe las hojas en un libro .xlsx en modo de solo escritura: cada fila va al archivo y no queda en memoria"""
+    libro = Workbook(write_only=True)
+    for nombre, encabezado, filas in hojas:
+        # Excel limita el nombre de la hoja a 31 caracteres
+        hoja = libro.create_sheet(nombre[:31])
+        hoja.append(encabezado)
+        for fila in filas:
+            hoja.append(fila)
+    libro.save(salida)
+
+def escribir_zip_csv(salida, hojas):
+    """Escribe cada hoja como un CSV dentro de un ZIP, fila por fila"""
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, encabezado, filas in hojas:
+            with archivo.open(f"{nombre}.csv", "w") as binario, io.TextIOWrapper(binario, encoding="utf-8-sig", newline="") as texto:
+                escritor = csv.writer(texto)
+                escritor.writerow(encabezado)
+                escritor.writerows(filas)
+
+def exportar_tablas(salida, formato, tablas, indicadores, historico=None, libro=None, detalle=None):
+    """Escribe tablas, indicadores y, si se pasan, el histórico y las líneas de cada fila en un archivo o flujo binario"""
+    hojas = hojas_exportacion(tablas, indicadores, historico, libro, detalle)
+    if formato == "xlsx":
+        escribir_excel(salida, hojas)
+    elif formato == "csv":
+        escribir_zip_csv(salida, hojas)
+    else:
+        raise ValueError(f"Formato de exportación desconocido: {formato}")
@@ -0,0 +1,250 @@
+"""Lectura de los exports APOTEOSYS (URL o archivo) y snapshots Parquet nombrados por el hash del contenido"""
+import csv
+import hashlib
+import io
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import requests
+from pandas.api.types import union_categoricals
+
+from control_presupuestal.calculos import COLUMNAS_VALORES
+from control_presupuestal.diagnostico import medir
+
+# Carpeta de la app: ahí quedan los snapshots, el histórico y las carpetas por defecto
+RAIZ_PROYECTO = Path(__file__).resolve().parent.parent
+
+# Snapshots Parquet de cada export, nombrados por el hash de su contenido.
+# Subir VERSION_SNAPSHOT cuando cambie la forma de tipar las columnas o cuáles se guardan.
+CARPETA_SNAPSHOTS = RAIZ_PROYECTO / ".snapshots"
+VERSION_SNAPSHOT = 3
+# Snapshots que se conservan (los de uso más reciente); al guardar uno nuevo se borran los demás y los de otras versiones
+MAXIMO_SNAPSHOTS = int(os.environ.get("CONTROL_PRESUPUESTAL_SNAPSHOTS", 48))
+
+# Exports CSV: se leen por bloques de este número de filas
+FILAS_BLOQUE = 50_000
+
+# Columnas de texto que usa el tablero; el snapshot guarda solo estas, la de código y las de valores (CSV y Excel por igual)
+COLUMNAS_TEXTO = ["Nombre", "Concepto de gasto"]
+
+def leer_contenido_export(origen):
+    """Lee los bytes crudos del export, desde una URL o desde un archivo local"""
+    if str(origen).startswith(("http://", "https://")):
+        respuesta = requests.get(origen, timeout=60)
+        respuesta.raise_for_status()
+        return respuesta.content
+    return Path(origen).read_bytes()
+
+@contextmanager
+def abrir_export(origen):
+    """Flujo binario del export: la respuesta HTTP se lee a medida que llega, sin descargarla completa"""
+    if str(origen).startswith(("http://", "https://")):
+        with requests.get(origen, stream=True, timeout=60) as respuesta:
+            respuesta.raise_for_status()
+            respuesta.raw.decode_content = True
+            yield respuesta.raw
+    else:
+        with open(origen, "rb") as archivo:
+            yield archivo
+
+def posiciones_tablero(encabezado):
+    """Posición -> nombre de las columnas que usa el tablero: la de código (la primera) y la primera de cada nombre buscado"""
+    # La columna de código es la primera, se llame como se llame (sin nombre, como la nombra pandas)
+    posiciones = {0: encabezado[0] or "Unnamed: 0"}
+    for col in COLUMNAS_TEXTO + COLUMNAS_VALORES:
+        if col in encabezado[1:]:
+            posiciones[encabezado.index(col, 1)] = col
+    return dict(sorted(posiciones.items()))
+
+def leer_csv_por_bloques(flujo, filas=FILAS_BLOQUE):
+    """Bloques de un export CSV con la columna de código, fuente, concepto y valores; nunca el texto completo"""
+    # El encabezado se lee aparte (sin BOM) para ubicar las columnas; pandas sigue desde la segunda línea
+    encabezado = next(csv.reader([flujo.readline().decode("utf-8-sig")]), [])
+    if not encabezado:
+        return
+
+    # Las columnas se toman por posición: el encabezado puede traer nombres vacíos o repetidos (columnas
+    # sobrantes de la hoja de cálculo), que no se pueden pasar como names=
+    posiciones = posiciones_tablero(encabezado)
+    columnas = list(posiciones.values())
+    bloques = pd.read_csv(
+        flujo,
+        encoding="utf-8",
+        header=None,
+        # Nombres por posición: el ancho de la tabla lo fija el encabezado, como antes con sus nombres
+        names=range(len(encabezado)),
+        usecols=list(posiciones),
+        dtype={posicion: str for posicion, col in posiciones.items() if col not in COLUMNAS_VALORES},
+        # Con skip_blank_lines el lector de pandas puede perder los espacios iniciales ("  O...") de una
+        # línea que empieza justo en el borde de su búfer; las líneas en blanco quedan como filas vacías
+        skip_blank_lines=False,
+        chunksize=filas
+    )
+    for bloque in bloques:
+        bloque = bloque.rename(columns=posiciones)
+        for col in COLUMNAS_VALORES:
+            if col in bloque:
+                bloque[col] = pd.to_numeric(bloque[col], errors="coerce")
+        yield bloque[columnas]
+
+def unir_bloques(bloques):
+    """Une bloques con el texto como categorías (sin pasar por un DataFrame de objetos) y los valores numéricos"""
+    if not bloques:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        col: (
+            union_categoricals([bloque[col] for bloque in bloques])
+            if isinstance(bloques[0][col].dtype, pd.CategoricalDtype)
+            else np.concatenate([bloque[col].to_numpy() for bloque in bloques])
+        )
+        for col in bloques[0].columns
+    })
+
+def parsear_export(contenido, origen):
+    """Convierte los bytes del export en un DataFrame con columnas tipadas"""
+    extension = Path(str(origen).split("?")[0]).suffix.lower()
+    if extension in (".xlsx", ".xls"):
+        # pandas detecta por el contenido si es .xls (xlrd) o .xlsx (openpyxl)
+        df = pd.read_excel(io.BytesIO(contenido))
+        df.columns = [str(col) for col in df.columns]
+        df = df[list(posiciones_tablero(list(df.columns)).values())]
+    else:
+        # CSV por bloques: cada bloque pasa su texto a categorías antes de leer el siguiente
+        return unir_bloques([
+            bloque.astype({col: "category" for col in bloque.columns if col not in COLUMNAS_VALORES})
+            for bloque in leer_csv_por_bloques(io.BytesIO(contenido))
+        ])
+
+    for col in df.columns:
+        if col in COLUMNAS_VALORES:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif df[col].dtype == object:
+            # Columnas de texto con valores mezclados (p. ej. el código "3" de GASTOS) se guardan como texto
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def ruta_snapshot(huella):
+    """Ruta del snapshot Parquet que corresponde a una huella de contenido"""
+    return CARPETA_SNAPSHOTS / f"{huella}.v{VERSION_SNAPSHOT}.parquet"
+
+def leer_snapshot(huella):
+    """Lee con memory-map el snapshot Parquet de una huella; None si no existe o está dañado"""
+    ruta = ruta_snapshot(huella)
+    if not ruta.exists():
+        return None
+    try:
+        df = pd.read_parquet(ruta, memory_map=True)
+    except Exception:
+        return None
+    try:
+        # Marcar el snapshot como usado: la poda conserva los más recientes
+        os.utime(ruta)
+    except OSError:
+        pass
+    return df
+
+def leer_primera_fila_snapshot(huella):
+    """Primera fila del snapshot de una huella (el encabezado 'Período: ...') sin pasar el resto a pandas; None si no existe"""
+    ruta = ruta_snapshot(huella)
+    if not ruta.exists():
+        return None
+    try:
+        return next(pq.ParquetFile(ruta, memory_map=True).iter_batches(batch_size=1)).to_pandas()
+    except Exception:
+        return None
+
+def escribir_snapshot(df, huella):
+    """Guarda un DataFrame ya tipado como snapshot Parquet de la huella"""
+    try:
+        CARPETA_SNAPSHOTS.mkdir(parents=True, exist_ok=True)
+        # Escribir en un temporal y renombrar, para que otra sesión nunca lea un archivo a medias
+        ruta = ruta_snapshot(huella)
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        df.to_parquet(temporal, index=False)
+        os.replace(temporal, ruta)
+    except OSError:
+        # Sin permisos de escritura: se sigue sin snapshot
+        return
+    podar_snapshots()
+
+def podar_snapshots():
+    """Borra los snapshots de otras versiones y, de la versión actual, los que pasan de MAXIMO_SNAPSHOTS"""
+    vigentes, sobrantes = [], []
+    for ruta in CARPETA_SNAPSHOTS.glob("*.parquet"):
+        if not ruta.name.endswith(f".v{VERSION_SNAPSHOT}.parquet"):
+            sobrantes.append(ruta)
+            continue
+        try:
+            vigentes.append((ruta.stat().st_mtime_ns, ruta))
+        except OSError:
+            # Otro proceso lo acaba de borrar
+            continue
+    vigentes.sort(reverse=True)
+    sobrantes += [ruta for _, ruta in vigentes[MAXIMO_SNAPSHOTS:]]
+
+    for ruta in sobrantes:
+        try:
+            ruta.unlink(missing_ok=True)
+        except OSError:
+            # Abierto en otra sesión (Windows no borra archivos mapeados): se intenta en la próxima poda
+            pass
+
+def guardar_snapshot(contenido, origen, huella):
+    """Parsea el export una sola vez y lo guarda como snapshot Parquet"""
+    df = parsear_export(contenido, origen)
+    escribir_snapshot(df, huella)
+    return df
+
+def revisar_origen(origen, estado):
+    """Devuelve la huella del contenido vigente del origen, descargando y parseando solo si cambió"""
+    # estado: validadores (ETag, Last-Modified, mtime) y huella de la revisión anterior de este origen; se actualiza aquí
+    if str(origen).startswith(("http://", "https://")):
+        # Petición condicional: si el servidor responde 304 el contenido no cambió
+        encabezados = {}
+        if estado.get("huella"):
+            if estado.get("etag"):
+                encabezados["If-None-Match"] = estado["etag"]
+            if estado.get("last_modified"):
+                encabezados["If-Modified-Since"] = estado["last_modified"]
+
+        with medir("descargar origen"):
+            respuesta = requests.get(origen, headers=encabezados, timeout=60)
+        if respuesta.status_code == 304 and estado.get("huella"):
+            return estado["huella"]
+        respuesta.raise_for_status()
+
+        contenido = respuesta.content
+        estado["etag"] = respuesta.headers.get("ETag")
+        estado["last_modified"] = respuesta.headers.get("Last-Modified")
+    else:
+        # Archivo local: fecha de modificación y tamaño hacen de validador
+        info = Path(origen).stat()
+        firma = (info.st_mtime_ns, info.st_size)
+        if estado.get("firma") == firma and estado.get("huella"):
+            return estado["huella"]
+
+        with medir("leer archivo origen"):
+            contenido = Path(origen).read_bytes()
+        estado["firma"] = firma
+
+    # Sin validadores útiles (p. ej. Google Sheets no envía ETag): comparar el hash del contenido
+    huella = hashlib.sha256(contenido).hexdigest()
+    if huella != estado.get("huella") and not ruta_snapshot(huella).exists():
+        with medir("parsear export y guardar snapshot"):
+            guardar_snapshot(contenido, origen, huella)
+    estado["huella"] = huella
+    return huella
+
+def cargar_snapshot(origen):
+    """Devuelve el export como DataFrame; si su contenido ya se procesó, lee el snapshot Parquet con memory-map"""
+    contenido = leer_contenido_export(origen)
+    huella = hashlib.sha256(contenido).hexdigest()
+
+    df = leer_snapshot(huella)
+    if df is None:
+        df = guardar_snapshot(contenido, origen, huella)
+    return df
@@ -0,0 +1,206 @@
+"""Histórico de cortes: base SQLite de solo inserción con las tablas agregadas de cada export"""
+import hashlib
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from control_presupuestal.calculos import COLUMNAS_VALORES, calcular_totales_corte, normalizar_libro
+from control_presupuestal.dataset import escribir_corte
+from control_presupuestal.fuentes import (
+    RAIZ_PROYECTO, guardar_snapshot, leer_contenido_export, leer_snapshot
+)
+
+# Base SQLite de solo inserción con las tablas ya agregadas de cada corte (un export = un corte)
+RUTA_HISTORICO = RAIZ_PROYECTO / ".historico" / "historico.sqlite"
+
+# Carpeta donde se buscan exports APOTEOSYS fechados para incorporar al histórico
+CARPETA_EXPORTS = Path(os.environ.get("APOTEOSYS_CARPETA_EXPORTS", RAIZ_PROYECTO))
+
+MESES = {
+    "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4, "MAYO": 5, "JUNIO": 6,
+    "JULIO": 7, "AGOSTO": 8, "SEPTIEMBRE": 9, "OCTUBRE": 10, "NOVIEMBRE": 11, "DICIEMBRE": 12
+}
+
+def conectar_historico():
+    """Abre la base del histórico y crea las tablas si no existen"""
+    RUTA_HISTORICO.parent.mkdir(parents=True, exist_ok=True)
+    conexion = sqlite3.connect(RUTA_HISTORICO, timeout=30)
+    conexion.executescript("""
+        CREATE TABLE IF NOT EXISTS cortes (
+            huella TEXT PRIMARY KEY,
+            fecha_corte TEXT NOT NULL,
+            origen TEXT NOT NULL,
+            ingresado TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS totales (
+            huella TEXT NOT NULL REFERENCES cortes (huella),
+            tabla TEXT NOT NULL,
+            fila TEXT NOT NULL,
+            orden INTEGER NOT NULL,
+            columna TEXT NOT NULL,
+            valor REAL NOT NULL,
+            PRIMARY KEY (huella, tabla, fila, columna)
+        );
+    """)
+    return conexion
+
+def detectar_fecha_corte(df, origen):
+    """Fecha de corte de un export: día y mes del nombre ('APOTEOSYS 23 OCTUBRE') y año del encabezado 'Período: Octubre 2025'"""
+    periodo = re.search(r"Per[ií]odo:\s*\w+\s+(\d{4})", str(df.iloc[0, 0]))
+    nombre = Path(str(origen).split("?")[0]).stem.upper()
+    dia_mes = re.search(r"(\d{1,2})\s+(" + "|".join(MESES) + r")", nombre)
+
+    if periodo and dia_mes:
+        return date(int(periodo.group(1)), MESES[dia_mes.group(2)], int(dia_mes.group(1)))
+    # Hoja en línea o nombre sin fecha: el corte es el día en que se incorpora
+    return date.today()
+
+def corte_registrado(huella):
+    """Indica si el contenido con esta huella ya está en el histórico"""
+    with closing(conectar_historico()) as conexion:
+        return conexion.execute("SELECT 1 FROM cortes WHERE huella = ?", (huella,)).fetchone() is not None
+
+def guardar_corte(huella, fecha_corte, origen, tablas):
+    """Agrega un corte y sus tablas al histórico; nunca modifica cortes anteriores"""
+    filas = [
+        (huella, tabla, fila, orden, col, float(valores[col]))
+        for tabla, df in tablas.items()
+        for orden, (fila, valores) in enumerate(df[COLUMNAS_VALORES].iterrows())
+        for col in COLUMNAS_VALORES
+    ]
+    with closing(conectar_historico()) as conexion, conexion:
+        cursor = conexion.execute(
+            "INSERT OR IGNORE INTO cortes (huella, fecha_corte, origen, ingresado) VALUES (?, ?, ?, ?)",
+            (huella, fecha_corte.isoformat(), str(origen), datetime.now().isoformat(timespec="seconds"))
+        )
+        if cursor.rowcount == 0:
+            # Otro proceso lo registró primero
+            return False
+        conexion.executemany(
+            "INSERT INTO totales (huella, tabla, fila, orden, columna, valor) VALUES (?, ?, ?, ?, ?, ?)",
+            filas
+        )
+    return True
+
+def registrar_corte(huella, df, origen, fecha_corte=None):
+    """Agrega al histórico un export ya cargado, si su contenido no estaba registrado"""
+    if corte_registrado(huella):
+        return False
+    if fecha_corte is None:
+        fecha_corte = detectar_fecha_corte(df, origen)
+    libro = normalizar_libro(df)
+    return registrar_libro(huella, libro, calcular_totales_corte(libro), origen, fecha_corte)
+
+def registrar_libro(huella, libro, tablas, origen, fecha_corte):
+    """Agrega al histórico un corte ya normalizado y agregado: sus líneas al dataset y sus tablas a la base"""
+    escribir_corte(libro, fecha_corte, huella)
+    return guardar_corte(huella, fecha_corte, origen, tablas)
+
+def ingerir_export(origen, fecha_corte=None):
+    """Incorpora un export (archivo o URL) al histórico; los contenidos ya registrados no se vuelven a procesar"""
+    contenido = leer_contenido_export(origen)
+    huella = hashlib.sha256(contenido).hexdigest()
+    if corte_registrado(huella):
+        return False
+
+    df = leer_snapshot(huella)
+    if df is None:
+        df = guardar_snapshot(contenido, origen, huella)
+    return registrar_corte(huella, df, origen, fecha_corte)
+
+def buscar_exports(carpeta=None):
+    """Exports APOTEOSYS (.xlsx / .xls) de una carpeta, ordenados por nombre"""
+    carpeta = Path(carpeta or CARPETA_EXPORTS)
+    return sorted(
+        ruta for ruta in carpeta.glob("APOTEOSYS*")
+        if ruta.suffix.lower() in (".xlsx", ".xls")
+    )
+
+def procesar_export(ruta):
+    """Trabajo de cada proceso de la ingesta masiva: parsea el export, guarda su snapshot y sus líneas en el dataset y calcula sus tablas"""
+    contenido = Path(ruta).read_bytes()
+    huella = hashlib.sha256(contenido).hexdigest()
+
+    df = leer_snapshot(huella)
+    if df is None:
+        df = guardar_snapshot(contenido, ruta, huella)
+    fecha_corte = detectar_fecha_corte(df, ruta)
+    libro = normalizar_libro(df)
+    # Cada proceso escribe sus propios archivos (nombrados por huella), sin tocar los de otros cortes
+    escribir_corte(libro, fecha_corte, huella)
+    return huella, fecha_corte, str(ruta), calcular_totales_corte(libro)
+
+def ingerir_exports(rutas, procesos=None):
+    """Incorpora varios exports al histórico parseándolos en paralelo; devuelve (cortes nuevos, errores por archivo)"""
+    # Hashear es barato frente a parsear: los contenidos ya registrados no se envían a los procesos
+    pendientes = [ruta for ruta in rutas if not corte_registrado(hashlib.sha256(Path(ruta).read_bytes()).hexdigest())]
+    nuevos, errores = 0, {}
+    if not pendientes:
+        return nuevos, errores
+
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        futuros = {ejecutor.submit(procesar_export, ruta): ruta for ruta in pendientes}
+        for futuro in as_completed(futuros):
+            try:
+                huella, fecha_corte, origen, tablas = futuro.result()
+            except Exception as e:
+                errores[str(futuros[futuro])] = str(e)
+                continue
+            # Un solo proceso escribe en la base del histórico
+            nuevos += guardar_corte(huella, fecha_corte, origen, tablas)
+    return nuevos, errores
+
+def listar_cortes():
+    """Cortes registrados en el histórico, del más antiguo al más reciente"""
+    with closing(conectar_historico()) as conexion:
+        return pd.read_sql_query(
+            "SELECT huella, fecha_corte, origen, ingresado FROM cortes ORDER BY fecha_corte, ingresado",
+            conexion
+        )
+
+def leer_totales_historico():
+    """Todas las tablas de todos los cortes: una fila por (corte, tabla, fila) con las columnas de valores"""
+    # Una columna por valor, armada en SQLite: no se trae a memoria la forma larga
+    columnas = ", ".join(f"SUM(CASE WHEN t.columna = ? THEN t.valor END) AS \"{col}\"" for col in COLUMNAS_VALORES)
+    with closing(conectar_historico()) as conexion:
+        return pd.read_sql_query(
+            f"""
+            SELECT c.fecha_corte, c.origen, t.tabla, t.fila, {columnas}
+            FROM totales t JOIN cortes c ON c.huella = t.huella
+            GROUP BY t.huella, t.tabla, t.orden, t.fila
+            ORDER BY c.fecha_corte, c.ingresado, t.tabla, t.orden
+            """,
+            conexion,
+            params=COLUMNAS_VALORES
+        )
+
+def leer_tabla_corte(huella, tabla):
+    """Tabla agregada de un corte (filas en su orden original, columnas de valores)"""
+    with closing(conectar_historico()) as conexion:
+        largo = pd.read_sql_query(
+            "SELECT fila, orden, columna, valor FROM totales WHERE huella = ? AND tabla = ?",
+            conexion,
+            params=(huella, tabla)
+        )
+    if largo.empty:
+        return None
+    ancho = largo.pivot_table(index=["orden", "fila"], columns="columna", values="valor", aggfunc="sum")
+    return ancho.droplevel("orden").reindex(columns=COLUMNAS_VALORES)
+
+def reconstruir_dataset():
+    """Vuelve a escribir en el dataset las líneas de cada corte del histórico a partir de su snapshot; devuelve (escritos, sin snapshot)"""
+    escritos, sin_snapshot = 0, []
+    for corte in listar_cortes().itertuples(index=False):
+        df = leer_snapshot(corte.huella)
+        if df is None:
+            sin_snapshot.append(corte.origen)
+            continue
+        escribir_corte(normalizar_libro(df), date.fromisoformat(corte.fecha_corte), corte.huella)
+        escritos += 1
+    return escritos, sin_snapshot
@@ -0,0 +1,233 @@
+"""Libros de nómina por mes (RP_PROYECCION/<n>_<MES>/TOTAL) y proyección de RECURSOS PROPIOS a diciembre"""
+import hashlib
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from control_presupuestal.calculos import CONCEPTOS_RECURSOS_PROPIOS, GRUPOS_RECURSOS_PROPIOS
+from control_presupuestal.fuentes import RAIZ_PROYECTO, escribir_snapshot, leer_snapshot, ruta_snapshot
+from control_presupuestal.historico import MESES
+
+# Carpetas donde se buscan los meses de proyección (1_ENERO/TOTAL, 2_FEBRERO/TOTAL, ...): las de
+# RP_PROYECCION_CARPETAS (separadas por os.pathsep) o, sin ella, la del proyecto y en Windows la de OneDrive
+if "RP_PROYECCION_CARPETAS" in os.environ:
+    CARPETAS_PROYECCION = [Path(carpeta) for carpeta in os.environ["RP_PROYECCION_CARPETAS"].split(os.pathsep) if carpeta]
+else:
+    CARPETAS_PROYECCION = [RAIZ_PROYECTO / "RP_PROYECCION"]
+    if os.name == "nt":
+        CARPETAS_PROYECCION.insert(0, Path(r"C:\Users\jrubr\OneDrive\Desktop\Sec Educación Bog\App Streamlit\RP_PROYECCION"))
+
+# Archivos de cada mes: nómina de sueldos (I) y de aportes (A)
+ARCHIVOS_PROYECCION = {
+    "SUELDOS": "Nomina_Consolidada_Presupuestal(*,I,).xls*",
+    "APORTES": "Nomina_Consolidada_Presupuestal(*,A,).xls*"
+}
+
+def buscar_meses_proyeccion(carpetas=None):
+    """Carpetas TOTAL de cada mes de proyección, en orden de mes: {'1_ENERO': Path(.../1_ENERO/TOTAL), ...}"""
+    meses = {}
+    for carpeta in carpetas or CARPETAS_PROYECCION:
+        if not carpeta.is_dir():
+            continue
+        for subcarpeta in carpeta.iterdir():
+            coincidencia = re.fullmatch(r"(\d{1,2})_(" + "|".join(MESES) + r")", subcarpeta.name.upper())
+            if coincidencia and (subcarpeta / "TOTAL").is_dir():
+                # Si el mes está en varias carpetas gana la primera configurada
+                meses.setdefault(subcarpeta.name.upper(), (int(coincidencia.group(1)), subcarpeta / "TOTAL"))
+    return {mes: ruta for mes, (_, ruta) in sorted(meses.items(), key=lambda item: item[1][0])}
+
+def tipar_proyeccion(df):
+    """Columnas de texto que solo traen números pasan a numéricas; el resto se guarda como texto"""
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == object:
+            numeros = pd.to_numeric(df[col], errors="coerce")
+            if numeros.notna().sum() == df[col].notna().sum():
+                df[col] = numeros
+            else:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def huella_libro_proyeccion(ruta, firma):
+    """Huella del snapshot de un libro de proyección: ruta, mtime y tamaño"""
+    return hashlib.sha256(f"{Path(ruta).resolve()}|{firma[0]}|{firma[1]}".encode()).hexdigest()
+
+def leer_libro_proyeccion(ruta, firma):
+    """Libro de proyección tipado, desde su snapshot Parquet si la firma (mtime, tamaño) no cambió"""
+    # El snapshot evita volver a parsear el .xls después de reiniciar la app
+    huella = huella_libro_proyeccion(ruta, firma)
+    df = leer_snapshot(huella)
+    if df is not None:
+        return df
+
+    df = tipar_proyeccion(pd.read_excel(ruta))
+    escribir_snapshot(df, huella)
+    return df
+
+def sin_snapshot(archivos):
+    """Archivos (ruta, mtime, tamaño) cuyo libro todavía no tiene snapshot: son los que hay que parsear"""
+    return [
+        (ruta, mtime, tamano) for ruta, mtime, tamano in archivos
+        if not ruta_snapshot(huella_libro_proyeccion(ruta, (mtime, tamano))).exists()
+    ]
+
+def guardar_libro_proyeccion(archivo):
+    """Trabajo de cada proceso: parsea un libro de proyección y deja su snapshot"""
+    ruta, mtime, tamano = archivo
+    leer_libro_proyeccion(ruta, (mtime, tamano))
+
+def preparar_libros_proyeccion(archivos):
+    """Parsea en procesos aparte los libros sin snapshot; leer un .xls es Python puro y con hilos no corre en paralelo"""
+    pendientes = sin_snapshot(archivos)
+    if len(pendientes) > 1:
+        with ProcessPoolExecutor(max_workers=len(pendientes)) as ejecutor:
+            list(ejecutor.map(guardar_libro_proyeccion, pendientes))
+
+def rutas_proyeccion(carpeta_mes):
+    """Libros de sueldos y aportes de un mes; {'SUELDOS': ruta, 'APORTES': ruta}"""
+    rutas = {}
+    for tipo, patron in ARCHIVOS_PROYECCION.items():
+        encontrados = sorted(Path(carpeta_mes).glob(patron))
+        if not encontrados:
+            raise FileNotFoundError(f"No hay archivo de {tipo.lower()} en '{carpeta_mes}'")
+        rutas[tipo] = encontrados[-1]
+    return rutas
+
+def firma_mes_proyeccion(carpeta_mes):
+    """(ruta, mtime, tamaño) de los libros de un mes: cambia si alguno cambia en disco"""
+    return tuple(
+        (str(ruta), ruta.stat().st_mtime_ns, ruta.stat().st_size)
+        for ruta in rutas_proyeccion(carpeta_mes).values()
+    )
+
+def reducir_archivo_nomina(archivo):
+    """Trabajo de cada proceso: lee un libro de nómina (o su snapshot) y lo reduce a su vector de totales"""
+    ruta, mtime, tamano = archivo
+    # Cada libro se reduce apenas se lee: al proceso principal solo vuelve su vector de totales
+    return reducir_libro_nomina(leer_libro_proyeccion(ruta, (mtime, tamano)))
+
+def reducir_mes_nomina(firma):
+    """Gasto de un mes por concepto (sueldos + aportes) a partir de la firma de sus libros"""
+    # Con todos los snapshots listos la lectura es rápida y no vale la pena arrancar procesos
+    if len(sin_snapshot(firma)) < 2:
+        return sum(map(reducir_archivo_nomina, firma))
+    with ProcessPoolExecutor(max_workers=len(firma)) as ejecutor:
+        return sum(ejecutor.map(reducir_archivo_nomina, firma))
+
+# =============================================================================
+# MOTOR DE PROYECCIÓN DE RECURSOS PROPIOS
+# =============================================================================
+# Nombres con los que se reconocen las columnas de concepto y valor en los libros de nómina (sin tildes ni mayúsculas).
+# No hay un libro Nomina_Consolidada_Presupuestal de muestra en el repositorio: si el real usa otros nombres,
+# RP_NOMINA_COLUMNA_CONCEPTO y RP_NOMINA_COLUMNA_VALOR los fijan sin tocar el código.
+COLUMNAS_CONCEPTO_NOMINA = [
+    os.environ.get("RP_NOMINA_COLUMNA_CONCEPTO", ""),
+    "CONCEPTO DE GASTO", "CONCEPTO PRESUPUESTAL", "CONCEPTO", "RUBRO PRESUPUESTAL", "RUBRO", "DESCRIPCION"
+]
+COLUMNAS_VALOR_NOMINA = [
+    os.environ.get("RP_NOMINA_COLUMNA_VALOR", ""),
+    "VALOR", "VALOR TOTAL", "TOTAL", "DEVENGADO", "NETO"
+]
+
+# Filas que se revisan buscando el encabezado cuando el libro trae títulos antes de la tabla
+FILAS_BUSCAR_ENCABEZADO = 20
+
+# Columnas de la tabla de proyección
+COLUMNAS_PROYECCION = ["PROMEDIO MENSUAL", "PROYECCIÓN A DICIEMBRE", "SALDO DE APROPIACION", "DIFERENCIA"]
+
+def normalizar_nombre(texto):
+    """Nombre de columna sin tildes, sin espacios sobrantes y en mayúsculas"""
+    sin_tildes = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return " ".join(sin_tildes.split()).upper()
+
+def buscar_columnas_nomina(columnas, candidatas):
+    """Posiciones de las columnas cuyo nombre normalizado está entre las candidatas, en el orden de las candidatas"""
+    normalizadas = [normalizar_nombre(col) for col in columnas]
+    return [
+        posicion
+        for candidata in dict.fromkeys(normalizar_nombre(candidata) for candidata in candidatas if candidata)
+        for posicion, nombre in enumerate(normalizadas) if nombre == candidata
+    ]
+
+def columnas_nomina(df):
+    """(tabla, posiciones de columnas de concepto, posición de la de valor); el encabezado puede no ser la primera fila"""
+    conceptos = buscar_columnas_nomina(df.columns, COLUMNAS_CONCEPTO_NOMINA)
+    valores = buscar_columnas_nomina(df.columns, COLUMNAS_VALOR_NOMINA)
+    if conceptos and valores:
+        return df, conceptos, valores[0]
+
+    # Libros con título, fecha o filtros encima de la tabla: la fila que nombra ambas columnas es el encabezado
+    for fila in range(min(FILAS_BUSCAR_ENCABEZADO, len(df))):
+        encabezado = df.iloc[fila].tolist()
+        conceptos = buscar_columnas_nomina(encabezado, COLUMNAS_CONCEPTO_NOMINA)
+        valores = buscar_columnas_nomina(encabezado, COLUMNAS_VALOR_NOMINA)
+        if conceptos and valores:
+            return df.iloc[fila + 1:], conceptos, valores[0]
+
+    raise ValueError(
+        "El libro de nómina no tiene columnas de concepto y valor reconocibles "
+        f"(columnas: {', '.join(str(col) for col in df.columns)}); "
+        "fija sus nombres con RP_NOMINA_COLUMNA_CONCEPTO y RP_NOMINA_COLUMNA_VALOR"
+    )
+
+def posiciones_concepto(conceptos):
+    """Posición de cada línea de nómina en CONCEPTOS_RECURSOS_PROPIOS, por código (O231...), nombre o descripción; -1 si no aplica"""
+    # Mismo criterio que los nombres de columna: sin tildes, espacios repetidos ni mayúsculas
+    texto = (
+        conceptos.astype(str).str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.split().str.join(" ").str.upper()
+    )
+    por_codigo = {concepto.split()[0]: i for i, concepto in enumerate(CONCEPTOS_RECURSOS_PROPIOS.values())}
+    por_nombre = {normalizar_nombre(nombre): i for i, nombre in enumerate(CONCEPTOS_RECURSOS_PROPIOS)}
+    # Descripción de APOTEOSYS sin el código: 'Sueldo básico', 'Aportes al ICBF', ...
+    por_nombre.update({
+        normalizar_nombre(concepto.split(maxsplit=1)[1]): i for i, concepto in enumerate(CONCEPTOS_RECURSOS_PROPIOS.values())
+    })
+
+    posiciones = texto.str.extract(r"^(O\d+)", expand=False).map(por_codigo)
+    posiciones = posiciones.fillna(texto.map(por_nombre))
+    return posiciones.fillna(-1).to_numpy(dtype=np.int64)
+
+def reducir_libro_nomina(df):
+    """Gasto de un libro de nómina por concepto (vector en el orden de CONCEPTOS_RECURSOS_PROPIOS)"""
+    tabla, conceptos, valor = columnas_nomina(df)
+    # Con varias columnas candidatas (p. ej. RUBRO y DESCRIPCIÓN) se usa la que reconoce más líneas
+    posiciones = max(
+        (posiciones_concepto(tabla.iloc[:, columna]) for columna in conceptos),
+        key=lambda posiciones: (posiciones >= 0).sum()
+    )
+    valores = pd.to_numeric(tabla.iloc[:, valor], errors="coerce")
+    valores = valores.fillna(0).to_numpy(dtype=float)
+    validas = posiciones >= 0
+    return np.bincount(posiciones[validas], weights=valores[validas], minlength=len(CONCEPTOS_RECURSOS_PROPIOS))
+
+def proyectar_recursos_propios(matriz, ultimo_mes, saldos, incremento=0.0, mes_incremento=1):
+    """Proyecta el gasto mensual de cada concepto hasta diciembre y lo compara con el saldo de apropiación"""
+    promedio = matriz.mean(axis=1)
+
+    # Meses por pagar después del último ejecutado; el incremento aplica desde mes_incremento
+    meses_futuros = np.arange(ultimo_mes + 1, 13)
+    factores = np.where(meses_futuros >= mes_incremento, 1 + incremento, 1.0)
+    proyectado = (promedio[:, np.newaxis] * factores[np.newaxis, :]).sum(axis=1)
+
+    conceptos = pd.DataFrame(
+        {"PROMEDIO MENSUAL": promedio, "PROYECCIÓN A DICIEMBRE": proyectado, "SALDO DE APROPIACION": saldos},
+        index=list(CONCEPTOS_RECURSOS_PROPIOS)
+    )
+
+    # Conceptos y subtotales en el orden de la pantalla RECURSOS PROPIOS
+    filas = {}
+    for total, grupo in GRUPOS_RECURSOS_PROPIOS.items():
+        for concepto in grupo:
+            filas[concepto] = conceptos.loc[concepto]
+        filas[total] = conceptos.loc[grupo].sum()
+    filas["DOC REC PROPIOS"] = sum(filas[total] for total in GRUPOS_RECURSOS_PROPIOS)
+
+    tabla = pd.DataFrame(filas).T
+    tabla["DIFERENCIA"] = tabla["SALDO DE APROPIACION"] - tabla["PROYECCIÓN A DICIEMBRE"]
+    return tabla[COLUMNAS_PROYECCION]
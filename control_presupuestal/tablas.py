@@ -0,0 +1,174 @@
+"""Tablas HTML del tablero: plantilla, estilos por tipo de fila y renderizado vectorizado"""
+import numpy as np
+import pandas as pd
+
+from control_presupuestal.calculos import COLUMNAS_VALORES
+
+PLANTILLA_TABLA = """
+    <div class="{clase_contenedor}">
+        <table class="{clase_tabla}">
+            <thead>
+                <tr>{encabezados}</tr>
+            </thead>
+            <tbody>{filas}</tbody>
+        </table>
+    </div>
+"""
+
+# Estilos de cada tipo de fila del resumen SGP: clase de la fila, de las etiquetas y de los números
+ESTILOS_FILA_SGP = {
+    "bolsillo": {"fila": "", "etiqueta": "encabezado-fila", "numero": "numero"},
+    "total": {"fila": "fila-total", "etiqueta": "encabezado-fila", "numero": "numero"},
+    "total_final": {"fila": "fila-total-final", "etiqueta": "encabezado-fila", "numero": "numero"},
+    "total_general": {"fila": "fila-total-general", "etiqueta": "encabezado-fila", "numero": "numero"}
+}
+
+# Tipo de fila de los totales del resumen SGP; las demás filas son bolsillos numerados
+TIPOS_FILA_SGP = {
+    "TOTAL SGP DOCENTES": "total",
+    "TOTAL SGP P8033": "total_final",
+    "TOTAL RECURSOS PROPIOS P8033": "total",
+    "TOTAL SGP+RP P8033": "total_general"
+}
+
+# Estilos de cada tipo de fila de las tablas de RECURSOS PROPIOS
+ESTILOS_FILA_RECURSOS_PROPIOS = {
+    "concepto": {"fila": "", "etiqueta": "concepto-header", "numero": "numero-tabla"},
+    "total_nomina": {
+        "fila": "fila-total-nomina",
+        "etiqueta": "concepto-total-nomina concepto-header",
+        "numero": "celda-total-nomina numero-tabla"
+    },
+    "total_parafiscales": {
+        "fila": "fila-total-parafiscales",
+        "etiqueta": "concepto-total-parafiscales concepto-header",
+        "numero": "celda-total-parafiscales numero-tabla"
+    },
+    "total_fomag": {
+        "fila": "fila-total-fomag",
+        "etiqueta": "concepto-total-fomag concepto-header",
+        "numero": "celda-total-fomag numero-tabla"
+    },
+    "total_general": {
+        "fila": "fila-total-general",
+        "etiqueta": "concepto-total-general concepto-header",
+        "numero": "celda-total-general numero-tabla"
+    }
+}
+
+# Tipo de fila de los subtotales de RECURSOS PROPIOS (el total final depende de la sección)
+TIPOS_FILA_RECURSOS_PROPIOS = {
+    "SUELDOS": "total_nomina",
+    "TOTAL PARAFISCALES": "total_parafiscales",
+    "TOTAL FOMAG": "total_fomag"
+}
+
+def formatear_pesos(valores):
+    """Formatea una columna completa como pesos colombianos ($1.234.567) sin recorrer celda por celda"""
+    enteros = np.rint(pd.to_numeric(valores, errors="coerce").fillna(0).to_numpy(dtype=float)).astype(np.int64)
+    # Separador de miles con punto: se inserta antes de cada grupo de tres dígitos
+    texto = pd.Series(enteros, index=valores.index).astype(str).str.replace(r"\B(?=(\d{3})+(?!\d))", ".", regex=True)
+    return "$" + texto
+
+def construir_tabla_html(tabla, columnas_etiqueta, estilos, encabezados, clase_contenedor, clase_tabla,
+                         columnas_valores=COLUMNAS_VALORES):
+    """Arma el HTML de una tabla con columnas de etiqueta, columnas de valores y TIPO_FILA, fila por fila con join"""
+    clases = {parte: tabla["TIPO_FILA"].map({tipo: estilo[parte] for tipo, estilo in estilos.items()})
+              for parte in ("fila", "etiqueta", "numero")}
+
+    # Cada celda se arma para la columna completa y luego se concatenan las columnas
+    celdas = [
+        '<td class="' + clases["etiqueta"] + '">' + tabla[col].astype(str) + '</td>'
+        for col in columnas_etiqueta
+    ] + [
+        '<td class="' + clases["numero"] + '">' + formatear_pesos(tabla[col]) + '</td>'
+        for col in columnas_valores
+    ]
+    filas = '<tr class="' + clases["fila"] + '">' + sum(celdas[1:], celdas[0]) + '</tr>'
+
+    html_encabezados = "".join(
+        f'<th class="{clase}">{texto}</th>' if clase else f"<th>{texto}</th>"
+        for texto, clase in encabezados
+    )
+    return PLANTILLA_TABLA.format(
+        clase_contenedor=clase_contenedor,
+        clase_tabla=clase_tabla,
+        encabezados=html_encabezados,
+        filas="".join(filas)
+    )
+
+def renderizar_tabla_sgp(resumen):
+    """Arma el HTML de la tabla resumen SGP"""
+    # Tipo de cada fila y numeración consecutiva de los bolsillos (los totales no llevan número)
+    tipos = resumen.index.map(lambda fila: TIPOS_FILA_SGP.get(fila, "bolsillo"))
+    es_bolsillo = np.asarray(tipos == "bolsillo")
+    tabla = resumen.assign(
+        BOLSILLOS=np.where(es_bolsillo, np.cumsum(es_bolsillo).astype(str), ""),
+        CONCEPTO=resumen.index,
+        TIPO_FILA=tipos
+    )
+
+    return construir_tabla_html(
+        tabla,
+        ["BOLSILLOS", "CONCEPTO"],
+        ESTILOS_FILA_SGP,
+        [("BOLSILLOS", ""), ("CONCEPTO", "")] + [(col, "") for col in COLUMNAS_VALORES],
+        "tabla-container",
+        "tabla-personalizada"
+    )
+
+def renderizar_tabla_recursos_propios(datos, seccion_titulo, mostrar_detalles):
+    """Arma el HTML de una tabla de RECURSOS PROPIOS, con o sin los conceptos desglosados"""
+    # Crear DataFrame con todas las filas
+    df_recursos = pd.DataFrame.from_dict(datos, orient="index")
+    
+    # Definir el orden de las filas
+    conceptos_nomina = [
+        "SUELDO BASICO", "HORAS EXTRAS", "SUBSIDIO DE ALIMENTACIÓN", 
+        "AUXILIO DE TRANSPORTE", "PRIMA DE SERVICIOS", "PRIMA DE VACACIONES", 
+        "PRIMA DE NAVIDAD", "SUELDOS"
+    ]
+    
+    conceptos_parafiscales = [
+        "COMPENSAR", "ICBF", "SENA", "ESAP", "ESCUELAS TÉCNICAS", "TOTAL PARAFISCALES"
+    ]
+    
+    conceptos_fomag = [
+        "SALUD", "PENSIÓN", "CESANTÍAS", "TOTAL FOMAG"
+    ]
+    
+    # Determinar el nombre del total final basado en la sección
+    if "TOTAL" in seccion_titulo:
+        total_final = "DOC REC PROPIOS"
+    elif "PRIMERA INFANCIA" in seccion_titulo:
+        total_final = "PRIMERA INFANCIA REC PROPIOS"
+    elif "ORIENTADORES" in seccion_titulo:
+        total_final = "ORIENTADORES REC PROPIOS"
+    elif "GLOBAL" in seccion_titulo:
+        total_final = "GLOBAL REC PROPIOS"
+    else:
+        total_final = "DOC REC PROPIOS"
+    
+    # Determinar qué conceptos mostrar
+    if mostrar_detalles:
+        conceptos_ordenados = conceptos_nomina + conceptos_parafiscales + conceptos_fomag + [total_final]
+    else:
+        # Solo mostrar los totales
+        conceptos_ordenados = ["SUELDOS", "TOTAL PARAFISCALES", "TOTAL FOMAG", total_final]
+    
+    # Solo los conceptos que existen en los datos, con el tipo de fila que define su estilo
+    conceptos_ordenados = [concepto for concepto in conceptos_ordenados if concepto in df_recursos.index]
+    tipos_fila = {**TIPOS_FILA_RECURSOS_PROPIOS, total_final: "total_general"}
+    tabla = df_recursos.loc[conceptos_ordenados].assign(
+        CONCEPTO=conceptos_ordenados,
+        TIPO_FILA=[tipos_fila.get(concepto, "concepto") for concepto in conceptos_ordenados]
+    )
+
+    return construir_tabla_html(
+        tabla,
+        ["CONCEPTO"],
+        ESTILOS_FILA_RECURSOS_PROPIOS,
+        [("CONCEPTO", "concepto-header")] + [(col, "") for col in COLUMNAS_VALORES],
+        "tabla-recursos-container",
+        "tabla-recursos"
+    )
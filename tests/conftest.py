@@ -0,0 +1,44 @@
+"""Datos y carpetas compartidos por las pruebas: exports sintéticos y carpetas temporales para snapshots e histórico"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from control_presupuestal import dataset, fuentes, historico
+from control_presupuestal.benchmark import exportar_apoteosys, generar_apoteosys
+
+@pytest.fixture
+def carpetas_temporales(tmp_path, monkeypatch):
+    """Snapshots, histórico y dataset en una carpeta temporal, sin tocar los del proyecto"""
+    monkeypatch.setattr(fuentes, "CARPETA_SNAPSHOTS", tmp_path / ".snapshots")
+    monkeypatch.setattr(historico, "RUTA_HISTORICO", tmp_path / ".historico" / "historico.sqlite")
+    monkeypatch.setattr(dataset, "CARPETA_DATASET", tmp_path / ".dataset")
+    return tmp_path
+
+@pytest.fixture
+def export_sintetico():
+    """Export APOTEOSYS sintético de unas mil filas, como DataFrame"""
+    return generar_apoteosys(1_000, semilla=7)
+
+@pytest.fixture
+def contenido_csv(export_sintetico):
+    """Bytes CSV del export sintético"""
+    return exportar_apoteosys(export_sintetico, "csv")
+
+@pytest.fixture
+def mes_nomina(tmp_path):
+    """Carpeta TOTAL de un mes con un libro de sueldos (I) y uno de aportes (A) de nómina"""
+    carpeta = tmp_path / "RP_PROYECCION" / "1_ENERO" / "TOTAL"
+    carpeta.mkdir(parents=True)
+    pd.DataFrame({
+        "CONCEPTO": ["O231010100101 Sueldo básico", "O231010100101 Sueldo básico", "PRIMA DE SERVICIOS", "Embargos"],
+        "VALOR": [1_000_000, 2_500_000, 400_000, 99_999]
+    }).to_excel(carpeta / "Nomina_Consolidada_Presupuestal(5,15,2025011,1201,2,I,).xlsx", index=False)
+    pd.DataFrame({
+        "CONCEPTO": ["O2310102006 Aportes al ICBF", "SALUD"],
+        "VALOR": [150_000, 300_000]
+    }).to_excel(carpeta / "Nomina_Consolidada_Presupuestal(5,15,2025011,1201,2,A,).xlsx", index=False)
+    return carpeta
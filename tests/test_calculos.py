@@ -0,0 +1,72 @@
+"""Pruebas de los agregados: diferencias entre exports y detalle de las filas frente al recálculo completo"""
+import pandas as pd
+
+from control_presupuestal.calculos import (
+    BOLSILLOS_SGP, COLUMNAS_VALORES, CONCEPTOS_RECURSOS_PROPIOS, FUENTE_RECURSOS_PROPIOS, SECCIONES_RECURSOS_PROPIOS,
+    agrupar_cubo_conceptos, aplicar_deltas, bolsillos_cambiados, calcular_resumen_sgp, diferencias_libros, filas_cambiadas,
+    indexar_detalle, indexar_libro, lineas_detalle, mismas_filas, normalizar_libro, resumir_recursos_propios
+)
+
+def export_modificado(df):
+    """Copia del export con valores cambiados en líneas de un bolsillo SGP y de RECURSOS PROPIOS"""
+    modificado = df.copy()
+    # Líneas del primer bolsillo SGP: su fuente bajo uno de sus conceptos (el concepto viene de la fila de código)
+    bolsillo = BOLSILLOS_SGP[0]
+    conceptos = modificado["Concepto de gasto"].ffill()
+    fuentes = modificado.index[modificado["Nombre"].eq(bolsillo["fuente"]) & conceptos.isin(bolsillo["conceptos"])]
+    modificado.loc[fuentes[3], "GIROS ACUMULADOS"] += 1_000_000
+    modificado.loc[fuentes[7], "DISPONIBLE"] -= 250_000
+    propios = modificado.index[
+        modificado["Nombre"].eq(FUENTE_RECURSOS_PROPIOS) & conceptos.isin(CONCEPTOS_RECURSOS_PROPIOS.values())
+    ]
+    modificado.loc[propios[5], "RP EMITIDOS"] += 75_000
+    return modificado
+
+def test_deltas_igual_a_recalculo_completo(export_sintetico):
+    anterior = normalizar_libro(export_sintetico)
+    nuevo = normalizar_libro(export_modificado(export_sintetico))
+
+    assert mismas_filas(anterior, nuevo)
+    posiciones = filas_cambiadas(anterior, nuevo)
+    assert len(posiciones) == 3
+    resumen, cubo = aplicar_deltas(
+        calcular_resumen_sgp(anterior), agrupar_cubo_conceptos(anterior), diferencias_libros(anterior, nuevo, posiciones)
+    )
+
+    completo = calcular_resumen_sgp(nuevo)
+    pd.testing.assert_frame_equal(resumen, completo)
+    assert BOLSILLOS_SGP[0]["bolsillo"] in bolsillos_cambiados(calcular_resumen_sgp(anterior), completo)
+    cubo_completo = agrupar_cubo_conceptos(nuevo)
+    for _, rango, total_final in SECCIONES_RECURSOS_PROPIOS:
+        assert resumir_recursos_propios(cubo, rango, total_final) == resumir_recursos_propios(cubo_completo, rango, total_final)
+
+def test_filas_insertadas_o_eliminadas_no_son_las_mismas(export_sintetico):
+    anterior = normalizar_libro(export_sintetico)
+    sin_fila = normalizar_libro(export_sintetico.drop(index=export_sintetico.index[10]))
+    # Misma cantidad de filas pero una fuente distinta en una línea
+    otra_fuente = export_sintetico.copy()
+    otra_fuente.loc[2, "Nombre"] = "SGP PRESTACION DEL.SERVICIO SSF"
+    assert not mismas_filas(anterior, sin_fila)
+    assert not mismas_filas(anterior, normalizar_libro(otra_fuente))
+
+def test_lineas_de_cada_fila_suman_la_celda(export_sintetico):
+    libro = normalizar_libro(export_sintetico)
+    detalle = indexar_detalle(libro, indexar_libro(libro))
+
+    resumen = calcular_resumen_sgp(libro)
+    assert resumen.to_numpy().any()
+    for fila in resumen.index:
+        sumas = lineas_detalle(libro, detalle[("SGP", fila)])[COLUMNAS_VALORES].sum()
+        assert sumas.tolist() == resumen.loc[fila, COLUMNAS_VALORES].tolist(), fila
+
+    cubo = agrupar_cubo_conceptos(libro)
+    secciones = 0
+    for seccion, rango, total_final in SECCIONES_RECURSOS_PROPIOS:
+        tabla = resumir_recursos_propios(cubo, rango, total_final)
+        if tabla is None:
+            continue
+        secciones += 1
+        for fila, valores in tabla.items():
+            sumas = lineas_detalle(libro, detalle[(seccion, fila)])[COLUMNAS_VALORES].sum()
+            assert sumas.tolist() == [valores[col] for col in COLUMNAS_VALORES], (seccion, fila)
+    assert secciones > 0
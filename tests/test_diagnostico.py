@@ -0,0 +1,21 @@
+"""Pruebas de las mediciones por etapa"""
+import tracemalloc
+
+from control_presupuestal.diagnostico import medir, mediciones, reiniciar
+
+def test_etapa_interna_no_borra_el_pico_de_la_externa():
+    reiniciar()
+    tracemalloc.start()
+    try:
+        with medir("externa"):
+            grande = bytearray(20_000_000)
+            del grande
+            with medir("interna"):
+                chico = bytearray(1_000_000)
+                del chico
+    finally:
+        tracemalloc.stop()
+
+    picos = {medicion["etapa"]: medicion["pico_kb"] for medicion in mediciones()}
+    assert picos["interna"] < 5_000
+    assert picos["externa"] > 19_000
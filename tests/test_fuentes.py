@@ -0,0 +1,67 @@
+"""Pruebas de la lectura de exports CSV y Excel"""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from control_presupuestal.benchmark import exportar_apoteosys
+from control_presupuestal.calculos import agregar_por_bloques, calcular_totales_corte, normalizar_libro, tablas_corte
+from control_presupuestal import fuentes
+from control_presupuestal.fuentes import escribir_snapshot, leer_csv_por_bloques, leer_snapshot, parsear_export, ruta_snapshot
+
+def test_paquete_con_opciones_de_pandas_por_defecto():
+    # Solo app.py activa copy-on-write; ninguna prueba debe importarla al recolectarse
+    assert pd.get_option("mode.copy_on_write") is False
+
+def agregar_columnas(contenido, encabezado, valor):
+    """Agrega al final de cada línea del CSV las columnas dadas (en el encabezado) o el valor (en las filas)"""
+    lineas = contenido.decode("utf-8").splitlines()
+    lineas = [lineas[0] + encabezado] + [linea + valor for linea in lineas[1:]]
+    return "\n".join(lineas).encode("utf-8")
+
+def test_encabezado_con_columnas_vacias(contenido_csv):
+    esperado = parsear_export(contenido_csv, "export.csv")
+    obtenido = parsear_export(agregar_columnas(contenido_csv, ",,", ",,"), "export.csv")
+    pd.testing.assert_frame_equal(obtenido, esperado)
+
+def test_encabezado_con_columnas_repetidas(contenido_csv):
+    # Se toma la primera columna de cada nombre, como pandas con las repetidas ("DISPONIBLE.1")
+    esperado = parsear_export(contenido_csv, "export.csv")
+    obtenido = parsear_export(agregar_columnas(contenido_csv, ",DISPONIBLE,Nombre", ",1,x"), "export.csv")
+    pd.testing.assert_frame_equal(obtenido, esperado)
+
+def test_csv_y_excel_guardan_las_mismas_columnas(export_sintetico, contenido_csv):
+    desde_csv = parsear_export(contenido_csv, "export.csv")
+    desde_excel = parsear_export(exportar_apoteosys(export_sintetico, "xlsx"), "export.xlsx")
+    assert list(desde_excel.columns) == list(desde_csv.columns)
+
+@pytest.mark.parametrize("filas", [3, 998])
+def test_lectura_por_bloques_igual_a_lectura_completa(contenido_csv, filas):
+    # Cada código del export sintético ocupa cuatro filas: con estos tamaños hay bloques que empiezan en una
+    # fila de fuente, cuyo código y concepto vienen del bloque anterior
+    esperado = calcular_totales_corte(normalizar_libro(pd.read_csv(io.BytesIO(contenido_csv))))
+    obtenido = tablas_corte(*agregar_por_bloques(leer_csv_por_bloques(io.BytesIO(contenido_csv), filas)))
+    assert sorted(obtenido) == sorted(esperado)
+    for tabla in esperado:
+        pd.testing.assert_frame_equal(obtenido[tabla], esperado[tabla])
+
+def test_parsear_export_igual_a_lectura_completa(contenido_csv):
+    esperado = calcular_totales_corte(normalizar_libro(pd.read_csv(io.BytesIO(contenido_csv))))
+    obtenido = calcular_totales_corte(normalizar_libro(parsear_export(contenido_csv, "export.csv")))
+    for tabla in esperado:
+        pd.testing.assert_frame_equal(obtenido[tabla], esperado[tabla])
+
+def test_guardar_snapshot_poda_los_viejos(carpetas_temporales, monkeypatch):
+    monkeypatch.setattr(fuentes, "MAXIMO_SNAPSHOTS", 2)
+    df = pd.DataFrame({"DISPONIBLE": [1, 2]})
+    otra_version = fuentes.CARPETA_SNAPSHOTS / "viejo.v1.parquet"
+    for huella, antiguedad in (("a", 200), ("b", 100)):
+        escribir_snapshot(df, huella)
+        os.utime(ruta_snapshot(huella), ns=(0, ruta_snapshot(huella).stat().st_mtime_ns - antiguedad * 10**9))
+    df.to_parquet(otra_version)
+
+    # Leer "a" lo marca como usado: el que sobra es "b"
+    leer_snapshot("a")
+    escribir_snapshot(df, "c")
+    assert sorted(ruta.name for ruta in fuentes.CARPETA_SNAPSHOTS.iterdir()) == [ruta_snapshot(huella).name for huella in "ac"]
@@ -0,0 +1,72 @@
+"""Pruebas de la revisión del origen de datos contra un servidor HTTP local"""
+import functools
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from control_presupuestal import fuentes
+
+@pytest.fixture
+def servidor_http(tmp_path):
+    """Sirve tmp_path por HTTP y anota el código de cada respuesta; entrega (url base, códigos)"""
+    codigos = []
+
+    class Manejador(SimpleHTTPRequestHandler):
+        def log_request(self, code="-", size="-"):
+            codigos.append(int(code))
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Manejador, directory=str(tmp_path)))
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_port}", codigos
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+@pytest.fixture
+def parseos(monkeypatch):
+    """Cuenta las veces que revisar_origen parsea un export"""
+    llamadas = []
+    original = fuentes.guardar_snapshot
+
+    def contar(contenido, origen, huella):
+        llamadas.append(huella)
+        return original(contenido, origen, huella)
+
+    monkeypatch.setattr(fuentes, "guardar_snapshot", contar)
+    return llamadas
+
+def test_origen_sin_cambios_no_se_descarga_ni_parsea(carpetas_temporales, servidor_http, parseos, contenido_csv):
+    base, codigos = servidor_http
+    (carpetas_temporales / "export.csv").write_bytes(contenido_csv)
+    origen = f"{base}/export.csv"
+
+    estado = {}
+    primera = fuentes.revisar_origen(origen, estado)
+    segunda = fuentes.revisar_origen(origen, estado)
+
+    assert segunda == primera
+    assert codigos == [200, 304]
+    assert parseos == [primera]
+
+def test_origen_cambiado_se_parsea_una_vez(carpetas_temporales, servidor_http, parseos, contenido_csv):
+    base, codigos = servidor_http
+    archivo = carpetas_temporales / "export.csv"
+    archivo.write_bytes(contenido_csv)
+    origen = f"{base}/export.csv"
+    estado = {}
+    primera = fuentes.revisar_origen(origen, estado)
+
+    # Last-Modified tiene resolución de segundos: el archivo nuevo se fecha después
+    archivo.write_bytes(contenido_csv.replace(b"Octubre 2025", b"Noviembre 2025"))
+    futuro = time.time() + 5
+    os.utime(archivo, (futuro, futuro))
+    segunda = fuentes.revisar_origen(origen, estado)
+
+    assert segunda != primera
+    assert codigos == [200, 200]
+    assert parseos == [primera, segunda]
@@ -0,0 +1,60 @@
+"""Pruebas de la lectura de los libros de nómina y de la proyección de RECURSOS PROPIOS"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from control_presupuestal.calculos import CONCEPTOS_RECURSOS_PROPIOS
+from control_presupuestal.proyeccion import (
+    COLUMNAS_PROYECCION, firma_mes_proyeccion, proyectar_recursos_propios, reducir_libro_nomina, reducir_mes_nomina,
+    sin_snapshot
+)
+
+def vector_conceptos(**valores):
+    """Vector en el orden de CONCEPTOS_RECURSOS_PROPIOS con los valores dados por concepto"""
+    return np.array([valores.get(concepto, 0.0) for concepto in CONCEPTOS_RECURSOS_PROPIOS])
+
+def test_reducir_mes_en_procesos_deja_snapshots(carpetas_temporales, mes_nomina):
+    firma = firma_mes_proyeccion(mes_nomina)
+    esperado = vector_conceptos(**{"SUELDO BASICO": 3_500_000, "PRIMA DE SERVICIOS": 400_000, "ICBF": 150_000, "SALUD": 300_000})
+
+    # Primera vez: los dos libros se parsean en procesos aparte; la segunda se leen de sus snapshots
+    np.testing.assert_allclose(reducir_mes_nomina(firma), esperado)
+    assert sin_snapshot(firma) == []
+    np.testing.assert_allclose(reducir_mes_nomina(firma), esperado)
+
+def test_reducir_libro_con_titulos_sobre_el_encabezado(tmp_path):
+    ruta = tmp_path / "nomina.xlsx"
+    with pd.ExcelWriter(ruta) as escritor:
+        pd.DataFrame({"A": ["NÓMINA CONSOLIDADA PRESUPUESTAL", "Periodo: enero 2025"]}).to_excel(
+            escritor, index=False, header=False
+        )
+        pd.DataFrame({
+            "Rubro": ["x", "x", "x"],
+            "Descripción": ["Sueldo básico", "Aportes al ICBF", "Libranzas"],
+            "Valor Total": [1_000, 200, 50]
+        }).to_excel(escritor, index=False, startrow=3)
+
+    esperado = vector_conceptos(**{"SUELDO BASICO": 1_000, "ICBF": 200})
+    np.testing.assert_allclose(reducir_libro_nomina(pd.read_excel(ruta)), esperado)
+
+def test_libro_sin_columnas_reconocibles():
+    with pytest.raises(ValueError, match="RP_NOMINA_COLUMNA_CONCEPTO"):
+        reducir_libro_nomina(pd.DataFrame({"A": ["x"], "B": [1]}))
+
+def test_proyectar_recursos_propios_con_incremento():
+    matriz = np.zeros((len(CONCEPTOS_RECURSOS_PROPIOS), 2))
+    matriz[list(CONCEPTOS_RECURSOS_PROPIOS).index("SUELDO BASICO")] = [100, 200]
+    matriz[list(CONCEPTOS_RECURSOS_PROPIOS).index("SALUD")] = [30, 30]
+    saldos = vector_conceptos(**{"SUELDO BASICO": 2_000, "SALUD": 100})
+
+    # Promedio 150; de marzo a junio sin incremento (4 x 150) y de julio a diciembre con 10 % (6 x 165)
+    tabla = proyectar_recursos_propios(matriz, ultimo_mes=2, saldos=saldos, incremento=0.10, mes_incremento=7)
+
+    assert list(tabla.columns) == COLUMNAS_PROYECCION
+    assert tabla.loc["SUELDO BASICO", "PROMEDIO MENSUAL"] == pytest.approx(150)
+    assert tabla.loc["SUELDO BASICO", "PROYECCIÓN A DICIEMBRE"] == pytest.approx(1_590)
+    assert tabla.loc["SUELDO BASICO", "DIFERENCIA"] == pytest.approx(410)
+    assert tabla.loc["SALUD", "PROYECCIÓN A DICIEMBRE"] == pytest.approx(4 * 30 + 6 * 33)
+    assert tabla.loc["SUELDOS", "PROYECCIÓN A DICIEMBRE"] == pytest.approx(1_590)
+    assert tabla.loc["DOC REC PROPIOS", "SALDO DE APROPIACION"] == pytest.approx(2_100)
+    assert tabla.loc["DOC REC PROPIOS", "PROYECCIÓN A DICIEMBRE"] == pytest.approx(1_590 + 318)